@@ -0,0 +1 @@
+'''Benchmarks of petit_lisp; run them with python -m bench'''
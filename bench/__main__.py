@@ -0,0 +1,47 @@
+'''Command line interface of the benchmark runner:
+
+       python -m bench [workload ...] [--engine compile] [--save FILE]
+                       [--compare FILE] [--threshold 0.1] [--time 1.0]
+
+   The exit status is 1 if a workload failed or, with --compare, if a
+   workload regressed.
+'''
+import argparse
+import sys
+
+import petit_lisp as pl
+from bench import runner
+from bench.workloads import WORKLOADS
+
+arg_parser = argparse.ArgumentParser(prog="python -m bench",
+                                     description="petit_lisp benchmarks")
+arg_parser.add_argument("workloads", nargs="*",
+                        help="workloads to run, among {}; all by default"
+                        .format(", ".join(WORKLOADS)))
+arg_parser.add_argument("--engine", choices=sorted(pl.engines),
+                        default="interpret")
+arg_parser.add_argument("--time", type=float, default=1.0,
+                        help="minimum time spent on each workload, in s")
+arg_parser.add_argument("--save", metavar="FILE",
+                        help="save the results as a baseline")
+arg_parser.add_argument("--compare", metavar="FILE",
+                        help="compare the results with a saved baseline")
+arg_parser.add_argument("--threshold", type=float, default=0.10,
+                        help="relative change reported as a regression")
+args = arg_parser.parse_args()
+for name in args.workloads:
+    if name not in WORKLOADS:
+        arg_parser.error("unknown workload: " + name)
+
+baseline = runner.load(args.compare) if args.compare else None
+results = runner.run(args.workloads, args.engine, args.time)
+runner.report(results, baseline)
+if args.save:
+    runner.save(results, args.save)
+failed = any('error' in r for r in results['results'].values())
+if baseline is not None:
+    regressions = runner.compare(results, baseline, args.threshold)
+    for message in regressions:
+        print("REGRESSION " + message)
+    failed = failed or bool(regressions)
+sys.exit(1 if failed else 0)
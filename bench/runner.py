@@ -0,0 +1,129 @@
+'''Times workloads and compares the results with a saved baseline
+
+   For each workload, the operation is repeated until a time budget is
+   used, reporting operations per second and latency percentiles; peak
+   memory is measured with tracemalloc during one extra run, since
+   tracing slows the interpreter down.  A workload raising an exception
+   is reported as failed, without stopping the others.
+'''
+import json
+import platform
+import time
+import tracemalloc
+
+from bench.workloads import WORKLOADS
+
+FORMAT = "{:18} {:>10} {:>10} {:>10} {:>10} {:>10}"
+
+
+def percentile(values, fraction):
+    '''Value below which lie fraction of the sorted values'''
+    index = min(len(values) - 1, int(fraction * len(values)))
+    return values[index]
+
+
+def measure(operation, min_time=1.0, min_runs=5, max_runs=10000,
+            memory=True):
+    '''Times operation; returns a dict of statistics, times in ms; peak
+       memory is None unless memory is true'''
+    operation()   # warm up
+    latencies = []
+    start = time.perf_counter()
+    while len(latencies) < max_runs:
+        t0 = time.perf_counter()
+        operation()
+        latencies.append(time.perf_counter() - t0)
+        if (len(latencies) >= min_runs and
+                time.perf_counter() - start >= min_time):
+            break
+    latencies.sort()
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            operation()
+            peak = tracemalloc.get_traced_memory()[1] / 1024
+        finally:
+            tracemalloc.stop()
+    return {
+        'runs': len(latencies),
+        'ops_per_sec': len(latencies) / sum(latencies),
+        'p50_ms': 1000 * percentile(latencies, 0.50),
+        'p90_ms': 1000 * percentile(latencies, 0.90),
+        'p99_ms': 1000 * percentile(latencies, 0.99),
+        'peak_kb': peak
+    }
+
+
+def run(names=None, engine='interpret', min_time=1.0, min_runs=5,
+        memory=True):
+    '''Runs the workloads named, or all of them, at least min_runs times,
+       measuring their peak memory if memory is true; returns the results
+       in the format saved as a baseline, where a failed workload has an
+       error message instead of statistics'''
+    results = {}
+    for name in names or WORKLOADS:
+        try:
+            results[name] = measure(WORKLOADS[name](engine), min_time,
+                                    min_runs, memory=memory)
+        except Exception as e:
+            results[name] = {'error': '{}: {}'.format(type(e).__name__, e)}
+    return {
+        'python': platform.python_version(),
+        'engine': engine,
+        'results': results
+    }
+
+
+def compare(results, baseline, threshold=0.10):
+    '''Returns a list of messages describing regressions: workloads which
+       failed, or are slower, or use more memory, than in baseline by more
+       than threshold'''
+    regressions = []
+    for name, new in results['results'].items():
+        if 'error' in new:
+            regressions.append("{}: failed with {}".format(name, new['error']))
+            continue
+        old = baseline['results'].get(name)
+        if old is None or 'error' in old:
+            continue
+        if new['ops_per_sec'] < old['ops_per_sec'] * (1 - threshold):
+            regressions.append("{}: {:.1f} ops/sec, was {:.1f}".format(
+                name, new['ops_per_sec'], old['ops_per_sec']))
+        if None in (new['peak_kb'], old['peak_kb']):
+            continue   # not measured
+        if new['peak_kb'] > old['peak_kb'] * (1 + threshold):
+            regressions.append("{}: peak memory {:.0f} kB, was {:.0f}".format(
+                name, new['peak_kb'], old['peak_kb']))
+    return regressions
+
+
+def report(results, baseline=None):
+    '''Prints a table of results, with the change from baseline if any'''
+    print(FORMAT.format("workload", "ops/sec", "p50 ms", "p90 ms", "p99 ms",
+                        "peak kB"))
+    for name, r in results['results'].items():
+        if 'error' in r:
+            print("{:18} failed with {}".format(name, r['error']))
+            continue
+        ops = "{:.1f}".format(r['ops_per_sec'])
+        old = baseline['results'].get(name, {}) if baseline else {}
+        if 'ops_per_sec' in old:   # neither missing nor failed
+            ops += " {:+.0%}".format(r['ops_per_sec'] / old['ops_per_sec'] - 1)
+        print(FORMAT.format(name, ops, "{:.2f}".format(r['p50_ms']),
+                            "{:.2f}".format(r['p90_ms']),
+                            "{:.2f}".format(r['p99_ms']),
+                            "-" if r['peak_kb'] is None
+                            else "{:.0f}".format(r['peak_kb'])))
+
+
+def load(filename):
+    '''Reads results saved by save'''
+    with open(filename) as f:
+        return json.load(f)
+
+
+def save(results, filename):
+    '''Saves results as a baseline'''
+    with open(filename, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
@@ -0,0 +1,134 @@
+'''Representative workloads for the interpreter
+
+   Each workload is a function taking the engine to use ('interpret' or
+   'compile') and returning the function to time, which performs one
+   operation.  Setting up a global environment and loading the prelude is
+   done beforehand and is not timed, except by cold_start.
+'''
+import atexit
+import io
+import os
+import shutil
+import tempfile
+
+import petit_lisp as pl
+
+PRELUDE = "src/default_language.lisp"
+WORKLOADS = {}
+
+
+def workload(function):
+    '''Registers a workload under the name of its function'''
+    WORKLOADS[function.__name__] = function
+    return function
+
+
+def prelude_env(engine):
+    '''Returns a new global environment with the prelude loaded'''
+    pl.global_env = pl.common_env(pl.Env())
+    pl.use_engine(engine)
+    pl.loader.load(PRELUDE)
+    return pl.global_env
+
+
+def program(engine, definitions, expression):
+    '''Evaluates definitions once; returns a function evaluating
+       expression'''
+    env = prelude_env(engine)
+    evaluate = pl.engines[engine]
+    for expr in pl.parser.parse_all(definitions):
+        evaluate(expr, env)
+    expr = pl.parse(expression)
+    return lambda: evaluate(expr, env)
+
+
+@workload
+def fib(engine):
+    '''(fib 15): procedure calls and arithmetic'''
+    return program(engine, '''
+        (define fib (lambda (n)
+            (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2))))))''', "(fib 15)")
+
+
+@workload
+def tak(engine):
+    '''(tak 12 8 4): deeply nested non tail calls'''
+    return program(engine, '''
+        (define tak (lambda (x y z)
+            (if (not (< y x))
+                z
+                (tak (tak (- x 1) y z)
+                     (tak (- y 1) z x)
+                     (tak (- z 1) x y)))))''', "(tak 12 8 4)")
+
+
+@workload
+def list_building(engine):
+    '''builds a 150 element list with the prelude's append and list'''
+    return program(engine, '''
+        (define build (lambda (n acc)
+            (if (= n 0) acc (build (- n 1) (append acc (list n))))))''',
+                   "(build 150 '())")
+
+
+@workload
+def cond_chain(engine):
+    '''dispatches through a cond with 20 clauses, 20 times'''
+    clauses = " ".join("((= n {0}) {0})".format(i) for i in range(20))
+    return program(engine, '''
+        (define classify (lambda (n) (cond {} (else -1))))
+        (define loop (lambda (n)
+            (if (< n 0) n (begin (classify n) (loop (- n 1))))))'''.format(
+                clauses), "(loop 19)")
+
+
+@workload
+def parse_large_file(engine):
+    '''reads 2000 top-level expressions with strings and nested lists'''
+    source = "".join(
+        '(define item-{0} (lambda (x) (cond ((= x {0}) "item {0}") '
+        '(else (list x {0}.5 \'(a (b c)))))))\n'.format(i)
+        for i in range(2000))
+    parser = pl.parser
+
+    def read():
+        return list(parser.read_stream(io.StringIO(source)))
+    return read
+
+
+@workload
+def read_data(engine):
+    '''reads a data file of 2000 rows with strings, numbers and lists'''
+    directory = tempfile.mkdtemp()
+    atexit.register(shutil.rmtree, directory, ignore_errors=True)
+    path = os.path.join(directory, "data.lisp")
+    with open(path, "w") as f:
+        for i in range(2000):
+            f.write('(row {0} "item {0}" (x {0}.5 y -{0}) (a (b c)))\n'.format(
+                i))
+    return program(engine, "", "(read-data '{})".format(path))
+
+
+@workload
+def cold_start(engine):
+    '''creates a global environment and loads the prelude'''
+    prelude_env(engine)   # the timed runs may use the parse cache
+    return lambda: prelude_env(engine)
+
+
+@workload
+def vectors(engine):
+    '''element-wise product and dot product of 100000 element vectors'''
+    return program(engine, "(define v (vrange 100000))",
+                   "(vdot (vmul v 2.5) v)")
+
+
+@workload
+def map_lookup(engine):
+    '''builds a 500 entry persistent map, then looks up each key'''
+    return program(engine, '''
+        (define fill (lambda (n m)
+            (if (= n 0) m (fill (- n 1) (put m n (* n n))))))
+        (define total (lambda (n m acc)
+            (if (= n 0) acc (total (- n 1) m (+ acc (get m n))))))''',
+                   "(total 500 (fill 500 (hash-map)) 0)")
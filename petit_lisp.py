@@ -1,24 +1,63 @@
 '''New class based version
 '''
 
+import argparse
+import asyncio
+import concurrent.futures
+import contextlib
+import importlib
+import io
+import os
+import pickle
+import queue
 import sys
-
+import threading
+from functools import partial
+
+from src.async_utils import async_fns, pool, run_in_thread
+from src.budget import Budget, monitor
+from src.compiler import (ENV_AWARE, PLAIN, PYTHON, TAIL, Compiler,
+                          is_env_aware)
+from src.data import data_fns
 from src.file_loader import FileLoader
-from src.python_utils import python_fns
+from src.lazy import LazySeq, Promise, lazy_fns
+from src.maps import map_fns
+from src.memo import Memoized, memo_fns
+from src.native import use_native
+from src.optimizer import Guarded, Optimizer
+from src.pairs import Pair, from_list, is_list, to_list
+from src.profiler import profiler
+from src.parse_cache import ParseCache
+from src.python_utils import (import_names, is_imported, process_map,
+                              python_fns)
 from src.parser import Parser
 from src.repl import InteractiveInterpreter
+from src.server import FRAMINGS, Server, serve
+from src.symbols import Form, LispString, Symbol
+from src.vectors import vector_fns
 
 loader = FileLoader()
-STRINGS = {}
 
 
 class Env(dict):
-    "An environment: a dict of {'var': val} pairs, with an outer Env."
+    '''An environment: a dict of {'var': val} pairs, with an outer Env.
+       version is incremented when a name is defined or set by lisp code,
+       so that optimized expressions know when to check their assumptions
+       and procedure calls when to look up their procedure again; Python
+       code changing a global environment should do so too.'''
+    imports = None
+    version = 0
 
     def __init__(self, params=(), args=(), outer=None):
         self.update(zip(params, args))
         self.outer = outer
 
+    def record_import(self, var, module, name):
+        "Remember that var was imported as name from a Python module."
+        if self.imports is None:
+            self.imports = {}
+        self.imports[var] = (module, name)
+
     def find(self, var):
         "Find the innermost Env where var appears."
         if var in self:
@@ -31,6 +70,8 @@ class Env(dict):
 
 class Procedure(object):
     "A user-defined procedure."
+    name = None   # set by define
+
     def __init__(self, params, body, env,
                  opt_param=False,
                  evaluate=None,
@@ -43,8 +84,25 @@ class Procedure(object):
     def __call__(self, *args):
         if self.opt_param:
             args = self.pack_args(args)
+        if monitor.active:
+            return self.call_with_budget(args)
+        if profiler.active:
+            return profiler.call(self, args)
         return self.evaluate(self.body, self.env_cls(self.params, args, self.env))
 
+    def call_with_budget(self, args):
+        '''Calls the procedure, counting the call in the Budget of the
+           current thread, if any'''
+        budget = monitor.enter()
+        try:
+            if profiler.active:
+                return profiler.call(self, args)
+            return self.evaluate(self.body,
+                                 self.env_cls(self.params, args, self.env))
+        finally:
+            if budget is not None:
+                budget.exit()
+
     def pack_args(self, args):
         '''ensures that any extra arguments are packed into a list'''
         if len(args) < self.opt_param:
@@ -54,18 +112,31 @@ class Procedure(object):
             newargs.append([])
             return tuple(newargs)
         elif ((len(args) > self.opt_param + 1) or
-                (not isinstance(args[self.opt_param], list))):
+                (not is_list(args[self.opt_param]))):
             newargs = [arg for arg in args[:self.opt_param]]
             newargs.append(list(args[self.opt_param:]))
             return tuple(newargs)
         else:
             return args
 
+    def __getstate__(self):
+        '''Compiled bodies are Python closures; they are pickled as the
+           lambda expression and Scope they were compiled from'''
+        state = dict(self.__dict__)
+        if hasattr(self.body, 'source'):
+            state['body'] = self.body.source
+            state['compiled'] = True
+        return state
+
+    def __setstate__(self, state):
+        if state.pop('compiled', False):
+            state['body'] = compiler.compile_procedure(*state['body'])[1]
+        self.__dict__.update(state)
+
     @staticmethod
     def set_docstring(obj, s):
         '''Sets the docstring of an object; useful for user-defined procedures'''
-        # strings are stored with enclosing double quote characters
-        obj.__doc__ = s[1:-1]
+        obj.__doc__ = str(s)
 
 
 class Lisp:
@@ -87,29 +158,38 @@ class Lisp:
     @staticmethod
     def is_atom(atom):
         '''(atom? expr) ==> true if expr is not a list'''
-        return not isinstance(atom, list)
+        return not is_list(atom)
 
     @staticmethod
     def are_equal(val1, val2):
         '''(eq? expr1 expr2) ==> true if both are atoms and equal'''
-        return (not isinstance(val1, list)) and (val1 == val2)
+        return (not is_list(val1)) and (val1 == val2)
 
     @staticmethod
     def car(*expr):
         '''(car (exp1 exp2 exp3 ...)) ==> exp1'''
+        if type(expr[0]) is Pair:
+            return expr[0].car
+        elif type(expr[0]) is LazySeq:
+            return expr[0].first()
         return expr[0][0]
 
     @staticmethod
     def cdr(*expr):
         '''(car (exp1 exp2 exp3 ...)) ==> (exp2 exp3 ...)'''
-        return list(expr[0][1:])
+        if type(expr[0]) is Pair:
+            return expr[0].cdr
+        elif type(expr[0]) is LazySeq:
+            return expr[0].rest()
+        return from_list(expr[0], 1)
 
     @staticmethod
     def cons(*expr):
-        '''Usage (cons expr list) => (expr list) '''
-        if not isinstance(expr[1], list):
+        '''Usage (cons expr list) => (expr list); list may be a lazy
+           sequence'''
+        if not is_list(expr[1]) and type(expr[1]) is not LazySeq:
             raise ValueError("Second argument of cons must be a list.")
-        return [expr[0]] + expr[1]
+        return Pair(expr[0], expr[1])
 
 lisp_procs = {
     'begin': Lisp.begin,
@@ -124,7 +204,7 @@ lisp_procs = {
 def display(s):
     '''Prints a single string.  Strings are enclosed between double quotes
        and do not allow escaped double quote characters'''
-    print(s[1:-1])  # strings are stored with enclosing double quote characters
+    print(s)
 
 
 def common_env(env):
@@ -133,80 +213,676 @@ def common_env(env):
         '__True__': True,
         '__False__': False,
         '_DEBUG': False,
+        '_PROFILE': False,
         'quit': exit,
         'print': display,
         'load': loader.load,
+        'use-native': use_native,
         'set-docstring': Procedure.set_docstring
     })
     env.update(python_fns)
+    env.update(memo_fns)
+    env.update(async_fns)
+    env.update(vector_fns)
+    env.update(map_fns)
+    env.update(lazy_fns)
+    env.update(data_fns)
     env.update(lisp_procs)
     return env
 exit.__doc__ = "Quits the repl."
 global_env = common_env(Env())
 
+(UNDEFINED, QUOTE, DEFINE, SET, LAMBDA, COND, IF, BEGIN, AND, OR, WHEN,
+ UNLESS, LET, DELAY, LAZY_SEQ) = map(Symbol, [
+     'undefined?', 'quote', 'define', 'set!', 'lambda', 'cond', 'if',
+     'begin', 'and', 'or', 'when', 'unless', 'let', 'delay', 'lazy-seq'])
+
+
+def call_kind(procedure):
+    """How evaluate calls procedure: TAIL for a Procedure whose body it
+       runs in its own loop, ENV_AWARE for a procedure expecting the
+       calling environment as env= argument, PYTHON for a callable imported
+       from a Python module, whose list arguments are converted by to_list,
+       PLAIN otherwise."""
+    if isinstance(procedure, Procedure) and procedure.evaluate is evaluate:
+        return TAIL
+    elif is_env_aware(procedure):
+        return ENV_AWARE
+    elif is_imported(procedure):
+        return PYTHON
+    return PLAIN
+
+
+def lookup_procedure(x, op, env):
+    """Returns the procedure named op called by the Form x, and its
+       call_kind.
+
+       A procedure found in the global environment is remembered in the
+       cache of x, with the version of that environment: until a name is
+       defined or set there, evaluate only checks that no local
+       environment between env and the global one has a variable op."""
+    found = env.find(op)
+    procedure = found[op]
+    kind = call_kind(procedure)
+    x.cache = ((found, found.version, procedure, kind)
+               if found.outer is None else None)
+    return procedure, kind
+
 
 def evaluate(x, env=None):
-    "Evaluate an expression in an environment."
+    """Evaluate an expression in an environment.
+
+       Expressions in tail position (the branches of if/cond, the last
+       expression of begin, and, or, when, unless and let, and the body of
+       a Procedure) are evaluated by looping instead of recursing, so that
+       tail calls run in constant stack depth.
+
+       and/or only evaluate their arguments until the result is known,
+       which is the value of the last argument evaluated.
+
+       Special forms are recognized by identity with the interned Symbols
+       produced by the parser; the str heads of expressions built by Python
+       code are interned first.  String literals evaluate to themselves."""
+    if env is None:
+        env = global_env
+
+    profiled = False   # True once a tail call was recorded by profiler
+    budget = None      # the Budget counting the calls made by this loop
+    try:
+        while True:
+            if type(x) is Symbol:             # variable reference
+                return env.find(x)[x]
+            elif not isinstance(x, list):     # constant literal
+                if type(x) is str:            # name in an expression built
+                    return env.find(x)[x]     # by Python code
+                elif type(x) is Guarded:      # rewritten by the optimizer
+                    if x.version != x.env.version:
+                        x.revalidate()
+                    x = x.optimized
+                    continue
+                return x
+
+            op = x[0]
+            if type(op) is str:               # in an expression built by
+                op = Symbol(op)               # Python code
+            if op is UNDEFINED:               # (undefined? x)
+                try:
+                    _ = env.find(x[1])
+                    return False              # found ... so it is defined
+                except ValueError:
+                    return True
+            elif op is QUOTE:                 # (quote exp), or 'exp
+                (_, exp) = x
+                return exp
+            elif op is DEFINE:                # (define var exp)
+                (_, var, exp) = x
+                val = evaluate(exp, env)
+                if type(val) is Procedure and val.name is None:
+                    val.name = var
+                env[var] = val
+                env.version += 1
+                return None
+            elif op is SET:                   # (set! var exp)
+                (_, var, exp) = x
+                target = env.find(var)
+                target[var] = evaluate(exp, env)
+                target.version += 1
+                return None
+            elif op is LAMBDA:                # (lambda (params*) body)
+                (_, params, body) = x
+                opt_param = False
+                if '.' in params:
+                    opt_param = params.index('.')
+                    params = list(params)  # x may be evaluated again
+                    params.pop(opt_param)
+                return Procedure(params, body, env, opt_param, evaluate, Env)
+            elif op is COND:                  # (cond (p1 e1) ... (pn en))
+                for (p, e) in x[1:]:
+                    if evaluate(p, env):
+                        x = e
+                        break
+                else:
+                    return None
+            elif op is IF:                    # (if test if_true other)
+                (_, test, if_true, other) = x
+                x = if_true if evaluate(test, env) else other
+            elif op is BEGIN:                 # (begin exp1 ... exp_last)
+                if len(x) == 1:
+                    return None
+                for exp in x[1:-1]:
+                    evaluate(exp, env)
+                x = x[-1]
+            elif op is AND:                   # (and exp1 ... exp_last)
+                if len(x) == 1:
+                    return True
+                for exp in x[1:-1]:
+                    val = evaluate(exp, env)
+                    if not val:
+                        return val
+                x = x[-1]
+            elif op is OR:                    # (or exp1 ... exp_last)
+                if len(x) == 1:
+                    return False
+                for exp in x[1:-1]:
+                    val = evaluate(exp, env)
+                    if val:
+                        return val
+                x = x[-1]
+            elif op is WHEN or op is UNLESS:
+                # (when test exp1 ... exp_last),
+                # (unless test exp1 ... exp_last)
+                test = bool(evaluate(x[1], env))
+                if test != (op is WHEN) or len(x) == 2:
+                    return None
+                for exp in x[2:-1]:
+                    evaluate(exp, env)
+                x = x[-1]
+            elif op is LET:               # (let ((var exp)*) exp* exp_last)
+                bindings = x[1]
+                env = Env([var for (var, _) in bindings],
+                          [evaluate(exp, env) for (_, exp) in bindings], env)
+                if len(x) == 2:               # the inits are still evaluated
+                    return None
+                for exp in x[2:-1]:
+                    evaluate(exp, env)
+                x = x[-1]
+            elif op is DELAY:                 # (delay exp)
+                return Promise(partial(evaluate, x[1], env))
+            elif op is LAZY_SEQ:              # (lazy-seq exp)
+                return LazySeq(partial(evaluate, x[1], env))
+            else:                             # ("procedure" exp*)
+                procedure = None
+                if type(x) is Form and type(op) is Symbol:
+                    cache = x.cache    # see lookup_procedure
+                    if cache is not None and cache[1] == cache[0].version:
+                        genv, local = cache[0], env
+                        while (local is not genv and local is not None
+                               and op not in local):
+                            local = local.outer
+                        if local is genv:
+                            procedure, kind = cache[2], cache[3]
+                    if procedure is None:
+                        procedure, kind = lookup_procedure(x, op, env)
+                else:
+                    procedure = evaluate(op, env)
+                    kind = call_kind(procedure)
+                exps = [evaluate(exp, env) for exp in x[1:]]
+                if kind is TAIL:
+                    # tail call: run the body in this loop instead of recursing
+                    if profiler.active:
+                        profiled = profiler.tail_call(procedure, profiled)
+                    if monitor.active:
+                        budget = monitor.tail_call(budget)
+                    if procedure.opt_param:
+                        exps = procedure.pack_args(exps)
+                    x = procedure.body
+                    env = procedure.env_cls(procedure.params, exps,
+                                            procedure.env)
+                elif kind is ENV_AWARE:
+                    return procedure(*exps, env=env)
+                elif kind is PYTHON:
+                    return procedure(*[to_list(exp) for exp in exps])
+                else:
+                    return procedure(*exps)
+    finally:
+        if profiled:
+            profiler.exit()
+        if budget is not None:
+            budget.exit()
+
+
+compiler = Compiler(Procedure)
+
+
+def execute(x, env=None):
+    "Compile an expression into closures, then run it in an environment."
     if env is None:
         env = global_env
+    return compiler.execute(x, env)
+
+
+async def async_evaluate(x, env=None, engine=None):
+    """Coroutine evaluating an expression as a lisp task: it runs in a
+       thread of the task pool, so that the event loop keeps running other
+       tasks and coroutines, in particular while the expression uses
+       (await ...).
+       engine is evaluate, the default, or execute."""
+    if engine is None:
+        engine = evaluate
+    return await run_in_thread(asyncio.get_running_loop(), engine, x, env)
+
+optimizer = Optimizer(Procedure, lisp_procs.values())
+
+
+def optimized(engine):
+    '''Returns a function evaluating an expression with engine after
+       running the optimizer pass over it'''
+    def run(x, env=None):
+        if env is None:
+            env = global_env
+        return engine(optimizer.optimize(x, env), env)
+    return run
+
+engines = {
+    'interpret': evaluate,
+    'compile': execute,
+    'interpret-optimized': optimized(evaluate),
+    'compile-optimized': optimized(execute)
+}
 
-    if isinstance(x, str):            # variable reference
-        if x in STRINGS:
-            return STRINGS[x]
-        return env.find(x)[x]
-    elif not isinstance(x, list):     # constant literal
-        return x
 
-    elif x[0] == 'undefined?':        # (undefined? x)
-        try:
-            _ = env.find(x[1])
-            return False              # found ... so it is defined
-        except ValueError:
-            return True
-    elif x[0] == 'quote':              # (quote exp), or 'exp
-        (_, exp) = x
-        return exp
-    elif x[0] == 'define':            # (define var exp)
-        (_, var, exp) = x
-        env[var] = evaluate(exp, env)
-    elif x[0] == 'set!':              # (set! var exp)
-        (_, var, exp) = x
-        env.find(var)[var] = evaluate(exp, env)
-    elif x[0] == 'lambda':            # (lambda (params*) body)
-        (_, params, body) = x
-        opt_param = False
-        if '.' in params:
-            opt_param = params.index('.')
-            params.pop(opt_param)
-        return Procedure(params, body, env, opt_param, evaluate, Env)
-    elif x[0] == 'cond':              # (cond (p1 e1) ... (pn en))
-        for (p, e) in x[1:]:
-            if evaluate(p, env):
-                return evaluate(e, env)
-    elif x[0] == 'if':                # (if test if_true other)
-        (_, test, if_true, other) = x
-        return evaluate((if_true if evaluate(test, env) else other), env)
-    else:                             # ("procedure" exp*)
-        exps = [evaluate(exp, env) for exp in x]
-        procedure = exps.pop(0)
-        if (hasattr(procedure, '__kwdefaults__')
-                 and procedure.__kwdefaults__ is not None
-                 and "env" in procedure.__kwdefaults__):
-            if env is None:
-                env = global_env
-            return procedure(*exps, env=env)
-        else:
-            return procedure(*exps)
+def use_engine(name):
+    '''Selects the engine used to evaluate loaded files; returns it'''
+    loader.evaluate = engines[name]
+    return loader.evaluate
 
-parse = Parser(STRINGS).parse
+parser = Parser()
+parse = parser.parse
 loader.evaluate = evaluate
 loader.parse = parse
+loader.read_stream = parser.read_stream
+loader.cache = ParseCache()
+
+SNAPSHOT_MAGIC = "petit_lisp snapshot 2"
+
+
+class SnapshotPickler(pickle.Pickler):
+    '''Pickles the values of a global environment env.  env itself and
+       the built-in procedures added by common_env are pickled by
+       reference.'''
+
+    def __init__(self, file, env):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.env = env
+        self.fresh = common_env(Env())   # keeps the ids below valid
+        self.builtins = {id(val): var for var, val in self.fresh.items()
+                         if callable(val)}
+
+    def persistent_id(self, obj):
+        if obj is self.env:
+            return ('env',)
+        elif id(obj) in self.builtins:
+            return ('builtin', self.builtins[id(obj)])
+        return None
+
+
+class SnapshotUnpickler(pickle.Unpickler):
+    '''Loads values pickled by SnapshotPickler or ForkPickler into a new
+       environment'''
+
+    def __init__(self, file, env):
+        super().__init__(file)
+        self.env = env
+
+    def persistent_load(self, pid):
+        if pid[0] == 'env':
+            return self.env
+        return self.env[pid[1]]
+
+
+class ForkPickler(pickle.Pickler):
+    '''Pickles procedures of a global environment env for fork: env and
+       the values of shared, {id(value): var}, are pickled by reference'''
+
+    def __init__(self, file, env, shared):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.env = env
+        self.shared = shared
+
+    def persistent_id(self, obj):
+        if obj is self.env:
+            return ('env',)
+        var = self.shared.get(id(obj))
+        return None if var is None else ('value', var)
+
+
+def is_builtin(val, default):
+    '''True if val is the built-in value default, or the same method bound
+       to another object, like the load method of an Interpreter's loader'''
+    if type(val) is type(default) and val == default:
+        return True
+    method = getattr(default, '__func__', None)
+    return method is not None and getattr(val, '__func__', None) is method
+
+
+def dumps_env(env=None, names=None):
+    '''Returns a snapshot of an initialized global environment as bytes,
+       or of the given names of it.
+
+       Built-in procedures are not saved, since common_env provides them,
+       and names imported with load-py and friends are saved as their
+       module and name.'''
+    if env is None:
+        env = global_env
+    if names is None:
+        names = env
+    fresh = common_env(Env())
+    imports = []
+    values = {}
+    for var in names:
+        val = env[var]
+        if var in fresh and is_builtin(val, fresh[var]):
+            continue
+        if env.imports and var in env.imports:
+            module, name = env.imports[var]
+            mod = importlib.import_module(module)
+            if getattr(mod, name, None) is val:
+                imports.append((var, module, name))
+                continue
+        values[var] = val
+    data = io.BytesIO()
+    SnapshotPickler(data, env).dump(values)
+    return pickle.dumps({'magic': SNAPSHOT_MAGIC,
+                         'imports': imports,
+                         'values': data.getvalue()}, pickle.HIGHEST_PROTOCOL)
+
+
+def loads_env(data):
+    '''Rebuilds a global environment from a snapshot made by dumps_env'''
+    snapshot = pickle.loads(data)
+    if snapshot.get('magic') != SNAPSHOT_MAGIC:
+        raise ValueError("Not a petit_lisp snapshot.")
+    env = common_env(Env())
+    for var, module, name in snapshot['imports']:
+        import_names(env, module, [(name, var)])
+    env.update(SnapshotUnpickler(io.BytesIO(snapshot['values']), env).load())
+    return env
+
+
+def snapshot(filename, env=None):
+    '''Saves a snapshot of an initialized global environment to a file'''
+    with open(filename, "wb") as f:
+        f.write(dumps_env(env))
+
+
+def restore(filename):
+    '''Returns the global environment saved in a file by snapshot'''
+    with open(filename, "rb") as f:
+        return loads_env(f.read())
+
+
+def names_in(x):
+    '''Yields the names found in an expression, quoted ones included'''
+    pending = [x]
+    while pending:
+        x = pending.pop()
+        if type(x) is Guarded:
+            pending.extend([x.original, x.optimized])
+        elif isinstance(x, list):
+            pending.extend(x)
+        elif isinstance(x, str) and type(x) is not LispString:
+            yield x
+
+
+def global_names(procedure, env):
+    '''Returns the names of the global environment env which procedure
+       may look up, directly or through the procedures it reaches by
+       those names or by its closure'''
+    names = set()
+    pending = [procedure]
+    seen = set()
+    while pending:
+        value = pending.pop()
+        if type(value) is Memoized:
+            value = value.procedure
+        if type(value) is not Procedure or id(value) in seen:
+            continue
+        seen.add(id(value))
+        body = value.body
+        if hasattr(body, 'source'):   # compiled from (lambda ...)
+            body = body.source[0]
+        for var in names_in(body):
+            if var in env and var not in names:
+                names.add(var)
+                pending.append(env[var])
+        local = value.env
+        while local is not env and local is not None:
+            if isinstance(local, dict):
+                pending.extend(local.values())
+            else:   # a Frame of compiled code
+                pending.extend(local.slots)
+                pending.extend(getattr(local, 'extra', {}).values())
+            local = local.outer
+    return names
+
+
+def dumps_procedure(procedure, env=None):
+    '''Returns procedure as bytes, together with a snapshot of the names
+       of the global environment env it may look up'''
+    if env is None:
+        env = global_env
+    data = io.BytesIO()
+    SnapshotPickler(data, env).dump(procedure)
+    return pickle.dumps((dumps_env(env, global_names(procedure, env)),
+                         data.getvalue()), pickle.HIGHEST_PROTOCOL)
+
+
+def loads_procedure(data):
+    '''Rebuilds a procedure saved by dumps_procedure, in a new global
+       environment'''
+    env_data, procedure = pickle.loads(data)
+    return SnapshotUnpickler(io.BytesIO(procedure), loads_env(env_data)).load()
+
+process_map.dumps = dumps_procedure
+process_map.loads = loads_procedure
+
+
+def fork(env=None):
+    '''Returns a new global environment with the values of env; names
+       later defined or set in one of them are not seen by the other.
+
+       The procedures of env, including memoized ones, are copied so that
+       those of the fork look up global names in the fork; they must be
+       picklable, as for snapshot.  The other values are shared.'''
+    if env is None:
+        env = global_env
+    child = Env(outer=env.outer)
+    child.update(env)
+    if env.imports:
+        child.imports = dict(env.imports)
+    procedures = {var: val for var, val in env.items()
+                  if type(val) in (Procedure, Memoized)}
+    if procedures:
+        # a single pickle, so that the procedures copied keep referring to
+        # one another, as in the optimizer's assumptions
+        shared = {id(val): var for var, val in env.items()
+                  if var not in procedures}
+        data = io.BytesIO()
+        ForkPickler(data, env, shared).dump(procedures)
+        data.seek(0)
+        child.update(SnapshotUnpickler(data, child).load())
+    return child
+
+
+PRELUDE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       "src", "default_language.lisp")
+
+
+class Interpreter:
+    '''An interpreter owning its global environment, parser and file
+       loader, independent of the module level global_env and loader.
+
+       An instance evaluates one expression at a time, using a lock, so that
+       it can be shared between threads; different instances do not share
+       any mutable state and can be used by different threads at the same
+       time.  The tasks started by (gather ...) are the exception: they
+       evaluate in the environment without taking the lock, which the
+       expression awaiting them holds.  The environment of a new
+       interpreter has the prelude loaded, unless env is given.'''
+
+    def __init__(self, engine='interpret', env=None, prelude=PRELUDE):
+        self.engine = engine
+        self.execute = engines[engine]
+        self.lock = threading.RLock()
+        self.parser = Parser()
+        new = env is None
+        if new:
+            env = common_env(Env())
+        self.env = env
+        self.loader = FileLoader(partial(self.execute, env=env),
+                                 self.parser.parse, self.parser.read_stream,
+                                 loader.cache)
+        env['load'] = self.loader.load
+        if new and prelude:
+            self.load(prelude)
+
+    @classmethod
+    def from_snapshot(cls, data, engine='interpret'):
+        '''Returns an interpreter using the environment saved by snapshot'''
+        return cls(engine, env=loads_env(data))
+
+    def snapshot(self):
+        '''Returns a snapshot of the environment, as bytes'''
+        with self.lock:
+            return dumps_env(self.env)
+
+    def fork(self):
+        '''Returns an interpreter whose environment is a fork of this one;
+           values other than procedures, like mutable hash maps, are
+           shared by both and should not be changed by either'''
+        with self.lock:
+            return Interpreter(self.engine, env=fork(self.env))
+
+    def evaluate(self, expr, budget=None):
+        '''Evaluates a parsed expression, within budget if given'''
+        with self.lock, budget or contextlib.nullcontext():
+            return self.execute(expr, self.env)
+
+    def run(self, source, budget=None):
+        '''Evaluates all the expressions of a string, within budget if
+           given; returns the value of the last one'''
+        val = None
+        with self.lock, budget or contextlib.nullcontext():
+            for expr in self.parser.parse_all(source):
+                val = self.execute(expr, self.env)
+        return val
+
+    def load(self, filename, budget=None):
+        '''Loads a lisp file, within budget if given'''
+        with self.lock, budget or contextlib.nullcontext():
+            self.loader.load(filename)
+
+    async def async_run(self, source):
+        '''Coroutine evaluating all the expressions of a string as a lisp
+           task; see async_evaluate'''
+        def task():
+            with pool.waiting():   # other tasks may run meanwhile
+                self.lock.acquire()
+            try:
+                return self.run(source)
+            finally:
+                self.lock.release()
+        return await run_in_thread(asyncio.get_running_loop(), task)
+
+
+class InterpreterPool:
+    '''Pre-warmed Interpreters for multi-threaded programs: a thread
+       borrows an interpreter, which no other thread uses until it is
+       returned.
+
+       Interpreters are restored from a snapshot taken after loading the
+       prelude and files.  With reset true, a returned interpreter is
+       replaced by a new one, so that names defined by a thread are not
+       seen by the next one; the new one is restored by a background
+       thread, after the borrower is done with the old one.'''
+
+    def __init__(self, size=4, engine='interpret', files=(), reset=True):
+        template = Interpreter(engine)
+        for filename in files:
+            template.load(filename)
+        self.data = template.snapshot()
+        self.engine = engine
+        self.reset = reset
+        self.idle = queue.Queue()
+        for _ in range(size):
+            self.idle.put(self.new_interpreter())
+        self.restorer = concurrent.futures.ThreadPoolExecutor(1)
+
+    def new_interpreter(self):
+        '''Returns a new interpreter restored from the snapshot'''
+        return Interpreter.from_snapshot(self.data, self.engine)
+
+    def replace(self):
+        '''Adds a new interpreter to the idle ones'''
+        self.idle.put(self.new_interpreter())
+
+    def wait(self):
+        '''Waits until the interpreters returned so far are replaced'''
+        self.restorer.submit(int).result()
+
+    @contextlib.contextmanager
+    def interpreter(self, timeout=None):
+        '''Context manager borrowing an interpreter; waits at most timeout
+           seconds for one to be available, then raises queue.Empty'''
+        interp = self.idle.get(timeout=timeout)
+        try:
+            yield interp
+        finally:
+            if self.reset:
+                self.restorer.submit(self.replace)
+            else:
+                self.idle.put(interp)
+
+    def run(self, source, budget=None):
+        '''Evaluates source with a borrowed interpreter, within budget if
+           given'''
+        with self.interpreter() as interp:
+            return interp.run(source, budget)
 
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        loader.load(sys.argv[1])
+    arg_parser = argparse.ArgumentParser(description="petit_lisp interpreter")
+    arg_parser.add_argument("filename", nargs="?",
+                            default="src/default_language.lisp",
+                            help="program to load; - reads it from stdin")
+    arg_parser.add_argument("--engine", choices=sorted(engines),
+                            default="interpret")
+    arg_parser.add_argument("--profile", action="store_true",
+                            help="profile lisp procedures, starting with "
+                            "the program loaded")
+    arg_parser.add_argument("--serve", action="store_true",
+                            help="evaluate requests read from stdin, or "
+                            "from --socket, instead of starting the repl")
+    arg_parser.add_argument("--socket", metavar="PATH",
+                            help="Unix socket on which --serve accepts "
+                            "connections")
+    arg_parser.add_argument("--framing", choices=sorted(FRAMINGS),
+                            default="lines",
+                            help="requests and responses of --serve are "
+                            "single lines, or preceded by their length")
+    arg_parser.add_argument("--workers", type=int, default=4,
+                            help="interpreters used by --serve")
+    arg_parser.add_argument("--max-steps", type=int,
+                            help="procedure calls allowed per request")
+    arg_parser.add_argument("--max-seconds", type=float,
+                            help="time allowed per request")
+    args = arg_parser.parse_args()
+    if args.serve:
+        files = [args.filename]
+        if os.path.abspath(args.filename) == PRELUDE:
+            files = []   # loaded by every interpreter
+        budget = None
+        if args.max_steps is not None or args.max_seconds is not None:
+            budget = partial(Budget, steps=args.max_steps,
+                             seconds=args.max_seconds)
+        # what the files print, or errors loading them, must not go to
+        # the responses written on stdout
+        with contextlib.redirect_stdout(sys.stderr):
+            pool = InterpreterPool(args.workers, args.engine, files)
+        server = Server(pool, InteractiveInterpreter().to_string,
+                        args.framing, args.workers, budget)
+        serve(server, args.socket)
+        sys.exit()
+    engine = use_engine(args.engine)
+    if args.profile:
+        global_env['_PROFILE'] = True
+        profiler.start()
+    if args.filename == "-":
+        loader.load_stream(sys.stdin, "<stdin>")
     else:
-        loader.load("src/default_language.lisp")
-    interpreter = InteractiveInterpreter(evaluate, parse, global_env)
+        loader.load(args.filename)
+    if args.profile:
+        profiler.stop()
+        print(profiler.report())
+    interpreter = InteractiveInterpreter(engine, parse, global_env)
     interpreter.start()
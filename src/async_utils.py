@@ -0,0 +1,177 @@
+'''Running lisp code from asyncio programs, and awaiting Python coroutines
+
+   evaluate is not a coroutine: each lisp task started by async_evaluate,
+   or by gather, runs in a thread of a TaskPool while the event loop keeps
+   running in its own.  (await expr) passes an awaitable to the event loop
+   and blocks the task's thread until its result is known, so that other
+   tasks and coroutines run in the meantime.
+
+   At most MAX_TASKS tasks run at a time; the others wait for a thread.  A
+   task awaiting (gather ...) gives its place to the tasks it waits for
+   until they are done, but one awaiting other awaitables keeps it.
+
+   Tasks share the Budget of the thread which started them, if any.
+'''
+import asyncio
+import collections
+import contextlib
+import inspect
+import threading
+
+from src.budget import monitor
+
+MAX_TASKS = 32
+
+_task = threading.local()   # loop: the event loop of the current lisp task
+
+
+class TaskPool:
+    '''Threads running functions, started when needed: at most size
+       functions run at a time, others are queued.  Threads waiting, see
+       waiting, are not counted; threads above size stop once idle.'''
+
+    def __init__(self, size):
+        self.size = size
+        self.queue = collections.deque()
+        self.ready = threading.Condition()
+        self.threads = 0
+        self.running = 0   # threads running a function, and not waiting
+        self.idle = 0      # threads waiting for a function, not woken yet
+
+    def submit(self, function):
+        with self.ready:
+            self.queue.append(function)
+            self.start()
+
+    def start(self):
+        '''Wakes up or starts a thread for the first queued function, if
+           there is room for it; self.ready is held'''
+        if self.queue and self.running < self.size:
+            self.running += 1
+            if self.idle:
+                self.idle -= 1
+                self.ready.notify()
+            else:
+                self.threads += 1
+                threading.Thread(target=self.work, name='lisp-task',
+                                 daemon=True).start()
+
+    def work(self):
+        with self.ready:
+            while True:
+                if self.queue and self.running <= self.size:
+                    function = self.queue.popleft()
+                    self.ready.release()
+                    try:
+                        function()
+                    finally:
+                        self.ready.acquire()
+                    continue
+                self.running -= 1
+                if self.threads > self.size:
+                    self.threads -= 1
+                    return
+                self.idle += 1
+                self.ready.wait()   # counted as running again when woken
+
+    @contextlib.contextmanager
+    def waiting(self):
+        '''Context manager for a function of the pool waiting for others,
+           which may run meanwhile'''
+        with self.ready:
+            self.running -= 1
+            self.start()
+        try:
+            yield
+        finally:
+            with self.ready:
+                self.running += 1
+
+pool = TaskPool(MAX_TASKS)
+
+
+def run_in_thread(loop, function, *args, budget=None):
+    '''Calls function(*args) in a thread of pool, as a lisp task of loop,
+       counted by budget or else by the Budget of the current thread;
+       returns an asyncio Future of its result'''
+    future = loop.create_future()
+    if budget is None:
+        budget = monitor.current()
+
+    def set_result(result, error):
+        if not future.done():   # it may have been cancelled
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def task():
+        _task.loop = loop
+        monitor.swap(budget)
+        try:
+            result = function(*args)
+        except BaseException as error:  # passed on to the awaiting code
+            loop.call_soon_threadsafe(set_result, None, error)
+        else:
+            loop.call_soon_threadsafe(set_result, result, None)
+        finally:
+            _task.loop = None
+            monitor.swap(None)
+    pool.submit(task)
+    return future
+
+
+async def wait_for(awaitable):
+    '''Coroutine returning the result of any awaitable'''
+    return await awaitable
+
+
+def await_(value):
+    '''(await expr) ==> the result of expr if it is awaitable, like a
+       coroutine returned by a Python async function, else expr'''
+    if not inspect.isawaitable(value):
+        return value
+    loop = getattr(_task, 'loop', None)
+    if loop is None:   # not in a lisp task: run an event loop until done
+        return asyncio.run(wait_for(value))
+    future = asyncio.run_coroutine_threadsafe(wait_for(value), loop)
+    if type(value) is Gathering:   # the tasks may need this task's place
+        with pool.waiting():
+            return future.result()
+    return future.result()
+
+
+class Gathering:
+    '''Awaitable result of gather'''
+
+    def __init__(self, tasks, budget):
+        self.tasks = tasks
+        self.budget = budget
+
+    def __await__(self):
+        return gather_tasks(self.tasks, self.budget).__await__()
+
+
+def gather(*tasks):
+    '''(gather task ...) ==> awaitable list of the results of the tasks,
+       which run concurrently; a task is an awaitable, or a procedure
+       without arguments'''
+    # the coroutine runs in the thread of the event loop
+    return Gathering(tasks, monitor.current())
+
+
+async def gather_tasks(tasks, budget):
+    '''Coroutine of gather; budget counts the tasks which are procedures'''
+    loop = asyncio.get_running_loop()
+    awaitables = []
+    for task in tasks:
+        if inspect.isawaitable(task):
+            awaitables.append(task)
+        else:
+            awaitables.append(run_in_thread(loop, task, budget=budget))
+    return list(await asyncio.gather(*awaitables))
+
+async_fns = {
+    'await': await_,
+    'gather': gather
+}
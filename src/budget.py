@@ -0,0 +1,172 @@
+'''Limits on the resources used by an evaluation, for untrusted scripts
+
+   with Budget(steps=10000, seconds=0.5, depth=200, allocations=10**6):
+       evaluate(expr)
+
+   raises BudgetExceeded as soon as the code evaluated makes more than
+   10000 steps, runs longer than half a second, nests calls more than 200
+   deep or has more than a million more objects allocated than when it
+   started.  Steps are procedure calls, counted by the engines, which only
+   test the active attribute of monitor when no budget is in use, and the
+   elements that built-in procedures read from lazy sequences, counted by
+   src.lazy.
+
+   The time and allocations are checked every CHECK_INTERVAL steps.  Other
+   built-in procedures are not interrupted: a single call to a slow Python
+   function, or to one looping over a Python iterable, like (vec (range
+   n)) for a large n, may exceed the limits of the budget.  The count
+   of allocations is that of sys.getallocatedblocks(), for the whole
+   process, so it is only approximate when several threads are running.
+   Budgets apply to the thread which entered them, and to the lisp tasks
+   it starts with gather: those share its steps, time and allocations,
+   while the call depth is that of each thread.
+'''
+import sys
+import threading
+import time
+
+CHECK_INTERVAL = 64
+
+
+class BudgetExceeded(Exception):
+    '''Raised when an evaluation exceeds one of the limits of its Budget;
+       limit is the name of that limit and usage reports what was used'''
+
+    def __init__(self, limit, usage):
+        self.limit = limit
+        self.usage = usage
+        super().__init__("{} budget exceeded: used {}".format(
+            limit, ", ".join("{} {}".format(name, value)
+                             for name, value in usage.items())))
+
+
+class Budget:
+    '''Maximum number of steps (procedure calls), seconds, call depth and
+       allocated objects of an evaluation; None means no limit.  A Budget
+       is a context manager, which starts counting when entered; usage()
+       reports what was used, also after the evaluation.'''
+
+    def __init__(self, steps=None, seconds=None, depth=None,
+                 allocations=None, clock=time.monotonic):
+        self.max_steps = steps
+        self.seconds = seconds
+        self.max_depth = depth
+        self.max_allocations = allocations
+        self.clock = clock
+        self.lock = threading.Lock()   # the threads of tasks share steps
+        self.start()
+
+    def start(self):
+        '''Resets the counts'''
+        self.steps = 0
+        self.local = threading.local()   # depth: that of the thread
+        self.deepest = 0
+        self.started = self.clock()
+        self.deadline = (None if self.seconds is None
+                         else self.started + self.seconds)
+        self.blocks = sys.getallocatedblocks()
+        self.next_check = CHECK_INTERVAL
+
+    def usage(self):
+        '''Returns a dict of the resources used'''
+        return {'steps': self.steps,
+                'seconds': round(self.clock() - self.started, 6),
+                'depth': self.deepest,
+                'allocations': max(0, sys.getallocatedblocks() -
+                                   self.blocks)}
+
+    def step(self):
+        '''Counts a procedure call'''
+        with self.lock:
+            self.steps += 1
+            steps = self.steps
+            check = steps >= self.next_check
+            if check:
+                self.next_check += CHECK_INTERVAL
+        if self.max_steps is not None and steps > self.max_steps:
+            raise BudgetExceeded('steps', self.usage())
+        if check:
+            self.check()
+
+    def check(self):
+        '''Checks the time and allocation limits'''
+        if self.deadline is not None and self.clock() > self.deadline:
+            raise BudgetExceeded('seconds', self.usage())
+        if (self.max_allocations is not None and
+                sys.getallocatedblocks() - self.blocks >
+                self.max_allocations):
+            raise BudgetExceeded('allocations', self.usage())
+
+    def enter(self):
+        '''Counts a procedure call that is not a tail call'''
+        self.step()
+        local = self.local
+        depth = local.depth = getattr(local, 'depth', 0) + 1
+        if depth > self.deepest:
+            with self.lock:
+                self.deepest = max(self.deepest, depth)
+            if self.max_depth is not None and depth > self.max_depth:
+                local.depth -= 1
+                raise BudgetExceeded('depth', self.usage())
+
+    def exit(self):
+        '''Records the end of a call counted by enter'''
+        self.local.depth -= 1
+
+    def __enter__(self):
+        self.start()
+        self.previous = monitor.swap(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        monitor.swap(self.previous)
+        self.previous = None
+
+
+class BudgetMonitor:
+    '''Finds the Budget of the current thread for the engines; active is
+       the number of budgets in use by all threads'''
+
+    def __init__(self):
+        self.active = 0
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def current(self):
+        '''Returns the Budget of the current thread, or None'''
+        return getattr(self.local, 'budget', None)
+
+    def swap(self, budget):
+        '''Makes budget, which may be None, that of the current thread;
+           returns the previous one'''
+        previous = self.current()
+        self.local.budget = budget
+        with self.lock:
+            self.active += (budget is not None) - (previous is not None)
+        return previous
+
+    def step(self):
+        '''Counts a tail call'''
+        budget = self.current()
+        if budget is not None:
+            budget.step()
+
+    def enter(self):
+        '''Counts a call which is not a tail call; returns the Budget to
+           exit when it returns, or None'''
+        budget = self.current()
+        if budget is not None:
+            budget.enter()
+        return budget
+
+    def tail_call(self, budget):
+        '''Counts a call made by the loop of an engine.  budget is None
+           for the first call made by that loop, which is entered, else
+           the Budget returned for it; returns the Budget to exit when the
+           loop ends.'''
+        if budget is None:
+            return self.enter()
+        budget.step()
+        return budget
+
+monitor = BudgetMonitor()
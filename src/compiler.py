@@ -0,0 +1,612 @@
+'''Compiles parsed lisp expressions into nested Python closures
+
+   An expression is analyzed once: special forms are recognized and
+   destructured at compile time and every sub-expression becomes a Python
+   function of a single argument, the environment.  Running the resulting
+   code, for example the body of a procedure called many times, does not
+   repeat any of the dispatching done by evaluate.
+
+   Variables are resolved when a lambda is compiled: parameters and names
+   defined in a procedure body live in the slots of a Frame and are
+   addressed as (depth, index); any other name is looked up directly in
+   the global environment.
+'''
+from functools import partial
+
+from src.budget import monitor
+from src.lazy import LazySeq, Promise
+from src.optimizer import Guarded
+from src.pairs import to_list
+from src.profiler import profiler
+from src.python_utils import is_imported
+from src.symbols import LispString, Symbol
+
+MISSING = object()
+
+
+class Frame:
+    '''The local environment of a compiled procedure: its values are held
+       in slots, addressed by position, with outer the enclosing Frame or
+       the global environment.'''
+    __slots__ = ('slots', 'outer')
+
+    def __init__(self, params, args, outer=None):
+        if len(args) != len(params):
+            raise TypeError("Procedure expects {} arguments, got {}.".format(
+                len(params), len(args)))
+        self.slots = list(args)
+        self.outer = outer
+
+
+class DynamicFrame(Frame):
+    '''A Frame for procedures whose body calls a procedure that adds names
+       to the calling environment, like from-py-load.  Names that are not
+       slots are kept in extra.'''
+    __slots__ = ('names', 'extra')
+
+    def __init__(self, names, params, args, outer=None):
+        Frame.__init__(self, params, args, outer)
+        self.names = names
+        self.extra = {}
+
+    def update(self, bindings):
+        '''Adds or rebinds names, as dict.update does for Env'''
+        for var, value in dict(bindings).items():
+            if var in self.names:
+                self.slots[self.names.index(var)] = value
+            else:
+                self.extra[var] = value
+
+
+class Scope:
+    '''Compile time description of the environment: the names held in the
+       slots of a procedure's Frame, and the enclosing Scope.  The global
+       Scope has no outer Scope and holds the global environment.'''
+
+    def __init__(self, names=(), outer=None, env=None, dynamic=False):
+        self.names = list(names)
+        self.outer = outer
+        self.env = env if outer is None else outer.env
+        self.own_dynamic = dynamic
+        self.dynamic = dynamic or (outer is not None and outer.dynamic)
+
+    def address(self, var):
+        '''Returns (depth, index) of a local variable, or None'''
+        depth = 0
+        scope = self
+        while scope.outer is not None:
+            if var in scope.names:
+                return depth, scope.names.index(var)
+            scope = scope.outer
+            depth += 1
+        return None
+
+
+class TailCall:
+    '''A call to a compiled procedure made in tail position; it is returned
+       to the loop in run() instead of being made directly.'''
+    __slots__ = ('procedure', 'args')
+
+    def __init__(self, procedure, args):
+        self.procedure = procedure
+        self.args = args
+
+
+def run(code, env):
+    '''Runs compiled code in an environment, looping over tail calls so
+       that they run in constant stack depth'''
+    result = code(env)
+    if type(result) is TailCall:
+        return run_tail_calls(result)
+    return result
+
+
+def run_tail_calls(result):
+    '''Makes the TailCall result, then those its procedure returns, until
+       a value is returned'''
+    profiled = False   # True once a tail call was recorded by profiler
+    try:
+        while type(result) is TailCall:
+            procedure = result.procedure
+            if profiler.active:
+                profiled = profiler.tail_call(procedure, profiled)
+            if monitor.active:   # depth was counted by Procedure.__call__
+                monitor.step()
+            args = result.args
+            if procedure.opt_param:
+                args = procedure.pack_args(args)
+            result = procedure.body(
+                procedure.env_cls(procedure.params, args, procedure.env))
+    finally:
+        if profiled:
+            profiler.exit()
+    return result
+
+
+# calling conventions
+PLAIN, ENV_AWARE, TAIL, PYTHON = 'plain', 'env-aware', 'tail', 'python'
+
+
+def is_env_aware(procedure):
+    '''True if procedure expects the calling environment as env= argument'''
+    kwdefaults = getattr(procedure, '__kwdefaults__', None)
+    return kwdefaults is not None and "env" in kwdefaults
+
+
+class Compiler:
+    "Compile a Lisp expression into a Python closure"
+
+    def __init__(self, procedure_cls=None):
+        self.procedure_cls = procedure_cls
+        self.special_forms = {
+            'undefined?': self.compile_undefined,
+            'quote': self.compile_quote,
+            'define': self.compile_define,
+            'set!': self.compile_set,
+            'lambda': self.compile_lambda,
+            'cond': self.compile_cond,
+            'if': self.compile_if,
+            'begin': self.compile_begin,
+            'and': self.compile_and,
+            'or': self.compile_or,
+            'when': self.compile_when,
+            'unless': self.compile_unless,
+            'let': self.compile_let,
+            'delay': self.compile_delay,
+            'lazy-seq': self.compile_lazy_seq
+        }
+
+    def execute(self, x, env):
+        "Compile an expression, then run it in the global environment env."
+        return run(self.compile(x, Scope(env=env)), env)
+
+    def compile(self, x, scope, tail=False):
+        '''Returns a function of an environment that evaluates x;
+           tail is true if x is in tail position of a procedure body.'''
+        if isinstance(x, str):
+            if type(x) is LispString:
+                return self.compile_constant(x)
+            return self.compile_variable(x, scope)
+        elif type(x) is Guarded:
+            return self.compile_guarded(x, scope, tail)
+        elif not isinstance(x, list):
+            return self.compile_constant(x)
+        elif (isinstance(x[0], str) and type(x[0]) is not LispString
+                and x[0] in self.special_forms):
+            return self.special_forms[x[0]](x, scope, tail)
+        else:
+            return self.compile_call(x, scope, tail)
+
+    @staticmethod
+    def compile_constant(value):
+        '''constant literal'''
+        return lambda env: value
+
+    def compile_variable(self, var, scope):
+        '''variable reference'''
+        address = scope.address(var)
+        if address is not None:
+            return self.compile_local(*address)
+        elif scope.dynamic:
+            return self.compile_dynamic(var)
+        return self.compile_global(var, scope.env)
+
+    @staticmethod
+    def compile_local(depth, index):
+        '''reference to the slot index of the Frame depth levels up'''
+        if depth == 0:
+            return lambda frame: frame.slots[index]
+        elif depth == 1:
+            return lambda frame: frame.outer.slots[index]
+        elif depth == 2:
+            return lambda frame: frame.outer.outer.slots[index]
+
+        def local(frame):
+            for _ in range(depth):
+                frame = frame.outer
+            return frame.slots[index]
+        return local
+
+    @staticmethod
+    def compile_global(var, genv):
+        '''reference to a name of the global environment'''
+        get = genv.get
+
+        def global_(env):
+            value = get(var, MISSING)
+            if value is MISSING:
+                return genv.find(var)[var]
+            return value
+        return global_
+
+    @staticmethod
+    def compile_dynamic(var):
+        '''reference to a name that may have been added to a DynamicFrame'''
+        def dynamic(env):
+            while isinstance(env, Frame):
+                if type(env) is DynamicFrame and var in env.extra:
+                    return env.extra[var]
+                env = env.outer
+            return env.find(var)[var]
+        return dynamic
+
+    def compile_guarded(self, x, scope, tail):
+        '''expression rewritten by the optimizer'''
+        optimized = self.compile(x.optimized, scope, tail)
+        original = self.compile(x.original, scope, tail)
+
+        def guarded(env):
+            if x.version != x.env.version:
+                x.revalidate()
+            if x.optimized is x.original:   # no longer valid
+                return original(env)
+            return optimized(env)
+        return guarded
+
+    def compile_undefined(self, x, scope, tail):
+        '''(undefined? x)'''
+        var = x[1]
+        if scope.address(var) is not None:
+            return self.compile_constant(False)
+        reference = self.compile_variable(var, scope)
+
+        def undefined(env):
+            try:
+                reference(env)
+                return False
+            except ValueError:
+                return True
+        return undefined
+
+    def compile_quote(self, x, scope, tail):
+        '''(quote exp), or 'exp'''
+        (_, exp) = x
+        return self.compile_constant(exp)
+
+    def compile_define(self, x, scope, tail):
+        '''(define var exp)'''
+        (_, var, exp) = x
+        value = self.compile(exp, scope)
+        procedure_cls = self.procedure_cls
+
+        def named(env):
+            val = value(env)
+            if type(val) is procedure_cls and val.name is None:
+                val.name = var
+            return val
+        if scope.outer is None:
+            def define(env):
+                env[var] = named(env)
+                env.version += 1
+            return define
+        index = scope.names.index(var)
+
+        def define_local(frame):
+            frame.slots[index] = named(frame)
+        return define_local
+
+    def compile_set(self, x, scope, tail):
+        '''(set! var exp)'''
+        (_, var, exp) = x
+        value = self.compile(exp, scope)
+        address = scope.address(var)
+        if address is None:
+            genv = scope.env
+
+            def set_global(env):
+                target = genv.find(var)
+                target[var] = value(env)
+                target.version += 1
+            return set_global
+        depth, index = address
+
+        def set_local(frame):
+            target = frame
+            for _ in range(depth):
+                target = target.outer
+            target.slots[index] = value(frame)
+        return set_local
+
+    def compile_lambda(self, x, scope, tail):
+        '''(lambda (params*) body)'''
+        params, body, opt_param, env_cls = self.compile_procedure(x, scope)
+        procedure_cls = self.procedure_cls
+
+        def lambda_(env):
+            return procedure_cls(params, body, env, opt_param, run, env_cls)
+        return lambda_
+
+    def compile_procedure(self, x, scope):
+        '''Compiles (lambda (params*) body) in scope and returns the
+           (params, body, opt_param, env_cls) of the Procedures it creates;
+           body.source records x and scope so that it can be recompiled.'''
+        (_, params, body) = x
+        params = list(params)
+        opt_param = False
+        if '.' in params:
+            opt_param = params.index('.')
+            params.pop(opt_param)
+        defined, dynamic = self.scan_body(body, scope)
+        local_names = [var for var in defined if var not in params]
+        names = params + local_names
+        inner = Scope(names, scope, dynamic=dynamic)
+        code = self.compile(body, inner, tail=True)
+        if local_names:
+            code = self.with_locals(code, len(local_names))
+        code.source = (x, scope)
+        if dynamic:
+            env_cls = partial(DynamicFrame, names)
+        else:
+            env_cls = Frame
+        return params, code, opt_param, env_cls
+
+    @staticmethod
+    def with_locals(body, count):
+        '''Adds slots for the names defined inside a procedure body'''
+        padding = [None] * count
+
+        def body_with_locals(frame):
+            frame.slots.extend(padding)
+            return body(frame)
+        return body_with_locals
+
+    def scan_body(self, x, scope, defined=None):
+        '''Finds the names defined in a procedure body, not counting nested
+           lambdas, and whether it calls a procedure that expects the
+           calling environment; returns (defined, dynamic)'''
+        if defined is None:
+            defined = []
+        dynamic = False
+        if type(x) is Guarded:
+            x = x.original
+        if not isinstance(x, list) or not x:
+            return defined, dynamic
+        head = x[0]
+        if head in ('quote', 'lambda'):
+            return defined, dynamic
+        elif head == 'let':   # only the initial values are in this scope
+            for (_, exp) in x[1]:
+                dynamic = self.scan_body(exp, scope, defined)[1] or dynamic
+            return defined, dynamic
+        if head == 'define' and len(x) == 3 and x[1] not in defined:
+            defined.append(x[1])
+        elif (isinstance(head, str) and head not in self.special_forms
+                and scope.address(head) is None
+                and is_env_aware(scope.env.get(head))):
+            dynamic = True
+        for exp in x[1:]:
+            dynamic = self.scan_body(exp, scope, defined)[1] or dynamic
+        return defined, dynamic
+
+    def compile_cond(self, x, scope, tail):
+        '''(cond (p1 e1) ... (pn en))'''
+        clauses = [(self.compile(p, scope), self.compile(e, scope, tail))
+                   for (p, e) in x[1:]]
+
+        def cond(env):
+            for (p, e) in clauses:
+                if p(env):
+                    return e(env)
+        return cond
+
+    def compile_if(self, x, scope, tail):
+        '''(if test if_true other)'''
+        (_, test, if_true, other) = x
+        test = self.compile(test, scope)
+        if_true = self.compile(if_true, scope, tail)
+        other = self.compile(other, scope, tail)
+
+        def if_(env):
+            return if_true(env) if test(env) else other(env)
+        return if_
+
+    def compile_begin(self, x, scope, tail):
+        '''(begin exp1 ... exp_last)'''
+        return self.compile_sequence(x[1:], scope, tail)
+
+    def compile_sequence(self, exps, scope, tail):
+        '''evaluates all expressions and returns the value of the last one'''
+        if not exps:
+            return self.compile_constant(None)
+        elif len(exps) == 1:
+            return self.compile(exps[0], scope, tail)
+        first = [self.compile(exp, scope) for exp in exps[:-1]]
+        last = self.compile(exps[-1], scope, tail)
+
+        def sequence(env):
+            for exp in first:
+                exp(env)
+            return last(env)
+        return sequence
+
+    def compile_and(self, x, scope, tail):
+        '''(and exp1 ... exp_last)'''
+        if len(x) == 1:
+            return self.compile_constant(True)
+        first = [self.compile(exp, scope) for exp in x[1:-1]]
+        last = self.compile(x[-1], scope, tail)
+
+        def and_(env):
+            for exp in first:
+                val = exp(env)
+                if not val:
+                    return val
+            return last(env)
+        return and_
+
+    def compile_or(self, x, scope, tail):
+        '''(or exp1 ... exp_last)'''
+        if len(x) == 1:
+            return self.compile_constant(False)
+        first = [self.compile(exp, scope) for exp in x[1:-1]]
+        last = self.compile(x[-1], scope, tail)
+
+        def or_(env):
+            for exp in first:
+                val = exp(env)
+                if val:
+                    return val
+            return last(env)
+        return or_
+
+    def compile_when(self, x, scope, tail):
+        '''(when test exp1 ... exp_last)'''
+        test = self.compile(x[1], scope)
+        body = self.compile_sequence(x[2:], scope, tail)
+
+        def when(env):
+            if test(env):
+                return body(env)
+        return when
+
+    def compile_unless(self, x, scope, tail):
+        '''(unless test exp1 ... exp_last)'''
+        test = self.compile(x[1], scope)
+        body = self.compile_sequence(x[2:], scope, tail)
+
+        def unless(env):
+            if not test(env):
+                return body(env)
+        return unless
+
+    def compile_let(self, x, scope, tail):
+        '''(let ((var exp)*) exp1 ... exp_last); the body is compiled like
+           that of a procedure, with the variables in a new Frame'''
+        params = [var for (var, _) in x[1]]
+        inits = [self.compile(exp, scope) for (_, exp) in x[1]]
+        defined, dynamic = [], False
+        for exp in x[2:]:
+            dynamic = self.scan_body(exp, scope, defined)[1] or dynamic
+        names = params + [var for var in defined if var not in params]
+        inner = Scope(names, scope, dynamic=dynamic)
+        body = self.compile_sequence(x[2:], inner, tail)
+        if len(names) > len(params):
+            body = self.with_locals(body, len(names) - len(params))
+        if dynamic:
+            env_cls = partial(DynamicFrame, names)
+        else:
+            env_cls = Frame
+
+        def let(env):
+            return body(env_cls(params, [init(env) for init in inits], env))
+        return let
+
+    def compile_delay(self, x, scope, tail):
+        '''(delay exp)'''
+        code = self.compile(x[1], scope)
+        return lambda env: Promise(partial(code, env))
+
+    def compile_lazy_seq(self, x, scope, tail):
+        '''(lazy-seq exp)'''
+        code = self.compile(x[1], scope)
+        return lambda env: LazySeq(partial(code, env))
+
+    def compile_call(self, x, scope, tail):
+        '''("procedure" exp*)'''
+        if (isinstance(x[0], str) and type(x[0]) is not LispString
+                and scope.address(x[0]) is None and not scope.dynamic):
+            return self.compile_global_call(x, scope, tail)
+        operator = self.compile(x[0], scope)
+        operands = [self.compile(exp, scope) for exp in x[1:]]
+        arity = len(operands)
+        first, second = (operands + [None, None])[:2]
+        procedure_cls = self.procedure_cls
+        genv = scope.env
+        own_env = scope.outer is None or scope.own_dynamic
+
+        def call(env):
+            procedure = operator(env)
+            # the arguments of most calls are evaluated without the frame
+            # of a list comprehension, which nested calls would add
+            if arity == 1:
+                args = [first(env)]
+            elif arity == 2:
+                args = [first(env), second(env)]
+            else:
+                args = [operand(env) for operand in operands]
+            if type(procedure) is procedure_cls and procedure.evaluate is run:
+                if tail:
+                    return TailCall(procedure, args)
+                elif monitor.active or profiler.active:
+                    return procedure(*args)
+                # as procedure(*args) would, with fewer Python frames
+                if procedure.opt_param:
+                    args = procedure.pack_args(args)
+                result = procedure.body(procedure.env_cls(
+                    procedure.params, args, procedure.env))
+                if type(result) is TailCall:
+                    return run_tail_calls(result)
+                return result
+            elif is_env_aware(procedure):
+                return procedure(*args, env=env if own_env else genv)
+            elif is_imported(procedure):
+                return procedure(*[to_list(arg) for arg in args])
+            return procedure(*args)
+        return call
+
+    def call_kind(self, procedure):
+        '''How compiled code calls procedure: TAIL for a compiled
+           Procedure, whose tail calls are made by run(), ENV_AWARE for a
+           procedure expecting the calling environment as env= argument,
+           PYTHON for a callable imported from a Python module, PLAIN
+           otherwise'''
+        if (type(procedure) is self.procedure_cls
+                and procedure.evaluate is run):
+            return TAIL
+        elif is_env_aware(procedure):
+            return ENV_AWARE
+        elif is_imported(procedure):
+            return PYTHON
+        return PLAIN
+
+    def compile_global_call(self, x, scope, tail):
+        '''("procedure" exp*) calling a name of the global environment:
+           the procedure found and its call_kind are cached until a name is
+           defined or set in that environment; arguments are evaluated and
+           procedures called as by compile_call'''
+        var = x[0]
+        operands = [self.compile(exp, scope) for exp in x[1:]]
+        arity = len(operands)
+        first, second = (operands + [None, None])[:2]
+        genv = scope.env
+        get = genv.get
+        call_kind = self.call_kind
+        own_env = scope.outer is None
+        cache = (None, None, None)   # version of genv, procedure, kind
+
+        def call(env):
+            nonlocal cache
+            version, procedure, kind = cache
+            if version != genv.version:
+                procedure = get(var, MISSING)
+                if procedure is MISSING:   # found in an outer environment
+                    procedure = genv.find(var)[var]
+                    version = None
+                else:
+                    version = genv.version
+                kind = call_kind(procedure)
+                cache = (version, procedure, kind)
+            if arity == 1:
+                args = [first(env)]
+            elif arity == 2:
+                args = [first(env), second(env)]
+            else:
+                args = [operand(env) for operand in operands]
+            if kind is TAIL:
+                if tail:
+                    return TailCall(procedure, args)
+                elif monitor.active or profiler.active:
+                    return procedure(*args)
+                if procedure.opt_param:
+                    args = procedure.pack_args(args)
+                result = procedure.body(procedure.env_cls(
+                    procedure.params, args, procedure.env))
+                if type(result) is TailCall:
+                    return run_tail_calls(result)
+                return result
+            elif kind is ENV_AWARE:
+                return procedure(*args, env=env if own_env else genv)
+            elif kind is PYTHON:
+                return procedure(*[to_list(arg) for arg in args])
+            return procedure(*args)
+        return call
@@ -0,0 +1,71 @@
+'''Reading lisp data files, like tables or configurations, without
+   evaluating them
+
+   (read-data 'file) returns the top-level expressions of a file as quoted
+   data: lists, numbers, Symbols and LispStrings, as (quote ...) would.
+   The file is read by Parser.read_stream, chunk by chunk, and each
+   expression is built as soon as its tokens are read.  Files of MMAP_SIZE
+   bytes or more are memory-mapped and decoded one chunk at a time, so
+   that their text is never copied as a whole: only the expressions read
+   stay in memory, and with (read-data 'file #t), which returns a lazy
+   sequence of the top-level expressions, only those not walked down yet.
+'''
+import codecs
+import mmap
+import os
+
+from src.lazy import from_iterable
+from src.parser import Parser
+
+MMAP_SIZE = 1 << 20
+ENCODING = 'utf-8'
+
+
+class MappedText:
+    '''Text stream over the bytes of an mmap, decoded as they are read'''
+
+    def __init__(self, data, encoding=ENCODING):
+        self.data = data
+        self.decoder = codecs.getincrementaldecoder(encoding)()
+
+    def read(self, size=-1):
+        text = ''
+        while not text:   # a chunk may end inside a character
+            chunk = self.data.read(size)
+            text = self.decoder.decode(chunk, final=not chunk)
+            if not chunk:
+                break
+        return text
+
+
+def iter_data(path, use_mmap=None, parser=Parser()):
+    '''Yields the expressions of a data file, reading it as they are
+       needed.  The file is memory-mapped if use_mmap is true or, by
+       default, if it has at least MMAP_SIZE bytes; otherwise it is read
+       as a text file.'''
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if use_mmap is None:
+            use_mmap = size >= MMAP_SIZE
+        if use_mmap and size:   # empty files cannot be mapped
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                for expr, _, _ in parser.read_stream(MappedText(data)):
+                    yield expr
+            return
+    with open(path, encoding=ENCODING) as f:
+        for expr, _, _ in parser.read_stream(f):
+            yield expr
+
+
+def read_data(path, lazy=False):
+    '''(read-data 'file) ==> list of the expressions of a data file, which
+       are not evaluated; (read-data 'file #t) ==> lazy sequence of those
+       expressions, read from the file when needed'''
+    items = iter_data(str(path))
+    if lazy:
+        return from_iterable(items)
+    return list(items)
+
+data_fns = {
+    'read-data': read_data
+}
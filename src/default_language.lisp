@@ -12,17 +12,27 @@
 (set-docstring null? "(null? x) ==>  true x is the empty list '() ")
 
 
+;; and/or are special forms which only evaluate the arguments they need;
+;; the procedures below are used when and/or are passed as values
+(define __all__ (lambda (y)
+    (cond ((null? y) #t)
+          ((not (car y)) #f)
+          (else (__all__ (cdr y))))
+    ))
 (define and (lambda (x . y)
     (cond ( (not x) #f)
-        ((null? y) #t)
-          (else (and (car y) (cdr y))))
+          (else (__all__ y)))
     ))
 (set-docstring and "(and arg1 arg2 ...) ==>  true if all args are true ")
 
+(define __any__ (lambda (y)
+    (cond ((null? y) #f)
+          ((car y) #t)
+          (else (__any__ (cdr y))))
+    ))
 (define or (lambda (x . y)
     (cond ( x #t)
-        ((null? y) #f)
-          (else (or (car y) (cdr y))))
+          (else (__any__ y)))
     ))
 (set-docstring or "(or arg1 arg2 ...) ==>  true if at least one arg is true ")
 
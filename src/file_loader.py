@@ -1,3 +1,10 @@
+import io
+import os
+
+from src.budget import BudgetExceeded
+from src.parse_cache import MAX_SIZE
+from src.parser import Parser
+from src.repl import InteractiveInterpreter
 
 DEBUG = False
 
@@ -5,45 +12,63 @@ DEBUG = False
 class FileLoader:
     """Execute a "lisp" program in a file"""
 
-    def __init__(self, evaluate=None, parse=None):
+    def __init__(self, evaluate=None, parse=None, read_stream=None,
+                 cache=None):
         self.parse = parse
+        self.to_string = InteractiveInterpreter().to_string
+        self.cache = cache
         self.evaluate = evaluate
+        if read_stream is None:
+            read_stream = Parser().read_stream
+        self.read_stream = read_stream
 
     def load(self, filename):
         '''loads, parse and evaluate/executes a lisp program'''
         if DEBUG:
             print("    --> Loading {}".format(filename))
 
-        with open(filename, "r") as f:
-            program = f.readlines()
-        rps = self.running_paren_sums(program)
-        full_line = ""
-        for ((linenumber, paren_sum), program_line) in zip(rps, program):
-            if ";" in program_line:
-                program_line = program_line.split(";")[0]
-            program_line = program_line.strip()
-            full_line += program_line + " "
-            if paren_sum == 0 and full_line.strip():
-                try:
-                    val = self.evaluate(self.parse(full_line))
-                    if val is not None:
-                        print(val)
-                except Exception as e:
-                    print("\n    An error occured in loading %s:" % filename)
-                    print("line {}:\n{}".format(linenumber, full_line))
-                    print('      {}: {}'.format(type(e).__name__, e))
-                    break
-                full_line = ""
-
-    def running_paren_sums(self, program):
-        """
-        Map the lines in the list program to a list whose entries contain
-        a running sum of the per-line difference between the number of '('
-        parentheses and the number of ')' parentheses.
-        """
-        total = 0
-        rps = []
-        for linenumber, line in enumerate(program):
-            total += line.count("(")-line.count(")")
-            rps.append((linenumber, total))
-        return rps
+        if self.cache is None:
+            with open(filename, "r") as f:
+                self.load_stream(f, filename)
+            return
+        stat = os.stat(filename)
+        forms = self.cache.get(filename, stat)
+        if forms is None and stat.st_size <= MAX_SIZE:
+            with open(filename, "rb") as f:
+                data = f.read()
+            try:
+                forms = list(self.read_stream(io.StringIO(data.decode())))
+            except SyntaxError:
+                pass  # reported below, after evaluating the valid part
+            else:
+                self.cache.put(filename, data, forms, stat)
+        if forms is None:
+            with open(filename, "r") as f:
+                self.load_stream(f, filename)
+        else:
+            self.evaluate_forms(forms, filename)
+
+    def load_stream(self, stream, name="<stream>"):
+        '''parse and evaluate/executes a lisp program read from a text
+           stream, one top-level expression at a time'''
+        try:
+            self.evaluate_forms(self.read_stream(stream), name)
+        except SyntaxError as e:
+            print("\n    An error occured in loading %s:" % name)
+            print('      {}: {}'.format(type(e).__name__, e))
+
+    def evaluate_forms(self, forms, name):
+        '''evaluate/executes a sequence of (expr, line, column), stopping
+           at the first error'''
+        for expr, linenumber, column in forms:
+            try:
+                val = self.evaluate(expr)
+                if val is not None:
+                    print(self.to_string(val))
+            except BudgetExceeded:
+                raise   # stops the whole evaluation, not just this file
+            except Exception as e:
+                print("\n    An error occured in loading %s:" % name)
+                print("line {}, column {}".format(linenumber, column))
+                print('      {}: {}'.format(type(e).__name__, e))
+                break
@@ -0,0 +1,260 @@
+'''Promises and lazy sequences
+
+   (delay exp) and (lazy-seq exp) are special forms: exp is evaluated the
+   first time its value is needed, by force or by walking down the
+   sequence, and that value is remembered.  A realized lazy sequence is
+   made of Pairs whose last cdr is another lazy sequence, so that car, cdr
+   and cons work on it as on lists.
+
+   Python iterables, like the generators and files returned by with-py-inst,
+   become lazy sequences with (seq iterable), which reads one item at a time.
+   Walking down a sequence without keeping a reference to its head runs in
+   constant memory, since the Pairs already visited can be freed;
+   lazy-for-each does so even though its caller holds the head.
+
+   Each element read by walk or lazy-for-each counts as a step of the
+   Budget of the thread, if any, so that a runaway sequence cannot escape
+   the limits of an evaluation.
+'''
+import itertools
+import threading
+
+from src.budget import monitor
+from src.pairs import Pair, from_list
+
+PRINT_LENGTH = 20   # number of elements of a lazy sequence shown by the repl
+
+
+class Promise:
+    '''The value of an expression, computed when first forced'''
+    __slots__ = ('thunk', 'value')
+
+    def __init__(self, thunk):
+        self.thunk = thunk
+        self.value = None
+
+    def force(self):
+        if self.thunk is not None:
+            self.value = self.thunk()
+            self.thunk = None
+        return self.value
+
+
+class LazySeq:
+    '''A sequence whose first Pair is computed by a function without
+       arguments, when first needed.  That function returns a lisp list,
+       possibly ending with other lazy sequences, or another LazySeq.
+
+       Sequences read from a Python iterator share a lock, so that several
+       threads may walk down them without losing items.'''
+    __slots__ = ('thunk', 'seq', 'lock')
+
+    def __init__(self, thunk, lock=None):
+        self.thunk = thunk
+        self.seq = None
+        self.lock = lock
+
+    def realize(self):
+        '''Returns the first Pair of the sequence, or [] if it is empty'''
+        if self.thunk is not None:
+            if self.lock is None:
+                self._realize()
+            else:
+                with self.lock:
+                    if self.thunk is not None:
+                        self._realize()
+        return self.seq
+
+    def _realize(self):
+        value = self.thunk()
+        while type(value) is LazySeq:   # without recursing, if possible
+            if value.thunk is None or value.lock is not None:
+                value = value.realize()
+            else:
+                value = value.thunk()
+        if isinstance(value, list):
+            value = from_list(value)
+        elif type(value) is not Pair:
+            raise TypeError("lazy-seq expression must return a list, "
+                            "not {}.".format(type(value).__name__))
+        self.seq = value
+        self.thunk = None
+
+    def first(self):
+        seq = self.realize()
+        if not seq:
+            raise IndexError("car of an empty lazy sequence.")
+        return seq.car
+
+    def rest(self):
+        seq = self.realize()
+        if not seq:
+            raise IndexError("cdr of an empty lazy sequence.")
+        return seq.cdr
+
+    def __bool__(self):
+        return bool(self.realize())
+
+    def __iter__(self):
+        return walk(self)
+
+    def __eq__(self, other):
+        if not isinstance(other, (list, Pair, LazySeq)):
+            return NotImplemented
+        missing = object()
+        return all(a == b for a, b in
+                   itertools.zip_longest(self, other, fillvalue=missing))
+
+    __hash__ = None
+
+    def __repr__(self):
+        if self.thunk is not None:
+            return "LazySeq(...)"
+        return "LazySeq({!r})".format(self.seq)
+
+
+def walk(node):
+    '''Yields the elements of a lisp list or lazy sequence; walk does not
+       keep a reference to the Pairs it has already gone through'''
+    budget = monitor.current()
+    while True:
+        if type(node) is LazySeq:
+            node = node.realize()
+        if type(node) is Pair:
+            if budget is not None:
+                budget.step()
+            yield node.car
+            node = node.cdr
+        else:
+            yield from node
+            return
+
+
+class Step:
+    '''Reads the next item of a Python iterator, as the thunk of the
+       lazy sequences made by from_iterable'''
+    __slots__ = ('iterator', 'lock')
+
+    def __init__(self, iterator, lock):
+        self.iterator = iterator
+        self.lock = lock
+
+    def __call__(self):
+        for item in self.iterator:
+            return Pair(item, LazySeq(self, self.lock))
+        return []
+
+
+def from_iterable(iterable):
+    '''Lazy sequence of the items of a Python iterable'''
+    lock = threading.Lock()
+    return LazySeq(Step(iter(iterable), lock), lock)
+
+
+def consumed():
+    raise ValueError("This lazy sequence was consumed by lazy-for-each.")
+
+
+def consume(sequence):
+    '''Iterator over the elements of sequence.  If it is a sequence read
+       from a Python iterable that has not been walked down yet, items are
+       read directly from that iterable and are not remembered, so that
+       the sequence cannot be used afterwards: its head, held by the
+       caller, does not keep all its elements in memory.'''
+    if type(sequence) is LazySeq and sequence.lock is not None:
+        with sequence.lock:
+            step = sequence.thunk
+            if type(step) is Step:
+                sequence.thunk = consumed
+                return counted(step.iterator)
+    return walk(sequence)
+
+
+def counted(iterator):
+    '''Yields the items of iterator, counting each as a step of the Budget
+       of the current thread, if any'''
+    budget = monitor.current()
+    for item in iterator:
+        if budget is not None:
+            budget.step()
+        yield item
+
+
+def is_lazy(obj):
+    '''(lazy-seq? obj) ==> true if obj is a lazy sequence'''
+    return type(obj) is LazySeq
+
+
+def force(obj):
+    '''(force promise) ==> value of the expression of a promise made by
+       delay; other values are returned unchanged'''
+    if type(obj) is Promise:
+        return obj.force()
+    return obj
+
+
+def seq(iterable):
+    '''(seq iterable) ==> lazy sequence of the items of a Python iterable,
+       like a generator or a file, read when needed'''
+    if type(iterable) is LazySeq:
+        return iterable
+    return from_iterable(iterable)
+
+
+def lazy_range(*args):
+    '''(range) ==> lazy sequence 0 1 2 ...; (range n), or (range start
+       stop [step]) ==> lazy sequence of the integers of Python's range'''
+    if not args:
+        return from_iterable(itertools.count())
+    return from_iterable(range(*args))
+
+
+def lazy_map(procedure, *seqs):
+    '''(lazy-map procedure seq ...) ==> lazy sequence of the results of
+       procedure applied to the elements of the sequences, in turn'''
+    return from_iterable(map(procedure, *map(walk, seqs)))
+
+
+def lazy_filter(predicate, sequence):
+    '''(lazy-filter predicate seq) ==> lazy sequence of the elements of seq
+       for which predicate is true'''
+    return from_iterable(filter(predicate, walk(sequence)))
+
+
+def take(n, sequence):
+    '''(take n seq) ==> list of the first n elements of seq, or of all of
+       them if it has fewer'''
+    return list(itertools.islice(walk(sequence), n))
+
+
+def drop(n, sequence):
+    '''(drop n seq) ==> lazy sequence of the elements of seq after the
+       first n'''
+    return from_iterable(itertools.islice(walk(sequence), n, None))
+
+
+def seq_to_list(sequence):
+    '''(seq->list seq) ==> list of all the elements of a finite seq'''
+    return list(walk(sequence))
+
+
+def lazy_for_each(procedure, sequence):
+    '''(lazy-for-each procedure seq) ==> applies procedure to each element
+       of seq, in constant memory; a sequence read from a Python iterable,
+       like those returned by seq, range, lazy-map and lazy-filter, can
+       only be consumed once that way'''
+    for item in consume(sequence):
+        procedure(item)
+
+lazy_fns = {
+    'force': force,
+    'lazy-seq?': is_lazy,
+    'seq': seq,
+    'range': lazy_range,
+    'lazy-map': lazy_map,
+    'lazy-filter': lazy_filter,
+    'take': take,
+    'drop': drop,
+    'seq->list': seq_to_list,
+    'lazy-for-each': lazy_for_each
+}
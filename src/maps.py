@@ -0,0 +1,424 @@
+'''Hash maps and hash sets
+
+   Persistent maps and sets never change: put and remove return a new
+   collection sharing most of its structure with the old one, in a hash
+   array mapped trie, so that each takes O(log32 n) time.  Mutable maps and
+   sets are Python dicts and sets, changed in place by put! and remove!.
+   Lookups take constant time in both cases.
+'''
+from collections.abc import Mapping, Set
+
+BITS = 5
+MASK = (1 << BITS) - 1
+HASH_MASK = (1 << 64) - 1
+_MISSING = object()
+
+
+def key_hash(key):
+    '''Non negative hash of key, whose bits select a path in the trie'''
+    return hash(key) & HASH_MASK
+
+
+def _bit(h, shift):
+    return 1 << ((h >> shift) & MASK)
+
+
+def _index(bitmap, bit):
+    return bin(bitmap & (bit - 1)).count('1')
+
+
+def _replace(entries, index, entry):
+    return entries[:index] + (entry,) + entries[index + 1:]
+
+
+class _Node:
+    '''Node of the trie.  Bit i of bitmap is set if the node has an entry
+       for the keys whose hash has i as their next BITS bits; entries
+       holds those present, in order.  An entry is a (key, value) tuple,
+       a _Node or a _Collision.'''
+    __slots__ = ('bitmap', 'entries')
+
+    def __init__(self, bitmap, entries):
+        self.bitmap = bitmap
+        self.entries = entries
+
+    def find(self, h, shift, key):
+        bit = _bit(h, shift)
+        if not self.bitmap & bit:
+            return _MISSING
+        entry = self.entries[_index(self.bitmap, bit)]
+        if type(entry) is tuple:
+            if entry[0] is key or entry[0] == key:
+                return entry[1]
+            return _MISSING
+        return entry.find(h, shift + BITS, key)
+
+    def assoc(self, h, shift, key, value):
+        '''Returns the node with key set to value, and whether key is new'''
+        bit = _bit(h, shift)
+        index = _index(self.bitmap, bit)
+        if not self.bitmap & bit:
+            entries = (self.entries[:index] + ((key, value),) +
+                       self.entries[index:])
+            return _Node(self.bitmap | bit, entries), True
+        entry = self.entries[index]
+        if type(entry) is tuple:
+            old_key, old_value = entry
+            if old_key is key or old_key == key:
+                if old_value is value:
+                    return self, False
+                entry = (old_key, value)
+            else:
+                entry = _split(key_hash(old_key), entry, h, (key, value),
+                               shift + BITS)
+            added = type(entry) is not tuple
+        else:
+            entry, added = entry.assoc(h, shift + BITS, key, value)
+            if entry is self.entries[index]:
+                return self, False
+        return _Node(self.bitmap, _replace(self.entries, index, entry)), added
+
+    def dissoc(self, h, shift, key):
+        '''Returns the node without key: self if key is absent, None if
+           nothing remains, or a lone entry which needs no node'''
+        bit = _bit(h, shift)
+        if not self.bitmap & bit:
+            return self
+        index = _index(self.bitmap, bit)
+        entry = self.entries[index]
+        if type(entry) is tuple:
+            if not (entry[0] is key or entry[0] == key):
+                return self
+            entry = None
+        else:
+            entry = entry.dissoc(h, shift + BITS, key)
+            if entry is self.entries[index]:
+                return self
+        if entry is not None:
+            if len(self.entries) == 1 and type(entry) is not _Node:
+                return entry
+            return _Node(self.bitmap, _replace(self.entries, index, entry))
+        if len(self.entries) == 1:
+            return None
+        entries = self.entries[:index] + self.entries[index + 1:]
+        if len(entries) == 1 and type(entries[0]) is not _Node:
+            return entries[0]
+        return _Node(self.bitmap ^ bit, entries)
+
+    def __iter__(self):
+        for entry in self.entries:
+            if type(entry) is tuple:
+                yield entry
+            else:
+                yield from entry
+
+
+class _Collision:
+    '''The (key, value) tuples of different keys with the same hash'''
+    __slots__ = ('hash', 'entries')
+
+    def __init__(self, h, entries):
+        self.hash = h
+        self.entries = entries
+
+    def find(self, h, shift, key):
+        if h == self.hash:
+            for old_key, value in self.entries:
+                if old_key is key or old_key == key:
+                    return value
+        return _MISSING
+
+    def assoc(self, h, shift, key, value):
+        if h != self.hash:   # goes one level down, below a new node
+            node = _Node(_bit(self.hash, shift), (self,))
+            return node.assoc(h, shift, key, value)
+        for index, (old_key, old_value) in enumerate(self.entries):
+            if old_key is key or old_key == key:
+                if old_value is value:
+                    return self, False
+                entries = _replace(self.entries, index, (old_key, value))
+                return _Collision(h, entries), False
+        return _Collision(h, self.entries + ((key, value),)), True
+
+    def dissoc(self, h, shift, key):
+        if h != self.hash:
+            return self
+        for index, (old_key, _) in enumerate(self.entries):
+            if old_key is key or old_key == key:
+                entries = self.entries[:index] + self.entries[index + 1:]
+                if len(entries) == 1:
+                    return entries[0]
+                return _Collision(h, entries)
+        return self
+
+    def __iter__(self):
+        return iter(self.entries)
+
+
+def _split(h1, entry1, h2, entry2, shift):
+    '''Returns the entry holding two tuples of different keys, at shift'''
+    if h1 == h2:
+        return _Collision(h1, (entry1, entry2))
+    bit1, bit2 = _bit(h1, shift), _bit(h2, shift)
+    if bit1 == bit2:
+        return _Node(bit1, (_split(h1, entry1, h2, entry2, shift + BITS),))
+    if bit1 < bit2:
+        return _Node(bit1 | bit2, (entry1, entry2))
+    return _Node(bit1 | bit2, (entry2, entry1))
+
+_EMPTY_NODE = _Node(0, ())
+
+
+class PersistentMap(Mapping):
+    '''Immutable hash map; set and delete return new maps.  Maps with the
+       same items are equal, whether persistent or Python dicts.'''
+    __slots__ = ('root', 'count', '_hash')
+
+    def __init__(self, items=()):
+        self.root = _EMPTY_NODE
+        self.count = 0
+        self._hash = None
+        if isinstance(items, Mapping):
+            items = items.items()
+        for key, value in items:
+            self.root, added = self.root.assoc(key_hash(key), 0, key, value)
+            self.count += added
+
+    @classmethod
+    def _make(cls, root, count):
+        result = cls.__new__(cls)
+        result.root = _EMPTY_NODE if root is None else root
+        result.count = count
+        result._hash = None
+        return result
+
+    def __getitem__(self, key):
+        value = self.root.find(key_hash(key), 0, key)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        for key, _ in self.root:
+            yield key
+
+    def __len__(self):
+        return self.count
+
+    def items(self):
+        return list(self.root)
+
+    def set(self, key, value):
+        '''Returns a map with key set to value'''
+        root, added = self.root.assoc(key_hash(key), 0, key, value)
+        if root is self.root:
+            return self
+        return self._make(root, self.count + added)
+
+    def delete(self, key):
+        '''Returns a map without key'''
+        root = self.root.dissoc(key_hash(key), 0, key)
+        if root is self.root:
+            return self
+        if type(root) is tuple:
+            root = _Node(_bit(key_hash(root[0]), 0), (root,))
+        elif type(root) is _Collision:
+            root = _Node(_bit(root.hash, 0), (root,))
+        return self._make(root, self.count - 1)
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash(frozenset(self.root))
+        return self._hash
+
+    def __repr__(self):
+        return "PersistentMap({})".format(dict(self.root))
+
+    def __reduce__(self):
+        return (PersistentMap, (self.items(),))
+
+
+class PersistentSet(Set):
+    '''Immutable hash set, stored as a PersistentMap of its elements;
+       add and discard return new sets'''
+    __slots__ = ('map',)
+
+    def __init__(self, elements=()):
+        self.map = PersistentMap((x, True) for x in elements)
+
+    @classmethod
+    def _from_iterable(cls, elements):
+        return cls(elements)
+
+    @classmethod
+    def _make(cls, map_):
+        result = cls.__new__(cls)
+        result.map = map_
+        return result
+
+    def __contains__(self, element):
+        return element in self.map
+
+    def __iter__(self):
+        return iter(self.map)
+
+    def __len__(self):
+        return len(self.map)
+
+    def add(self, element):
+        '''Returns a set with element'''
+        new = self.map.set(element, True)
+        return self if new is self.map else self._make(new)
+
+    def discard(self, element):
+        '''Returns a set without element'''
+        new = self.map.delete(element)
+        return self if new is self.map else self._make(new)
+
+    def __hash__(self):
+        return self._hash()
+
+    def __repr__(self):
+        return "PersistentSet({})".format(set(self))
+
+    def __reduce__(self):
+        return (PersistentSet, (list(self),))
+
+
+def is_hash_map(obj):
+    '''(hash-map? obj) ==> true if obj is a persistent or mutable map'''
+    return isinstance(obj, (PersistentMap, dict))
+
+
+def is_hash_set(obj):
+    '''(hash-set? obj) ==> true if obj is a persistent or mutable set'''
+    return isinstance(obj, (PersistentSet, set, frozenset))
+
+
+def pairs(items):
+    '''Returns the (key, value) pairs of a flat sequence of keys and
+       values'''
+    if len(items) % 2:
+        raise ValueError("Odd number of arguments: a key has no value.")
+    return zip(items[::2], items[1::2])
+
+
+def hash_map(*items):
+    '''(hash-map key value ...) ==> persistent map of the keys to the
+       values'''
+    return PersistentMap(pairs(items))
+
+
+def mutable_hash_map(*items):
+    '''(mutable-hash-map key value ...) ==> mutable map of the keys to the
+       values'''
+    return dict(pairs(items))
+
+
+def hash_set(*elements):
+    '''(hash-set x ...) ==> persistent set of the elements given'''
+    return PersistentSet(elements)
+
+
+def mutable_hash_set(*elements):
+    '''(mutable-hash-set x ...) ==> mutable set of the elements given'''
+    return set(elements)
+
+
+def get(collection, key, default=False):
+    '''(get map key [default]) ==> value of key in map, or default (#f);
+       (get set x [default]) ==> x if it is in set, else default'''
+    if is_hash_set(collection):
+        return key if key in collection else default
+    return collection.get(key, default)
+
+
+def put(collection, *args):
+    '''(put map key value) or (put set x) ==> new collection with key set
+       to value, or with x; mutable collections are copied'''
+    if isinstance(collection, PersistentMap):
+        return collection.set(*args)
+    elif isinstance(collection, PersistentSet):
+        return collection.add(*args)
+    return put_in_place(collection.copy(), *args)
+
+
+def put_in_place(collection, *args):
+    '''(put! map key value) or (put! set x) ==> changes a mutable map or set
+       to have key set to value, or to contain x; returns it'''
+    if isinstance(collection, dict):
+        key, value = args
+        collection[key] = value
+    elif isinstance(collection, set):
+        collection.add(*args)
+    else:
+        raise TypeError("put! requires a mutable map or set.")
+    return collection
+
+
+def remove(collection, key):
+    '''(remove map key) or (remove set x) ==> new collection without key,
+       or without x; mutable collections are copied'''
+    if isinstance(collection, PersistentMap):
+        return collection.delete(key)
+    elif isinstance(collection, PersistentSet):
+        return collection.discard(key)
+    return remove_in_place(collection.copy(), key)
+
+
+def remove_in_place(collection, key):
+    '''(remove! map key) or (remove! set x) ==> removes key, or x, from a
+       mutable map or set; returns it'''
+    if isinstance(collection, dict):
+        collection.pop(key, None)
+    elif isinstance(collection, set):
+        collection.discard(key)
+    else:
+        raise TypeError("remove! requires a mutable map or set.")
+    return collection
+
+
+def contains(collection, key):
+    '''(contains? map key) or (contains? set x) ==> true if map has key, or
+       if set has x'''
+    return key in collection
+
+
+def keys(collection):
+    '''(keys map) ==> list of the keys of map; (keys set) ==> list of the
+       elements of set'''
+    return list(collection)
+
+
+def values(collection):
+    '''(values map) ==> list of the values of map'''
+    return [value for _, value in collection.items()]
+
+
+def items(collection):
+    '''(items map) ==> list of the (key value) lists of map'''
+    return [[key, value] for key, value in collection.items()]
+
+
+def size(collection):
+    '''(size collection) ==> number of items of a map or set'''
+    return len(collection)
+
+map_fns = {
+    'hash-map': hash_map,
+    'mutable-hash-map': mutable_hash_map,
+    'hash-set': hash_set,
+    'mutable-hash-set': mutable_hash_set,
+    'hash-map?': is_hash_map,
+    'hash-set?': is_hash_set,
+    'get': get,
+    'put': put,
+    'put!': put_in_place,
+    'remove': remove,
+    'remove!': remove_in_place,
+    'contains?': contains,
+    'keys': keys,
+    'values': values,
+    'items': items,
+    'size': size
+}
@@ -0,0 +1,117 @@
+'''Memoization of pure procedures
+
+   (define fib (memoize (lambda (n) ...))) replaces a procedure by a
+   wrapper remembering the values it returned for the most recently used
+   arguments.  Recursive calls go through the global name, hence through
+   the cache, so that definitions like fib take linear instead of
+   exponential time.
+'''
+import threading
+from collections import OrderedDict
+
+from src.pairs import is_list
+from src.symbols import Symbol
+
+MAXSIZE = 1024
+_LIST = object()   # marks lists in cache keys, so they differ from tuples
+
+
+def make_key(args):
+    '''Returns a hashable key for a tuple of arguments; lisp lists are
+       converted to tuples, recursively, and other values are paired with
+       their type, so that equal values like 1, 1.0 and #t get different
+       keys'''
+    return tuple(map(freeze, args))
+
+
+def freeze(obj):
+    '''Hashable version of obj, tagged with its type'''
+    if is_list(obj):
+        return (_LIST,) + tuple(freeze(item) for item in obj)
+    return type(obj), obj
+
+
+class Memoized:
+    '''A procedure with a cache of at most maxsize values, the least
+       recently used of which is discarded first.  Calls with arguments
+       that cannot be hashed are not cached.
+
+       The cache may be used from several threads; the procedure itself is
+       called without holding the lock.'''
+
+    def __init__(self, procedure, maxsize=MAXSIZE):
+        if not isinstance(maxsize, int) or maxsize < 1:
+            raise ValueError("The size of a memoize cache must be a "
+                             "positive integer.")
+        self.procedure = procedure
+        self.maxsize = maxsize
+        self.cache = OrderedDict()
+        self.hits = self.misses = 0
+        self.lock = threading.Lock()
+        self.__doc__ = procedure.__doc__
+
+    def __call__(self, *args):
+        key = make_key(args)
+        with self.lock:
+            try:
+                value = self.cache[key]
+            except KeyError:
+                self.misses += 1
+            except TypeError:   # unhashable argument
+                self.misses += 1
+                key = None
+            else:
+                self.hits += 1
+                self.cache.move_to_end(key)
+                return value
+        value = self.procedure(*args)
+        if key is not None:
+            with self.lock:
+                self.cache[key] = value
+                if len(self.cache) > self.maxsize:
+                    self.cache.popitem(last=False)
+        return value
+
+    def clear(self):
+        '''Empties the cache and resets the statistics'''
+        with self.lock:
+            self.cache.clear()
+            self.hits = self.misses = 0
+
+    def __getstate__(self):
+        # cached values are not saved in snapshots
+        state = dict(self.__dict__)
+        del state['lock']
+        state.update(cache=OrderedDict(), hits=0, misses=0)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+
+def memoize(procedure, maxsize=MAXSIZE):
+    '''(memoize procedure [maxsize]) ==> procedure remembering the values
+       returned for its maxsize (default 1024) most recent arguments'''
+    return Memoized(procedure, maxsize)
+
+
+def memo_stats(procedure):
+    '''(memo-stats procedure) ==> ((hits h) (misses m) (size s) (maxsize n))
+       for a procedure returned by memoize'''
+    return [[Symbol('hits'), procedure.hits],
+            [Symbol('misses'), procedure.misses],
+            [Symbol('size'), len(procedure.cache)],
+            [Symbol('maxsize'), procedure.maxsize]]
+
+
+def memo_clear(procedure):
+    '''(memo-clear procedure) ==> empties the cache of a procedure returned
+       by memoize and resets its statistics'''
+    procedure.clear()
+
+memo_fns = {
+    'memoize': memoize,
+    'memo-stats': memo_stats,
+    'memo-clear': memo_clear
+}
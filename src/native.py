@@ -0,0 +1,113 @@
+'''Python implementations of procedures defined in default_language.lisp
+
+   They have the same semantics as the lisp definitions, including the way
+   Procedure.pack_args gathers the extra arguments of a procedure defined
+   as (lambda (x . y) ...): a single extra argument that is a list is
+   taken to be the list of extra arguments.  They are used instead of the
+   lisp definitions after (use-native).
+'''
+import operator
+
+from src.pairs import Pair, is_list
+
+
+def pack_rest(rest):
+    '''Returns the list of extra arguments, as Procedure.pack_args does'''
+    if len(rest) == 1 and is_list(rest[0]):
+        return rest[0]
+    return list(rest)
+
+
+def and_(x, *y):
+    '''(and arg1 arg2 ...) ==>  true if all args are true '''
+    if not x:
+        return False
+    for arg in pack_rest(y):
+        if not arg:
+            return False
+    return True
+
+
+def or_(x, *y):
+    '''(or arg1 arg2 ...) ==>  true if at least one arg is true '''
+    if x:
+        return True
+    for arg in pack_rest(y):
+        if arg:
+            return True
+    return False
+
+
+def append(x, y):
+    '''(append '(a ...) '(b ...)) ==>  (a ... b ...) '''
+    if x == []:
+        return y
+    if not is_list(y):
+        raise ValueError("Second argument of cons must be a list.")
+    if isinstance(y, list):
+        return list(x) + y
+    for item in reversed(x):
+        y = Pair(item, y)
+    return y
+
+
+def list_(x, *y):
+    '''(list a b ...) ==>  (a b ...) '''
+    return append([x], pack_rest(y))
+
+
+def chain(compare, x, y, z):
+    '''True if compare holds between consecutive arguments of (name x y . z)'''
+    for arg in pack_rest(z):
+        if not compare(x, y):
+            return False
+        x, y = y, arg
+    return compare(x, y)
+
+
+def eq(x, y, *z):
+    '''(= a b ...) ==>   a == b == ...'''
+    return chain(operator.eq, x, y, z)
+
+
+def lt(x, y, *z):
+    '''(< a b ...) ==>   a < b < ...'''
+    return chain(operator.lt, x, y, z)
+
+
+def gt(x, y, *z):
+    '''(> a b ...) ==>   a > b > ...'''
+    return chain(operator.gt, x, y, z)
+
+
+def le(x, y, *z):
+    '''(<= a b ...) ==>   a <= b <= ...'''
+    return chain(operator.le, x, y, z)
+
+
+def ge(x, y, *z):
+    '''(>= a b ...) ==>   a >= b >= ...'''
+    return chain(operator.ge, x, y, z)
+
+native_procs = {
+    'and': and_,
+    'or': or_,
+    'append': append,
+    'list': list_,
+    '=': eq,
+    '<': lt,
+    '>': gt,
+    '<=': le,
+    '>=': ge
+}
+
+
+def use_native(*names, env=None):
+    '''(use-native 'name ...) ==> replaces the lisp definitions of names,
+       or of all of and or append list = < > <= >= if no name is given,
+       by native ones.  Loading default_language.lisp restores them.'''
+    if not names:
+        names = list(native_procs)
+    env.update({name: native_procs[name] for name in names})
+    if hasattr(env, 'version'):   # procedure calls look them up again
+        env.version += 1
@@ -0,0 +1,432 @@
+'''Optimizer pass over parsed expressions, run before they are evaluated
+
+   optimizer.optimize(x, env) returns an expression equivalent to x in the
+   global environment env, where
+     - calls of pure procedures with constant arguments, like (+ 1 2), are
+       replaced by their value;
+     - if, cond, when and unless with constant tests, like (if #t a b) or
+       (cond (else x)), are replaced by the branch taken;
+     - calls of trivial global procedures, whose body calls another one
+       with their parameters, like (not x) in the prelude, are replaced by
+       that call, (__not__ x).
+
+   Pure procedures are the functions of operator and math in PURE_FUNCTIONS,
+   the ones given to the Optimizer, and lisp procedures which only call
+   pure procedures.  Optimizations relying on the value of global names,
+   like not or #t, are wrapped in a Guarded expression: as soon as one of
+   those names is defined or set again, the original expression is
+   evaluated instead.  The engines increment the version of a global Env
+   whenever a name is defined or set in it, so that Guarded expressions
+   only check their assumptions after a change.  Names defined or set
+   within the expression itself are never assumed to be constant.
+
+   Rewritten expressions are Forms, like those of the parser, so that
+   evaluate caches the procedures they call.
+'''
+import math
+import operator
+import weakref
+from numbers import Number
+
+from src.budget import Budget
+from src.symbols import Form, LispString, Symbol
+
+FOLD_STEPS = 1000     # procedure calls allowed to compute a folded value
+MAX_INLINE = 8        # depth of nested inlining
+MAX_INT = 2 ** 64     # larger integers are not folded
+LITERALS = (int, float, complex, bool, type(None), LispString)
+MISSING = object()
+
+PURE_FUNCTIONS = set(
+    [getattr(operator, name) for name in [
+        'abs', 'add', 'and_', 'eq', 'floordiv', 'ge', 'gt', 'index',
+        'invert', 'is_', 'is_not', 'le', 'lt', 'mod', 'mul', 'ne', 'neg',
+        'not_', 'or_', 'pos', 'rshift', 'sub', 'truediv', 'truth', 'xor']] +
+    [getattr(math, name) for name in [
+        'acos', 'asin', 'atan', 'atan2', 'ceil', 'cos', 'degrees', 'exp',
+        'fabs', 'floor', 'gcd', 'hypot', 'isnan', 'log', 'log10', 'radians',
+        'sin', 'sqrt', 'tan', 'trunc']])
+
+SPECIAL_FORMS = {'undefined?', 'quote', 'define', 'set!', 'lambda', 'cond',
+                 'if', 'begin', 'and', 'or', 'when', 'unless', 'let',
+                 'delay', 'lazy-seq'}
+
+
+class Guarded:
+    '''An optimized expression, valid while the global names in
+       assumptions keep the values they had in env when it was optimized;
+       version is that of env when they were last checked.  Once one of
+       them changed, optimized is replaced by the original expression.'''
+    __slots__ = ('optimized', 'original', 'assumptions', 'env', 'version')
+
+    def __init__(self, optimized, original, assumptions, env):
+        self.optimized = optimized
+        self.original = original
+        self.assumptions = assumptions
+        self.env = env
+        self.version = env.version
+
+    def revalidate(self):
+        '''Checks the assumptions after a change of the environment'''
+        env = self.env
+        for var, value in self.assumptions.items():
+            if env.get(var, MISSING) is not value:
+                self.optimized = self.original
+                self.assumptions = {}
+                break
+        self.version = env.version
+
+    def __getstate__(self):
+        return (self.optimized, self.original, self.assumptions, self.env)
+
+    def __setstate__(self, state):
+        self.optimized, self.original, self.assumptions, self.env = state
+        self.version = None   # checked against the environment it is in
+
+    def __repr__(self):
+        return "Guarded({!r})".format(self.optimized)
+
+
+def is_name(x):
+    '''True if x is a variable: a Symbol, or a str in expressions built by
+       Python code'''
+    return type(x) is Symbol or type(x) is str
+
+
+def is_special(head):
+    return is_name(head) and head in SPECIAL_FORMS
+
+
+def is_constant(x):
+    '''True if x is a literal or a quoted expression'''
+    return type(x) in LITERALS or (
+        isinstance(x, list) and len(x) == 2 and x[0] == 'quote' and
+        is_name(x[0]))
+
+
+def constant_value(x):
+    return x[1] if isinstance(x, list) else x
+
+
+def foldable(args):
+    '''True if args are small enough for a call to be computed in advance:
+       integers are bounded and sequences are never repeated'''
+    numbers = [arg for arg in args if isinstance(arg, Number)]
+    if len(numbers) < len(args) and any(type(n) is int for n in numbers):
+        return False
+    return all(type(n) is not int or abs(n) < MAX_INT for n in numbers)
+
+
+def assigned_names(x, names=None):
+    '''Returns the set of names defined or set anywhere in x'''
+    if names is None:
+        names = set()
+    if isinstance(x, list) and x and not (x[0] == 'quote'):
+        if x[0] in ('define', 'set!') and len(x) == 3 and is_name(x[1]):
+            names.add(x[1])
+        for exp in x:
+            assigned_names(exp, names)
+    return names
+
+
+def merge(*dicts):
+    result = {}
+    for d in dicts:
+        result.update(d)
+    return result
+
+
+class Optimizer:
+    '''Rewrites expressions for a global environment; procedure_cls is the
+       class of lisp procedures and pure, functions to consider pure in
+       addition to PURE_FUNCTIONS'''
+
+    def __init__(self, procedure_cls=None, pure=()):
+        self.procedure_cls = procedure_cls
+        self.pure = PURE_FUNCTIONS | set(pure)
+        self.purity_cache = weakref.WeakKeyDictionary()
+        self.forms = {
+            'if': self.rewrite_if,
+            'cond': self.rewrite_cond,
+            'when': self.rewrite_when,
+            'unless': self.rewrite_when,
+            'lambda': self.rewrite_lambda,
+            'let': self.rewrite_let
+        }
+
+    def optimize(self, x, env):
+        '''Returns an optimized version of x, a top-level expression, for
+           the global environment env'''
+        if not isinstance(x, list):
+            return x
+        expr, assumptions = self.rewrite(x, frozenset(assigned_names(x)),
+                                         env, 0)
+        return self.settle(x, expr, assumptions, env)
+
+    @staticmethod
+    def settle(original, expr, assumptions, env):
+        '''Expression to use for original, rewritten as expr, where it is
+           not part of a larger rewritten expression'''
+        if not assumptions:
+            return expr
+        elif is_name(original):   # a global constant: not worth a guard
+            return original
+        return Guarded(expr, original, assumptions, env)
+
+    def settled(self, x, bound, env, depth):
+        '''x rewritten, where it is not part of a larger rewritten
+           expression'''
+        return self.settle(x, *self.rewrite(x, bound, env, depth), env)
+
+    def rewrite(self, x, bound, env, depth):
+        '''Returns (expr, assumptions): x rewritten for a scope where the
+           names in bound are not global, and the global names and values
+           that expr relies on'''
+        if is_name(x):
+            if x not in bound:
+                value = env.get(x, MISSING)
+                if type(value) in LITERALS:
+                    return value, {x: value}
+            return x, {}
+        elif not isinstance(x, list) or not x:
+            return x, {}
+        elif is_special(x[0]):
+            form = self.forms.get(x[0])
+            if form is None:
+                return self.rewrite_parts(x, 1, bound, env, depth)
+            return form(x, bound, env, depth)
+        return self.rewrite_call(x, bound, env, depth)
+
+    def rewrite_parts(self, x, start, bound, env, depth):
+        '''Rewrites the elements of x from start on, which are expressions
+           evaluated in order, without changing x itself'''
+        if x[0] in ('quote', 'undefined?'):
+            return x, {}
+        elif x[0] in ('define', 'set!'):
+            start = 2
+        return Form(list(x[:start]) + [self.settled(exp, bound, env, depth)
+                                       for exp in x[start:]]), {}
+
+    def rewrite_call(self, x, bound, env, depth):
+        '''(procedure exp*)'''
+        results = [self.rewrite(exp, bound, env, depth) for exp in x]
+        head = x[0]
+        if is_name(head) and head not in bound:
+            value = env.get(head, MISSING)
+            args = [expr for expr, _ in results[1:]]
+            assumptions = merge({head: value},
+                                *[deps for _, deps in results])
+            inlined = None
+            if depth < MAX_INLINE:
+                inlined = self.inline(value, args, bound, env)
+            if inlined is not None:
+                expr, deps = self.rewrite(inlined, bound, env, depth + 1)
+                return expr, merge(assumptions, deps)
+            if all(is_constant(arg) for arg in args):
+                deps = self.purity(value, env, set())
+                if deps is not None:
+                    folded = self.fold(value, args)
+                    if folded is not MISSING:
+                        return folded, merge(assumptions, deps)
+        return Form(self.settle(exp, expr, deps, env)
+                    for exp, (expr, deps) in zip(x, results)), {}
+
+    def rewrite_if(self, x, bound, env, depth):
+        '''(if test if_true other)'''
+        if len(x) != 4:
+            return self.rewrite_parts(x, 1, bound, env, depth)
+        test, deps = self.rewrite(x[1], bound, env, depth)
+        if is_constant(test):
+            branch = x[2] if constant_value(test) else x[3]
+            expr, more = self.rewrite(branch, bound, env, depth)
+            return expr, merge(deps, more)
+        return Form([x[0], self.settle(x[1], test, deps, env),
+                     self.settled(x[2], bound, env, depth),
+                     self.settled(x[3], bound, env, depth)]), {}
+
+    def rewrite_cond(self, x, bound, env, depth):
+        '''(cond (p1 e1) ... (pn en))'''
+        clauses = []
+        assumptions = {}
+        changed = False
+        for clause in x[1:]:
+            p, e = clause
+            test, deps = self.rewrite(p, bound, env, depth)
+            if not is_constant(test) or (clauses and deps):
+                # the tests after one that is not constant may depend on
+                # its side effects: each keeps its own guard
+                clauses.append([self.settle(p, test, deps, env),
+                                self.settled(e, bound, env, depth)])
+                continue
+            changed = True
+            assumptions.update(deps)
+            if not constant_value(test):
+                continue          # never taken
+            expr, deps = self.rewrite(e, bound, env, depth)
+            if not clauses:       # always taken
+                assumptions.update(deps)
+                return expr, assumptions
+            clauses.append([True, self.settle(e, expr, deps, env)])
+            break                 # later clauses are never reached
+        if not changed:
+            return Form([x[0]] + clauses), {}
+        elif not clauses:
+            return None, assumptions
+        return Form([x[0]] + clauses), assumptions
+
+    def rewrite_when(self, x, bound, env, depth):
+        '''(when test exp1 ... exp_last), (unless test exp1 ... exp_last)'''
+        if len(x) < 3:
+            return self.rewrite_parts(x, 1, bound, env, depth)
+        test, deps = self.rewrite(x[1], bound, env, depth)
+        if is_constant(test):
+            if bool(constant_value(test)) != (x[0] == 'when'):
+                return None, deps
+            body = [Symbol('begin')] + list(x[2:])
+            expr, more = self.rewrite(body, bound, env, depth)
+            return expr, merge(deps, more)
+        return Form([x[0], self.settle(x[1], test, deps, env)] + [
+            self.settled(exp, bound, env, depth) for exp in x[2:]]), {}
+
+    def rewrite_lambda(self, x, bound, env, depth):
+        '''(lambda (params*) body)'''
+        if len(x) != 3:
+            return x, {}
+        (_, params, body) = x
+        inner = bound | set(params) | assigned_names(body)
+        return Form([x[0], params, self.settled(body, inner, env, depth)]), {}
+
+    def rewrite_let(self, x, bound, env, depth):
+        '''(let ((var exp)*) exp* exp_last)'''
+        bindings = [[var, self.settled(exp, bound, env, depth)]
+                    for (var, exp) in x[1]]
+        inner = bound | {var for (var, _) in x[1]} | assigned_names(x[2:])
+        body = [self.settled(exp, inner, env, depth) for exp in x[2:]]
+        return Form([x[0], bindings] + body), {}
+
+    def body_of(self, procedure):
+        '''The lambda body of a lisp procedure, also if it was compiled'''
+        body = procedure.body
+        source = getattr(body, 'source', None)
+        if source is not None:
+            body = source[0][2]
+        if type(body) is Guarded:
+            body = body.original
+        return body
+
+    def inline(self, value, args, bound, env):
+        '''Returns the body of value, a global procedure, with its
+           parameters replaced by args, if it only calls another global
+           procedure with each of its parameters once, in order, and
+           constants; else None'''
+        if (type(value) is not self.procedure_cls or value.opt_param or
+                value.env is not env or len(args) != len(value.params)):
+            return None
+        body = self.body_of(value)
+        if not isinstance(body, list) or not body:
+            return None
+        head = body[0]
+        if (not is_name(head) or head in bound or is_special(head) or
+                head in value.params):
+            return None
+        if [exp for exp in body[1:] if is_name(exp)] != list(value.params):
+            return None
+        replace = dict(zip(value.params, args))
+        result = [head]
+        for exp in body[1:]:
+            if is_name(exp):
+                result.append(replace[exp])
+            elif is_constant(exp):
+                result.append(exp)
+            else:
+                return None
+        return result
+
+    def purity(self, value, env, active):
+        '''Returns the global names and values under which value is a pure
+           procedure of env, or None if it may not be.  active holds the
+           procedures being analyzed, assumed to be pure.'''
+        try:
+            if value in self.pure:
+                return {}
+        except TypeError:   # not hashable
+            return None
+        if type(value) is not self.procedure_cls or value.env is not env:
+            return None
+        elif value in active:
+            return {}
+        top = not active
+        if top:
+            cached = self.purity_cache.get(value, MISSING)
+            if cached is not MISSING and (cached is None or all(
+                    env.get(var, MISSING) is val
+                    for var, val in cached.items())):
+                return cached
+        active.add(value)
+        deps = {}
+        if not self.is_pure(self.body_of(value), set(value.params), env,
+                            deps, active):
+            deps = None
+        active.discard(value)
+        if top:   # results found while others were assumed pure are not
+            self.purity_cache[value] = deps
+        return deps
+
+    def is_pure(self, x, local, env, deps, active):
+        '''True if evaluating x, where the names in local are not global,
+           only calls pure procedures; adds the global names it relies on
+           to deps'''
+        if is_name(x):
+            if x in local:
+                return True
+            value = env.get(x, MISSING)
+            if type(value) in LITERALS:
+                deps[x] = value
+                return True
+            more = self.purity(value, env, active)
+            if more is None:
+                return False
+            deps[x] = value
+            deps.update(more)
+            return True
+        elif not isinstance(x, list):
+            return type(x) in LITERALS
+        elif not x:
+            return True
+        head = x[0]
+        if is_special(head):
+            if head == 'quote':
+                return True
+            elif head == 'cond':
+                return all(self.is_pure(p, local, env, deps, active) and
+                           self.is_pure(e, local, env, deps, active)
+                           for (p, e) in x[1:])
+            elif head == 'let':
+                return (all(self.is_pure(exp, local, env, deps, active)
+                            for (_, exp) in x[1]) and
+                        all(self.is_pure(exp, local | {v for (v, _) in x[1]},
+                                         env, deps, active)
+                            for exp in x[2:]))
+            elif head in ('if', 'and', 'or', 'when', 'unless', 'begin'):
+                return all(self.is_pure(exp, local, env, deps, active)
+                           for exp in x[1:])
+            return False
+        elif is_name(head) and head in local:   # unknown procedure
+            return False
+        return all(self.is_pure(exp, local, env, deps, active) for exp in x)
+
+    @staticmethod
+    def fold(procedure, args):
+        '''Returns the value of a call with constant arguments, if it can
+           be written as a literal, else MISSING'''
+        values = [constant_value(arg) for arg in args]
+        if not foldable(values):
+            return MISSING
+        try:
+            with Budget(steps=FOLD_STEPS):
+                value = procedure(*values)
+        except Exception:
+            return MISSING
+        if type(value) in LITERALS:
+            return value
+        return MISSING
@@ -0,0 +1,99 @@
+'''Immutable pairs, so that cons, car and cdr do not copy lists
+
+   A lisp list is either a Python list, as produced by the parser or by
+   Python code, or a Pair whose cdr is itself a lisp list.  cons makes a
+   new Pair sharing the list it is given; cdr of a Python list converts
+   the rest of it to Pairs once, so that walking down a list with cdr
+   takes linear time overall.
+'''
+from collections.abc import Sequence
+
+
+class Pair(Sequence):
+    '''A cons cell: car is the first element of a list and cdr the rest
+       of it, a Pair or a Python list.  Pairs compare equal to Python lists
+       with the same elements.'''
+    __slots__ = ('car', 'cdr')
+
+    def __init__(self, car, cdr):
+        self.car = car
+        self.cdr = cdr
+
+    def __bool__(self):
+        return True   # a Pair holds at least one element
+
+    def __iter__(self):
+        node = self
+        while type(node) is Pair:
+            yield node.car
+            node = node.cdr
+        yield from node
+
+    def __len__(self):
+        length = 0
+        node = self
+        while type(node) is Pair:
+            length += 1
+            node = node.cdr
+        return length + len(node)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice) or index < 0:
+            return list(self)[index]
+        node = self
+        while type(node) is Pair:
+            if index == 0:
+                return node.car
+            index -= 1
+            node = node.cdr
+        return node[index]
+
+    def __reversed__(self):
+        return reversed(list(self))
+
+    def __eq__(self, other):
+        if not isinstance(other, (list, Pair)):
+            return NotImplemented
+        elif not other:
+            return False
+        missing = object()
+        items = iter(other)
+        for item in self:
+            if next(items, missing) != item:
+                return False
+        return next(items, missing) is missing
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "Pair({})".format(list(self))
+
+    def __reduce__(self):
+        # avoids deep recursion when pickling long lists
+        return (from_list, (list(self),))
+
+
+def is_list(obj):
+    '''True if obj is a lisp list: a Python list or a Pair'''
+    return isinstance(obj, (list, Pair))
+
+
+def from_list(items, start=0):
+    '''Returns the Pairs holding items[start:], ending with an empty list'''
+    result = []
+    for index in range(len(items) - 1, start - 1, -1):
+        result = Pair(items[index], result)
+    return result
+
+
+def to_list(obj):
+    '''Converts a chain of Pairs, including the Pairs it holds, to a Python
+       list; other values, Python lists in particular, are returned as they
+       are, so that Python code may change them'''
+    if type(obj) is Pair:
+        return [to_list(item) for item in obj]
+    return obj
@@ -0,0 +1,76 @@
+'''On disk cache of parsed lisp files, similar to __pycache__
+
+   The parsed expressions of a file are stored in a __lispcache__ directory
+   next to it, together with the modification time, size and SHA-256 hash
+   of the source.  An entry is used as is if the modification time and
+   size still match; otherwise the source is hashed and the entry is used
+   only if the content did not change.  Stale or corrupt entries are
+   ignored and rewritten.
+'''
+import hashlib
+import os
+import pickle
+import threading
+
+CACHE_DIR = "__lispcache__"
+MAGIC = "petit_lisp parse cache 3"
+MAX_SIZE = 1 << 24   # larger files are streamed, not cached
+
+
+class ParseCache:
+    '''Stores and retrieves the parsed expressions of lisp files'''
+
+    @staticmethod
+    def cache_path(filename):
+        '''Name of the cache file for filename'''
+        directory, name = os.path.split(os.path.abspath(filename))
+        return os.path.join(directory, CACHE_DIR, name + ".pickle")
+
+    def get(self, filename, stat=None):
+        '''Returns the list of (expr, line, column) read from filename, or
+           None if there is no valid cache entry'''
+        try:
+            if stat is None:
+                stat = os.stat(filename)
+            with open(self.cache_path(filename), "rb") as f:
+                entry = pickle.load(f)
+            if entry["magic"] != MAGIC:
+                return None
+            if (entry["mtime"], entry["size"]) != (stat.st_mtime_ns,
+                                                   stat.st_size):
+                with open(filename, "rb") as f:
+                    digest = hashlib.sha256(f.read()).hexdigest()
+                if digest != entry["digest"]:
+                    return None
+                self.write(filename, dict(entry, mtime=stat.st_mtime_ns,
+                                          size=stat.st_size))
+            return entry["forms"]
+        except Exception:  # missing, unreadable or corrupt entry
+            return None
+
+    def put(self, filename, data, forms, stat):
+        '''Stores the forms read from the content data of filename'''
+        entry = {
+            "magic": MAGIC,
+            "mtime": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "digest": hashlib.sha256(data).hexdigest(),
+            "forms": forms
+        }
+        self.write(filename, entry)
+
+    def write(self, filename, entry):
+        '''Writes a cache entry atomically; failures are ignored since the
+           cache is only an optimization'''
+        path = self.cache_path(filename)
+        tmp = "{}.{}.{}.tmp".format(path, os.getpid(), threading.get_ident())
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, "wb") as f:
+                pickle.dump(entry, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
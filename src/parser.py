@@ -2,61 +2,154 @@
 
 import re
 
+from src.symbols import Form, LispString, Symbol
+
+# a single pass over the source finds every token: parentheses, quote,
+# double quoted strings, comments, atoms and unterminated strings.
+TOKENS = re.compile(r'''[()']|"[^"]*"|;[^\n]*|[^\s()'";]+|"''')
+
+# numbers are recognized by their shape, without trying conversions;
+# Python uses j instead of i for sqrt(-1)
+_UREAL = r'(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?'
+INTEGER = re.compile(r'[+-]?\d+\Z')
+FLOAT = re.compile(r'[+-]?' + _UREAL + r'\Z')
+COMPLEX = re.compile(r'[+-]?(?:{0}(?:[+-](?:{0})?)?)?[ij]\Z'.format(_UREAL))
+NUMBER_START = frozenset('0123456789+-.')
+
+CHUNK_SIZE = 1 << 16
+QUOTE = Symbol('quote')
+
 
 class Parser:
-    "Parse a Lisp expression from a string"
-    def __init__(self, STRINGS=None):  # noqa
-        self.regex = re.compile('"(?:[^"])*"')
-        self.STRINGS = STRINGS
-        if STRINGS is None:
-            self.STRINGS = {}
+    """Parse a Lisp expression from a string
+
+       Names are read as Symbols, string literals as LispStrings and
+       parenthesized expressions as Forms."""
+    def __init__(self):
+        self.regex = TOKENS
 
     def parse(self, s):
         "Parse a Lisp expression from a string."
         return self.convert_to_list(self.tokenize(s))
 
+    def parse_all(self, s):
+        "Parse all the Lisp expressions found in a string into a list."
+        return list(self.read(self.tokenize(s)))
+
     def convert_to_list(self, tokens):
         "Converts a sequence of tokens into a list"
-        if len(tokens) == 0:
+        for expr in self.read(tokens):
+            return expr
+        raise SyntaxError('convert_to_list: unexpected EOF while reading')
+
+    def read(self, tokens):
+        '''Converts a sequence of tokens into the successive expressions
+           they contain; nested lists are built using an explicit stack.'''
+        stack = []
+        current = None    # list being built, None at the top level
+        quotes = 0        # number of ' applying to the next expression
+        for token in tokens:
+            first = token[0]
+            if first == '(':
+                stack.append((current, quotes))
+                current = Form()
+                quotes = 0
+                continue
+            elif first == ')':
+                if current is None or quotes:
+                    raise SyntaxError('convert_to_list: unexpected )')
+                expr = current
+                current, quotes = stack.pop()
+            elif first == "'":
+                quotes += 1
+                continue
+            elif first == ';':
+                continue
+            elif first == '"':
+                if len(token) == 1:
+                    raise SyntaxError('convert_to_list: unterminated string')
+                # no allowance is made for escaped double quotes (\\")
+                expr = LispString(token[1:-1])
+            else:
+                expr = self.atomize(token)
+            while quotes:
+                expr = [QUOTE, expr]
+                quotes -= 1
+            if current is None:
+                yield expr
+            else:
+                current.append(expr)
+        if current is not None or quotes:
             raise SyntaxError('convert_to_list: unexpected EOF while reading')
-        token = tokens.pop(0)
-        if '(' == token:
-            lst = []
-            while tokens[0] != ')':
-                lst.append(self.convert_to_list(tokens))
-            tokens.pop(0)   # pop off ')'
-            return lst
-        elif ')' == token:
-            raise SyntaxError('convert_to_list: unexpected )')
-        elif "'" == token:
-            return ['quote', self.convert_to_list(tokens)]
-        else:
-            return self.atomize(token)
+
+    def read_stream(self, stream, chunk_size=CHUNK_SIZE):
+        '''Reads a text stream chunk by chunk, yielding (expr, line, column)
+           as soon as each top-level expression is complete; line and column
+           are those of the start of the expression, counting from 1.
+
+           The tokens are given to read as they are found, so that only the
+           expression being built is kept, not its text or its tokens.'''
+        start = []   # (line, column) of the expression being read, if any
+
+        def tokens():
+            buffer = ''
+            line, column = 1, 1   # position of buffer[mark]
+            mark = 0
+            eof = False
+            while not eof:
+                chunk = stream.read(chunk_size)
+                eof = not chunk
+                buffer += chunk
+                consumed = 0
+                for m in self.regex.finditer(buffer):
+                    token = m.group()
+                    incomplete = token == '"' or (m.end() == len(buffer)
+                                                  and token[0] not in "()'\"")
+                    if incomplete and not eof:
+                        break     # token may continue in the next chunk
+                    consumed = m.end()
+                    if token[0] == ';':
+                        continue
+                    if not start:
+                        offset = m.start()
+                        newlines = buffer.count('\n', mark, offset)
+                        if newlines:
+                            line += newlines
+                            column = offset - buffer.rfind('\n', mark, offset)
+                        else:
+                            column += offset - mark
+                        mark = offset
+                        start.append((line, column))
+                    yield token
+                newlines = buffer.count('\n', mark, consumed)
+                if newlines:
+                    line += newlines
+                    column = consumed - buffer.rfind('\n', mark, consumed)
+                else:
+                    column += consumed - mark
+                buffer = buffer[consumed:]
+                mark = 0
+
+        try:
+            for expr in self.read(tokens()):
+                line, column = start.pop()
+                yield expr, line, column
+        except SyntaxError as e:
+            raise SyntaxError("line {}, column {}: {}".format(
+                start[0][0], start[0][1], e))
 
     def atomize(self, token):
-        "Converts individual tokens to numbers if possible"
-        for conversion in [int, float, complex]:
-            try:
-                # Python uses j instead of i for sqrt(-1)
-                return conversion(token.replace('i', 'j'))
-            except ValueError:
-                pass
-        return token
+        "Converts individual tokens to numbers if possible, else to Symbols"
+        if token[0] not in NUMBER_START:
+            return Symbol(token)
+        if INTEGER.match(token):
+            return int(token)
+        elif FLOAT.match(token):
+            return float(token)
+        elif COMPLEX.match(token):
+            return complex(token.replace('i', 'j'))
+        return Symbol(token)
 
     def tokenize(self, s):
         "Convert a string into a list of tokens."
-        if '"' in s:
-            s = self.replace_strings(s)
-        return s.replace("(", " ( ").replace(")", " ) ").replace("'", " ' ").split()
-
-    def replace_strings(self, s):                       # noqa
-        '''replace double quoted strings by # followed by their Python id
-           and stores the correspondance in the global environment
-
-           Does not make allowance for escaped double quote (\") character.'''
-        quoted_strings = re.findall(self.regex, s)
-        for s_ in quoted_strings:
-            symbol = "#{}".format(id(s_))
-            s = s.replace(s_, symbol)
-            self.STRINGS[symbol] = s_
-        return s
+        return self.regex.findall(s)
@@ -0,0 +1,155 @@
+'''Profiler for procedures written in lisp
+
+   While active, calls to Procedures are recorded under the name they were
+   defined with, or <lambda>: number of calls, total time including the
+   procedures they call (not counted twice for recursive calls) and self
+   time.  The profiler also counts the calls between each caller and
+   callee and the self time spent in each stack of calls, which it writes
+   in the collapsed stack format read by flamegraph.pl and speedscope.
+
+   Tail calls run in constant stack depth, and the stack of the profiler
+   does too: a procedure entered by a tail call may replace its caller on
+   the stack, in which case it is shown as called by its caller's caller.
+
+   Only the calls made by the thread which started the profiler are
+   recorded.  When it is not active, the engines only test the active
+   attribute once per procedure call.
+'''
+import threading
+import time
+
+TOP = "<top>"
+
+
+class ProfileFrame:
+    '''A procedure call in progress'''
+    __slots__ = ('name', 'path', 'start')
+
+    def __init__(self, name, path, start):
+        self.name = name
+        self.path = path
+        self.start = start
+
+
+class Profiler:
+    '''Records time and call counts per named procedure'''
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.active = False
+        self.thread = None
+        self.reset()
+
+    def reset(self):
+        '''Discards the data recorded so far'''
+        self.stats = {}      # name: [calls, total time, self time]
+        self.edges = {}      # (caller, callee): calls
+        self.stacks = {}     # "outer;...;inner": self time
+        self.stack = []
+        self.running = {}    # name: number of frames on the stack
+        self.last = self.clock()
+
+    def start(self):
+        '''Starts recording'''
+        self.stack = []
+        self.running = {}
+        self.last = self.clock()
+        self.thread = threading.get_ident()
+        self.active = True
+
+    def stop(self):
+        '''Stops recording; calls in progress are ended now'''
+        while self.stack:
+            self.exit()
+        self.active = False
+
+    def charge(self, now):
+        '''Adds the time elapsed since the last event to the innermost
+           call'''
+        if self.stack:
+            frame = self.stack[-1]
+            elapsed = now - self.last
+            self.stats[frame.name][2] += elapsed
+            self.stacks[frame.path] = self.stacks.get(frame.path, 0) + elapsed
+        self.last = now
+
+    def enter(self, procedure):
+        '''Records the start of a call to procedure'''
+        now = self.clock()
+        self.charge(now)
+        name = getattr(procedure, 'name', None) or "<lambda>"
+        if self.stack:
+            caller = self.stack[-1]
+            path = caller.path + ";" + name
+            caller = caller.name
+        else:
+            path = name
+            caller = TOP
+        if name not in self.stats:
+            self.stats[name] = [0, 0.0, 0.0]
+        self.stats[name][0] += 1
+        self.edges[(caller, name)] = self.edges.get((caller, name), 0) + 1
+        self.running[name] = self.running.get(name, 0) + 1
+        self.stack.append(ProfileFrame(name, path, now))
+
+    def exit(self):
+        '''Records the end of the innermost call'''
+        if not self.stack:   # the profiler was stopped during the call
+            return
+        now = self.clock()
+        self.charge(now)
+        frame = self.stack.pop()
+        self.running[frame.name] -= 1
+        if not self.running[frame.name]:
+            self.stats[frame.name][1] += now - frame.start
+
+    def tail_call(self, procedure, entered):
+        '''Records a tail call to procedure, made by an engine loop which
+           already entered a call if entered is true; returns whether a
+           call is now entered'''
+        if threading.get_ident() != self.thread:
+            return entered
+        if entered:
+            self.exit()
+        self.enter(procedure)
+        return True
+
+    def call(self, procedure, args):
+        '''Calls a Procedure with a tuple of arguments, recording it'''
+        env = procedure.env_cls(procedure.params, args, procedure.env)
+        if threading.get_ident() != self.thread:
+            return procedure.evaluate(procedure.body, env)
+        self.enter(procedure)
+        try:
+            return procedure.evaluate(procedure.body, env)
+        finally:
+            self.exit()
+
+    def report(self, limit=20):
+        '''Returns a table of the procedures using the most time, followed
+           by the most frequent caller/callee pairs'''
+        lines = ["{:24} {:>9} {:>11} {:>11} {:>11}".format(
+            "procedure", "calls", "total ms", "self ms", "ms/call")]
+        by_time = sorted(self.stats.items(), key=lambda item: -item[1][1])
+        for name, (calls, total, own) in by_time[:limit]:
+            lines.append("{:24} {:>9} {:>11.3f} {:>11.3f} {:>11.4f}".format(
+                name, calls, 1000 * total, 1000 * own, 1000 * total / calls))
+        lines.append("")
+        lines.append("{:49} {:>9}".format("caller -> callee", "calls"))
+        by_calls = sorted(self.edges.items(), key=lambda item: -item[1])
+        for (caller, callee), calls in by_calls[:limit]:
+            lines.append("{:49} {:>9}".format(caller + " -> " + callee, calls))
+        return "\n".join(lines)
+
+    def collapsed(self):
+        '''Returns the stacks of calls in the collapsed stack format: one
+           "outer;...;inner microseconds" line per stack'''
+        return "".join("{} {}\n".format(path, round(1e6 * elapsed))
+                       for path, elapsed in sorted(self.stacks.items()))
+
+    def write_collapsed(self, filename):
+        '''Writes the collapsed stacks to a file'''
+        with open(filename, "w") as f:
+            f.write(self.collapsed())
+
+profiler = Profiler()
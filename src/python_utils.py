@@ -1,42 +1,170 @@
 ''' Python functions designed to import Python objects into lisp environment'''
+import concurrent.futures
+import hashlib
 import importlib
+import os
+import tempfile
+import threading
+from itertools import repeat
+
+from src.pairs import to_list
+
+_imported = {}   # id: callable imported by import_names, kept alive
+
+# the functions of operator, which the prelude imports as its primitives,
+# apply Python's operators, which Pairs implement: converting their
+# arguments would make (null? lst) take linear time
+PAIR_AWARE_MODULES = frozenset(['operator'])
+
+
+def is_imported(obj):
+    '''True if obj is a callable imported from a Python module by load-py
+       and friends; lisp lists built with cons are passed to it as Python
+       lists'''
+    return _imported.get(id(obj)) is obj
+
+
+def import_names(env, module, names):
+    '''Adds getattr(module, name) as name_as to env for each (name, name_as)
+       and, if env records them, remembers where they were imported from'''
+    mod = importlib.import_module(module)
+    values = {name_as: getattr(mod, name) for name, name_as in names}
+    if module not in PAIR_AWARE_MODULES:
+        for value in values.values():
+            if callable(value):
+                _imported[id(value)] = value
+    env.update(values)
+    if hasattr(env, 'version'):   # a global Env
+        env.version += 1
+    record_import = getattr(env, 'record_import', None)
+    if record_import is not None:
+        for name, name_as in names:
+            record_import(name_as, module, name)
 
 
 def load_module(module, *, env=None):
     '''(load-py 'module_name)'''
     mod = importlib.import_module(module)
-    env.update(vars(mod))
+    import_names(env, module, [(name, name) for name in vars(mod)])
 
 
 def from_module_load(module, *names, env=None):
     '''(from-py-load 'module_name 'var1 'var2 ...)'''
-    mod = importlib.import_module(module)
-    for name in names:
-        env.update({name: getattr(mod, name)})
+    import_names(env, module, [(name, name) for name in names])
 
 
 def from_module_load_variable_as(module, *names, env=None):
     '''(from-py-load-as 'module_name '(var1 name1) '(var2 name2) ...)'''
-    mod = importlib.import_module(module)
-    for name, name_as in names:
-        env.update({name_as: getattr(mod, name)})
+    import_names(env, module, names)
 
 
 def with_instance(inst, attr, *args):
-    '''(with-py-inst instance 'attribute OR method arg1 arg 2 ...)'''
+    '''(with-py-inst instance 'attribute OR method arg1 arg 2 ...)
+
+       lisp lists built with cons are passed to Python as lists'''
     if hasattr(inst, attr):
         attr = getattr(inst, attr)
         if callable(attr):
-            return attr(*args)
+            return attr(*[to_list(arg) for arg in args])
         else:
             return attr
     else:
         print("{} has no attribute {}.".format(inst, attr))
 
 
+def root_env(env):
+    '''The global environment of a local environment'''
+    while getattr(env, 'outer', None) is not None:
+        env = env.outer
+    return env
+
+
+_loaded = (None, None)   # last (digest, procedure) used by this worker
+
+
+def run_chunk(loads, digest, path, chunk):
+    '''Runs in a worker process: applies the procedure serialized in the
+       file path to each item of chunk.  The file is only read by the
+       first chunk of a worker; digest identifies its content.'''
+    global _loaded
+    if _loaded[0] != digest:
+        with open(path, 'rb') as f:
+            _loaded = (digest, loads(f.read()))
+    procedure = _loaded[1]
+    return [procedure(item) for item in chunk]
+
+
+class ProcessMap:
+    '''Applies procedures to lists in a pool of worker processes.
+
+       dumps(procedure, env) must return bytes from which loads, a module
+       level function, rebuilds procedure together with a copy of the
+       names of the global environment env it uses; they are provided by
+       petit_lisp.  These bytes are written to a temporary file, read once
+       by each worker, instead of being sent with each chunk of the list.'''
+
+    def __init__(self, dumps=None, loads=None, max_workers=None):
+        self.dumps = dumps
+        self.loads = loads
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def map(self, procedure, items, chunksize=None, *, env=None):
+        '''(pmap procedure list [chunksize]) ==> list of (procedure item),
+           computed by worker processes, in the order of list'''
+        items = list(items)
+        if not items:
+            return []
+        if chunksize is None:
+            chunksize = -(-len(items) // (4 * self.max_workers))
+        with self.lock:
+            if self.executor is None:
+                self.executor = concurrent.futures.ProcessPoolExecutor(
+                    self.max_workers)
+        payload = self.dumps(procedure, root_env(env))
+        digest = hashlib.sha256(payload).hexdigest()
+        chunks = [items[i:i + chunksize]
+                  for i in range(0, len(items), chunksize)]
+        with tempfile.NamedTemporaryFile(prefix='pmap-') as f:
+            f.write(payload)
+            f.flush()
+            results = []
+            for result in self.executor.map(run_chunk, repeat(self.loads),
+                                            repeat(digest), repeat(f.name),
+                                            chunks):
+                results.extend(result)
+        return results
+
+    def for_each(self, procedure, items, chunksize=None, *, env=None):
+        '''(pfor-each procedure list [chunksize]) ==> applies procedure to
+           each item of list in worker processes, for its side effects'''
+        self.map(procedure, items, chunksize, env=env)
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['executor'] = None
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def shutdown(self):
+        '''Stops the worker processes; they are restarted when needed'''
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
+
+process_map = ProcessMap()
+
 python_fns = {
     'load-py': load_module,
     'from-py-load': from_module_load,
     'from-py-load-as': from_module_load_variable_as,
-    'with-py-inst': with_instance
+    'with-py-inst': with_instance,
+    'pmap': process_map.map,
+    'pfor-each': process_map.for_each
 }
@@ -3,14 +3,30 @@
 
 import sys
 import traceback
+from itertools import islice
+
+from src.lazy import PRINT_LENGTH, is_lazy
+from src.maps import PersistentMap, PersistentSet, is_hash_map
+from src.pairs import is_list
+from src.profiler import profiler as default_profiler
+from src.symbols import LispString
+from src.vectors import is_vector
+
+# names of the procedures making hash maps and sets, used to print them
+COLLECTIONS = {PersistentMap: 'hash-map', dict: 'mutable-hash-map',
+               PersistentSet: 'hash-set', set: 'mutable-hash-set'}
 
 
 class InteractiveInterpreter:
     '''A simple interpreter with built-in help'''
-    def __init__(self, evaluate=None, parse=None, global_env=None):
+    def __init__(self, evaluate=None, parse=None, global_env=None,
+                 profiler=None):
         self.evaluate = evaluate
         self.parse = parse
         self.global_env = global_env
+        self.profiler = profiler
+        if profiler is None:
+            self.profiler = default_profiler
         self.started = False
         self.prompt = 'repl> '
         self.prompt2 = ' ... '
@@ -24,7 +40,7 @@ class InteractiveInterpreter:
             if not inp:
                 continue
             try:
-                val = self.evaluate(self.parse(inp))
+                val = self.evaluate_profiled(self.parse(inp))
                 if val is not None:
                     print(self.to_string(val))
             except (KeyboardInterrupt, SystemExit):
@@ -35,6 +51,17 @@ class InteractiveInterpreter:
                 if self.global_env["_DEBUG"]:
                     traceback.print_exc()
 
+    def evaluate_profiled(self, expr):
+        '''Evaluates expr, recording it with the profiler if the _PROFILE
+           variable is true'''
+        if not self.global_env.get("_PROFILE"):
+            return self.evaluate(expr)
+        self.profiler.start()
+        try:
+            return self.evaluate(expr)
+        finally:
+            self.profiler.stop()
+
     def read_expression(self):
         '''Reads an expression from a prompt'''
         inp = input(self.prompt)
@@ -43,7 +70,7 @@ class InteractiveInterpreter:
             inp += ' ' + input(self.prompt2)
             open_parens = inp.count("(") - inp.count(")")
 
-        if inp.startswith(("parse", "help", "dir")):
+        if inp.startswith(("parse", "help", "dir", "profile")):
             self.handle_internally(inp)
             return None
         return inp
@@ -58,6 +85,8 @@ class InteractiveInterpreter:
                 self.show_variables()
             else:
                 self.show_variables(help[1])
+        elif inp.startswith("profile"):
+            self.handle_profile(inp.split()[1:])
         elif inp.startswith("dir"):
             keys = [x for x in self.global_env.keys()
                                     if not x.startswith("__")]
@@ -68,6 +97,21 @@ class InteractiveInterpreter:
                     print("")
             print("")
 
+    def handle_profile(self, args):
+        '''profile on|off|reset|save filename, or profile to show the
+           results'''
+        if not args:
+            print(self.profiler.report())
+        elif args == ["on"] or args == ["off"]:
+            self.global_env["_PROFILE"] = args == ["on"]
+        elif args == ["reset"]:
+            self.profiler.reset()
+        elif len(args) == 2 and args[0] == "save":
+            self.profiler.write_collapsed(args[1])
+        else:
+            print("Usage:  profile, profile on, profile off, profile reset, "
+                  "profile save filename")
+
     def start(self):
         '''starts the interpreter if not already running'''
         if self.started:
@@ -81,13 +125,29 @@ class InteractiveInterpreter:
 
     def to_string(self, exp):
         "Convert a Python object back into a Lisp-readable string."
-        if not isinstance(exp, list):
+        if not is_list(exp):
             if exp is True:
                 return '"True"'
             elif exp is False:
                 return '"False"'
+            elif type(exp) is LispString:
+                return '"{}"'.format(exp)
             elif isinstance(exp, complex):
                 return str(exp).replace('j', 'i')[1:-1]  # remove () put by Python
+            elif is_vector(exp):
+                return '(vec' + ''.join(' ' + self.to_string(x)
+                                        for x in exp.tolist()) + ')'
+            elif is_lazy(exp):
+                items = list(islice(exp, PRINT_LENGTH + 1))
+                if len(items) > PRINT_LENGTH:
+                    items[-1] = '...'
+                return '(' + ' '.join(map(self.to_string, items)) + ')'
+            elif type(exp) in COLLECTIONS:
+                name = COLLECTIONS[type(exp)]
+                if is_hash_map(exp):
+                    exp = [x for item in exp.items() for x in item]
+                return '(' + ' '.join([name] + [self.to_string(x)
+                                                for x in exp]) + ')'
             return str(exp)
         else:
             return '(' + ' '.join(self.to_string(s) for s in exp) + ')'
@@ -0,0 +1,225 @@
+'''Non-interactive server evaluating lisp sources with a pool of
+   pre-warmed interpreters
+
+   Requests are read from a stream, stdin or a connection to a Unix
+   socket, and each is evaluated by an interpreter borrowed from an
+   InterpreterPool, in a pool of threads.  A request is the source of one
+   or more expressions; its response is a JSON object:
+
+       {"id": 3, "ok": true, "result": "(1 2)", "output": "", "ms": 0.21}
+
+   with id the number of the request on its stream, starting at 0, result
+   the value of the last expression as printed by the repl, output what
+   the expressions printed and ms the time taken.  Failed requests have
+   "ok": false and an "error" instead of a result; those which exceeded
+   their budget also have its "usage".  Responses are written as soon as
+   they are ready, hence not always in the order of the requests.
+
+   With the "lines" framing, each request and response is a single line.
+   With the "length" framing, each is preceded by a line holding its
+   length in bytes, so that requests may span several lines.  Malformed
+   requests, which are not valid UTF-8 or have an invalid length, get an
+   error response like the others.
+'''
+import concurrent.futures
+import contextlib
+import io
+import json
+import os
+import socketserver
+import sys
+import threading
+import time
+
+from src.budget import BudgetExceeded
+
+
+def decoded(data):
+    '''data as text or, if it is not valid UTF-8, the UnicodeDecodeError'''
+    try:
+        return data.decode()
+    except UnicodeDecodeError as error:
+        return error
+
+
+def read_lines(rfile):
+    '''Yields the non blank lines of a binary stream'''
+    for line in rfile:
+        line = line.strip()
+        if line:
+            yield decoded(line)
+
+
+def write_line(wfile, text):
+    wfile.write(text.encode() + b"\n")
+
+
+def read_length_prefixed(rfile):
+    '''Yields the requests of a binary stream, each preceded by a line
+       holding its length in bytes.  A header which is not a length is
+       yielded as a ValueError, and the next line is read as a header.'''
+    while True:
+        header = rfile.readline()
+        if not header:
+            return
+        elif not header.strip():
+            continue
+        try:
+            size = int(header)
+        except ValueError:
+            size = -1
+        if size < 0:
+            yield ValueError("Invalid request length {!r}.".format(
+                header.strip()[:40].decode(errors='replace')))
+            continue
+        data = rfile.read(size)
+        if len(data) < size:
+            yield EOFError("Request of {} bytes truncated to {}.".format(
+                size, len(data)))
+            return
+        yield decoded(data)
+
+
+def write_length_prefixed(wfile, text):
+    data = text.encode()
+    wfile.write(b"%d\n" % len(data) + data)
+
+FRAMINGS = {
+    'lines': (read_lines, write_line),
+    'length': (read_length_prefixed, write_length_prefixed)
+}
+
+
+class ThreadOutput(io.TextIOBase):
+    '''Replaces sys.stdout while serving: what a thread prints while
+       capturing goes to its own buffer, the rest to stream'''
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def write(self, text):
+        buffer = getattr(self.local, 'buffer', None)
+        (self.stream if buffer is None else buffer).write(text)
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    @contextlib.contextmanager
+    def capture(self):
+        '''Context manager capturing the output of the current thread in
+           a StringIO'''
+        self.local.buffer = io.StringIO()
+        try:
+            yield self.local.buffer
+        finally:
+            self.local.buffer = None
+
+
+class Server:
+    '''Evaluates the requests read from streams with interpreters of pool,
+       in at most workers threads.  to_string converts results to text;
+       budget, if given, is called without arguments to get the Budget of
+       each request.'''
+
+    def __init__(self, pool, to_string, framing='lines', workers=4,
+                 budget=None):
+        self.pool = pool
+        self.to_string = to_string
+        self.read, self.write = FRAMINGS[framing]
+        self.workers = workers
+        self.budget = budget
+        self.executor = concurrent.futures.ThreadPoolExecutor(workers)
+        self.output = ThreadOutput(sys.stderr)
+
+    def handle(self, number, source):
+        '''Evaluates a request; returns its response as a dict.  source
+           is the text of the request, or the exception raised when it was
+           read.'''
+        response = {'id': number}
+        budget = None if self.budget is None else self.budget()
+        start = time.perf_counter()
+        with self.output.capture() as output:
+            try:
+                if isinstance(source, Exception):   # malformed request
+                    raise source
+                value = self.pool.run(source, budget)
+                response.update(ok=True, result=self.to_string(value))
+            except BudgetExceeded as e:
+                response.update(ok=False, error=str(e), usage=e.usage)
+            except (Exception, SystemExit) as e:
+                response.update(ok=False, error="{}: {}".format(
+                    type(e).__name__, e))
+        response['output'] = output.getvalue()
+        response['ms'] = round((time.perf_counter() - start) * 1000, 3)
+        return response
+
+    def serve_stream(self, rfile, wfile):
+        '''Answers the requests read from binary stream rfile on binary
+           stream wfile, until the end of rfile'''
+        lock = threading.Lock()
+        slots = threading.BoundedSemaphore(2 * self.workers)
+        futures = []
+
+        def respond(future):
+            try:
+                text = json.dumps(future.result())
+                with lock:
+                    self.write(wfile, text)
+                    wfile.flush()
+            finally:
+                slots.release()
+        try:
+            for number, source in enumerate(self.read(rfile)):
+                slots.acquire()   # at most 2 * workers requests pending
+                future = self.executor.submit(self.handle, number, source)
+                future.add_done_callback(respond)
+                futures.append(future)
+        finally:
+            concurrent.futures.wait(futures)
+
+    def serve_unix(self, path):
+        '''Accepts connections on a Unix socket, each a stream of requests,
+           until interrupted'''
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                server.serve_stream(self.rfile, self.wfile)
+        # path is removed only once bound to: if it was in use, it is the
+        # socket of another server
+        with socketserver.ThreadingUnixStreamServer(path, Handler) as unix:
+            try:
+                unix.serve_forever()
+            finally:
+                os.remove(path)
+
+    @contextlib.contextmanager
+    def serving(self):
+        '''Context manager replacing sys.stdout by self.output, so that
+           the output of requests is captured and anything else printed
+           goes to stderr, and sys.stdin by an empty stream, which (quit)
+           closes instead of the stream of requests'''
+        stdin, stdout = sys.stdin, sys.stdout
+        sys.stdin, sys.stdout = io.StringIO(), self.output
+        try:
+            yield
+        finally:
+            sys.stdin, sys.stdout = stdin, stdout
+            self.close()
+
+    def close(self):
+        '''Waits for the requests in progress, then stops the threads'''
+        self.executor.shutdown()
+
+
+def serve(server, socket_path=None):
+    '''Serves requests read from stdin, answered on stdout, or from the
+       connections to a Unix socket'''
+    stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+    with server.serving(), contextlib.suppress(KeyboardInterrupt):
+        if socket_path is None:
+            server.serve_stream(stdin, stdout)
+        else:
+            server.serve_unix(socket_path)
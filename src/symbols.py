@@ -0,0 +1,54 @@
+'''Symbols and string literals, as produced by the reader
+
+   A Symbol is an interned name: reading the same name twice gives the
+   same object, so that special forms can be recognized with "is".  The
+   table of symbols only holds weak references, so that names no longer
+   used anywhere do not accumulate in long running processes.
+
+   A LispString is a string literal; it evaluates to itself.  Both are
+   subclasses of str, and compare and hash like the Python str with the
+   same characters, so that environments can be indexed by either.
+
+   A Form is a parenthesized expression: a list, with room for the inline
+   cache of evaluate when it is a procedure call.
+'''
+import threading
+import weakref
+
+_symbols = weakref.WeakValueDictionary()
+_lock = threading.Lock()
+
+
+class Symbol(str):
+    '''An interned name'''
+
+    def __new__(cls, name):
+        symbol = _symbols.get(name)
+        if symbol is None:
+            with _lock:   # two threads must not create the same symbol
+                symbol = _symbols.get(name)
+                if symbol is None:
+                    symbol = str.__new__(cls, name)
+                    _symbols[name] = symbol
+        return symbol
+
+    def __reduce__(self):
+        # unpickled symbols are interned in the receiving process
+        return (Symbol, (str(self),))
+
+
+class LispString(str):
+    '''A string literal, stored without its enclosing double quotes'''
+
+    def __reduce__(self):
+        return (LispString, (str(self),))
+
+
+class Form(list):
+    '''A list read from the source; evaluate stores in its cache attribute
+       the procedure called by the form and how to call it'''
+    cache = None
+
+    def __reduce__(self):
+        # the cache refers to procedures and environments: it is not pickled
+        return (Form, (list(self),))
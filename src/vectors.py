@@ -0,0 +1,207 @@
+'''Vectors of numbers, whose operations run in a single bulk call
+
+   Vectors are NumPy arrays when NumPy is installed.  Otherwise they are
+   array.array of integers (typecode 'q') or floats (typecode 'd'), whose
+   element-wise operations apply functions of the operator module with
+   map(), without going through the interpreter for each element.  In
+   both cases, they can be passed to the Python functions imported with
+   load-py and friends, and the builtins below accept lists where they
+   expect vectors and return plain Python numbers where they return
+   numbers, whichever kind of vector is used.
+'''
+import array
+import math
+import operator
+from itertools import repeat
+from numbers import Number
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def is_vector(obj):
+    '''(vec? obj) ==> true if obj is a vector'''
+    if numpy is not None:
+        return isinstance(obj, numpy.ndarray)
+    return isinstance(obj, array.array)
+
+
+def to_vector(items):
+    '''Returns a vector holding the numbers of a sequence or iterable'''
+    if is_vector(items):
+        return items
+    if not isinstance(items, list):
+        items = list(items)
+    if numpy is not None:
+        return numpy.array(items)
+    return make_array('q' if all(type(x) is int for x in items) else 'd',
+                      items)
+
+
+def as_operand(x):
+    '''x if it is a number or a vector, else a vector of its elements'''
+    if isinstance(x, Number) or is_vector(x):
+        return x
+    return to_vector(x)
+
+
+def make_array(typecode, items):
+    '''array.array of typecode, or of floats if an integer is too large'''
+    try:
+        return array.array(typecode, items)
+    except OverflowError:
+        return array.array('d', items)
+
+
+def typecode(x):
+    '''Typecode of a vector, or the one a vector holding number x has'''
+    if isinstance(x, array.array):
+        return x.typecode
+    return 'q' if type(x) is int else 'd'
+
+
+def elementwise(op, ufunc, x, y, result_code=None):
+    '''Applies op to the elements of vectors x and y, or to the elements of
+       one of them and a number; ufunc is the name of the NumPy equivalent
+       of op.  Without NumPy, the result has typecode result_code if given,
+       else 'q' if both operands hold integers, else 'd'.  Lists are
+       converted to vectors first; op is applied to two numbers as is.'''
+    x, y = as_operand(x), as_operand(y)
+    if not is_vector(x) and not is_vector(y):
+        return op(x, y)
+    if numpy is not None:
+        return getattr(numpy, ufunc)(x, y)
+    if isinstance(x, array.array):
+        if isinstance(y, array.array):
+            if len(x) != len(y):
+                raise ValueError("Vectors of different lengths: {} and {}."
+                                 .format(len(x), len(y)))
+            values = list(map(op, x, y))
+        else:
+            values = list(map(op, x, repeat(y, len(x))))
+    elif isinstance(y, array.array):
+        values = list(map(op, repeat(x, len(y)), y))
+    if result_code is None:
+        result_code = 'q' if typecode(x) == typecode(y) == 'q' else 'd'
+    return make_array(result_code, values)
+
+
+def vec(*items):
+    '''(vec x y ...) or (vec list) ==> vector of the numbers given'''
+    if len(items) == 1 and not isinstance(items[0], Number):
+        return to_vector(items[0])
+    return to_vector(items)
+
+
+def vrange(start, stop=None, step=1):
+    '''(vrange n) or (vrange start stop [step]) ==> vector of the integers
+       of Python's range'''
+    if stop is None:
+        start, stop = 0, start
+    integers = range(start, stop, step)   # TypeError for other numbers
+    if numpy is not None:
+        return numpy.arange(integers.start, integers.stop, integers.step)
+    return array.array('q', integers)
+
+
+def vec_to_list(v):
+    '''(vec->list v) ==> list of the elements of v'''
+    return to_vector(v).tolist()
+
+
+def vadd(x, y):
+    '''(vadd v w) ==> element-wise v + w; v or w may be a number'''
+    return elementwise(operator.add, 'add', x, y)
+
+
+def vsub(x, y):
+    '''(vsub v w) ==> element-wise v - w; v or w may be a number'''
+    return elementwise(operator.sub, 'subtract', x, y)
+
+
+def vmul(x, y):
+    '''(vmul v w) ==> element-wise v * w; v or w may be a number'''
+    return elementwise(operator.mul, 'multiply', x, y)
+
+
+def vdiv(x, y):
+    '''(vdiv v w) ==> element-wise v / w; v or w may be a number'''
+    return elementwise(operator.truediv, 'true_divide', x, y, 'd')
+
+
+def veq(x, y):
+    '''(v= v w) ==> vector of the truth values of v == w, element-wise'''
+    return elementwise(operator.eq, 'equal', x, y, 'b')
+
+
+def vlt(x, y):
+    '''(v< v w) ==> vector of the truth values of v < w, element-wise'''
+    return elementwise(operator.lt, 'less', x, y, 'b')
+
+
+def vgt(x, y):
+    '''(v> v w) ==> vector of the truth values of v > w, element-wise'''
+    return elementwise(operator.gt, 'greater', x, y, 'b')
+
+
+def vle(x, y):
+    '''(v<= v w) ==> vector of the truth values of v <= w, element-wise'''
+    return elementwise(operator.le, 'less_equal', x, y, 'b')
+
+
+def vge(x, y):
+    '''(v>= v w) ==> vector of the truth values of v >= w, element-wise'''
+    return elementwise(operator.ge, 'greater_equal', x, y, 'b')
+
+
+def vsum(v):
+    '''(vsum v) ==> sum of the elements of v'''
+    v = to_vector(v)
+    if numpy is not None:
+        return v.sum().item()
+    if v.typecode == 'd':
+        return math.fsum(v)
+    return sum(v)
+
+
+def vdot(v, w):
+    '''(vdot v w) ==> sum of the products of the elements of v and w'''
+    v, w = to_vector(v), to_vector(w)
+    if numpy is not None:
+        return numpy.dot(v, w).item()
+    if len(v) != len(w):
+        raise ValueError("Vectors of different lengths: {} and {}.".format(
+            len(v), len(w)))
+    if v.typecode == 'd' or w.typecode == 'd':
+        return math.fsum(map(operator.mul, v, w))
+    return sum(map(operator.mul, v, w))
+
+
+def vmap(f, v):
+    '''(vmap f v) ==> vector of (f x) for each element x of v; NumPy ufuncs
+       are applied in a single call, other functions once per element'''
+    v = to_vector(v)
+    if numpy is not None and isinstance(f, numpy.ufunc):
+        return f(v)
+    return to_vector(list(map(f, v.tolist())))
+
+vector_fns = {
+    'vec': vec,
+    'vrange': vrange,
+    'vec->list': vec_to_list,
+    'vec?': is_vector,
+    'vadd': vadd,
+    'vsub': vsub,
+    'vmul': vmul,
+    'vdiv': vdiv,
+    'v=': veq,
+    'v<': vlt,
+    'v>': vgt,
+    'v<=': vle,
+    'v>=': vge,
+    'vsum': vsum,
+    'vdot': vdot,
+    'vmap': vmap
+}
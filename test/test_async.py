@@ -0,0 +1,129 @@
+import asyncio
+import threading
+import time
+import unittest
+import petit_lisp as pl
+
+from src.async_utils import MAX_TASKS
+from src.budget import Budget, BudgetExceeded
+from src.parser import Parser
+
+parse = Parser().parse
+
+
+async def slow(delay, result):
+    await asyncio.sleep(delay)
+    return result
+
+
+async def fail():
+    raise KeyError("backend")
+
+
+class TestAsync(unittest.TestCase):
+    '''Lisp tasks await Python coroutines on an event loop'''
+
+    def setUp(self):  # noqa
+        pl.global_env = pl.common_env(pl.Env())
+        pl.evaluate(parse("(load 'src/default_language.lisp)"))
+        pl.global_env['slow'] = slow
+        pl.global_env['fail'] = fail
+
+    def run_lisp(self, source, engine=None):
+        return asyncio.run(pl.async_evaluate(parse(source), engine=engine))
+
+    def test_await(self):
+        for engine in pl.engines.values():
+            self.assertEqual(5, self.run_lisp("(+ 1 (await (slow 0 4)))",
+                                              engine))
+        self.assertEqual(3, self.run_lisp("(await 3)"))
+
+    def test_budget_of_tasks(self):
+        pl.evaluate(parse('''(define count (lambda (n)
+                                (if (= n 0) 'done (count (- n 1)))))'''))
+        for source in ("(await (gather (lambda () (count 20000))))",
+                       "(await (gather (lambda () (await (gather "
+                       "(lambda () (count 20000)))))))"):
+            with self.assertRaises(BudgetExceeded), Budget(steps=100):
+                pl.evaluate(parse(source))
+
+    def test_depth_of_tasks(self):
+        # each task counts the depth of its own calls
+        pl.evaluate(parse("""(define deep (lambda (n)
+                                (if (= n 0)
+                                    (await (slow 0.1 0))
+                                    (+ 1 (deep (- n 1))))))"""))
+        with Budget(depth=100) as budget:
+            self.assertEqual([43, 43, 43], pl.evaluate(parse(
+                "(await (gather (lambda () (deep 43)) (lambda () (deep 43))"
+                " (lambda () (deep 43))))")))
+        self.assertLess(budget.usage()['depth'], 50)
+
+    def test_await_without_event_loop(self):
+        self.assertEqual(4, pl.evaluate(parse("(await (slow 0 4))")))
+
+    def test_gather_overlaps(self):
+        start = time.perf_counter()
+        result = self.run_lisp('''(await (gather (slow 0.2 1) (slow 0.2 2)
+            (lambda () (+ 1 (await (slow 0.2 2))))))''')
+        self.assertEqual([1, 2, 3], result)
+        self.assertLess(time.perf_counter() - start, 0.5)
+
+    def test_concurrent_tasks(self):
+        async def main():
+            tasks = [pl.async_evaluate(parse("(await (slow 0.2 {}))".format(
+                i))) for i in range(5)]
+            return await asyncio.gather(*tasks)
+        start = time.perf_counter()
+        self.assertEqual([0, 1, 2, 3, 4], asyncio.run(main()))
+        self.assertLess(time.perf_counter() - start, 0.6)
+
+    def test_bounded_tasks(self):
+        lock = threading.Lock()
+        running = [0, 0]   # tasks running, most tasks running at a time
+
+        def enter():
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+
+        def leave():
+            with lock:
+                running[0] -= 1
+        pl.global_env['enter'] = enter
+        pl.global_env['leave'] = leave
+        pl.evaluate(parse("(await (gather {}))".format(
+            " (lambda () (begin (enter) (await (slow 0.01 0)) (leave)))"
+            * 100)))
+        self.assertEqual(0, running[0])
+        self.assertLessEqual(running[1], MAX_TASKS)
+
+    def test_nested_tasks(self):
+        # tasks awaiting tasks give their thread to them
+        pl.evaluate(parse("(define inner (lambda (i) (lambda () "
+                          "(car (await (gather (lambda () i)))))))"))
+        self.assertEqual(list(range(2 * MAX_TASKS)), pl.evaluate(parse(
+            "(await (gather {}))".format(" ".join(
+                "(inner {})".format(i) for i in range(2 * MAX_TASKS))))))
+
+    def test_errors(self):
+        self.assertRaises(KeyError, self.run_lisp, "(await (fail))")
+        self.assertRaises(KeyError, self.run_lisp,
+                          "(await (gather (slow 0 1) (fail)))")
+        self.assertRaises(ValueError, self.run_lisp, "undefined-name")
+
+    def test_interpreter(self):
+        interp = pl.Interpreter('compile')
+        interp.env['slow'] = slow
+        self.assertEqual([1, 2], asyncio.run(interp.async_run(
+            "(define x 1) (await (gather (slow 0 x) (slow 0 2)))")))
+
+    def test_interpreter_tasks(self):
+        # tasks waiting for the lock do not keep those of its holder waiting
+        interp = pl.Interpreter()
+
+        async def main():
+            return await asyncio.gather(*[interp.async_run(
+                "(car (await (gather (lambda () {}))))".format(i))
+                for i in range(MAX_TASKS + 8)])
+        self.assertEqual(list(range(MAX_TASKS + 8)), asyncio.run(main()))
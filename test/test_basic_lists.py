@@ -1,3 +1,6 @@
+import contextlib
+import io
+import random
 import unittest
 import petit_lisp as pl
 
@@ -42,3 +45,73 @@ class TestBasicLisp(unittest.TestCase):
     def test_is_atom(self):
         self.assertEqual(True, evaluate("(atom? 3)"))
         self.assertEqual(False, evaluate("(atom? '(1 2 3))"))
+
+    def test_cons_shares_list(self):
+        evaluate("(define a '(2 3))")
+        evaluate("(define b (cons 1 a))")
+        self.assertIs(pl.global_env['a'], evaluate("(cdr b)"))
+        self.assertEqual([1, 2, 3], evaluate("b"))
+        self.assertEqual([3], evaluate("(cdr (cdr b))"))
+        self.assertEqual([], evaluate("(cdr (cdr (cdr b)))"))
+
+    def test_cdr_empty(self):
+        self.assertEqual([], evaluate("(cdr '(1))"))
+        self.assertEqual(True, evaluate("(atom? 3)"))
+        self.assertEqual(False, evaluate("(atom? (cons 1 '()))"))
+        self.assertEqual(False, evaluate("(eq? (cons 1 '()) '(1))"))
+
+
+class TestLongLists(unittest.TestCase):
+    '''Walking down a list with car/cdr takes linear time'''
+
+    def setUp(self):  # noqa
+        pl.global_env = pl.common_env(pl.Env())
+        evaluate("(load 'src/default_language.lisp)")
+
+    def test_last(self):
+        pl.global_env['data'] = list(range(30000))
+        self.assertEqual(29999, evaluate("(last data)"))
+
+    def test_build_and_walk(self):
+        evaluate("""(define build (lambda (n acc)
+                        (if (= n 0) acc (build (- n 1) (cons n acc)))))""")
+        evaluate("(define data (build 5000 '()))")
+        self.assertEqual(5000, len(pl.global_env['data']))
+        self.assertEqual(5000, evaluate("(last data)"))
+        self.assertEqual(False, evaluate("(null? data)"))
+        self.assertEqual(list(range(1, 5001)), evaluate("data"))
+
+    def test_to_string(self):
+        from src.repl import InteractiveInterpreter
+        val = evaluate("(cons 1 (cons '(2 3) '()))")
+        self.assertEqual("(1 (2 3))", InteractiveInterpreter().to_string(val))
+
+    def test_python_interop(self):
+        evaluate("(define a (cons 1 (cons 2 '())))")
+        pl.global_env['b'] = []
+        self.assertEqual(None, evaluate("(with-py-inst b 'extend a)"))
+        self.assertEqual([1, 2], pl.global_env['b'])
+        self.assertIs(list, type(pl.global_env['b']))
+        # Python lists are passed as they are, and may be changed
+        pl.global_env['random'] = random.Random(0)
+        evaluate("(define c '(1 2 3 4 5 6 7 8))")
+        evaluate("(with-py-inst random 'shuffle c)")
+        self.assertEqual(list(range(1, 9)), sorted(pl.global_env['c']))
+        self.assertNotEqual(list(range(1, 9)), pl.global_env['c'])
+
+    def test_imported_functions(self):
+        for engine in (pl.evaluate, pl.execute):
+            pl.global_env = pl.common_env(pl.Env())
+            engine(parse("(from-py-load 'json 'dumps)"))
+            self.assertEqual("[1, [2, 3]]", engine(parse(
+                "(dumps (cons 1 (cons (cons 2 (cons 3 '())) '())))")))
+            engine(parse("(define f (lambda (x) (dumps (cons x '()))))"))
+            self.assertEqual("[4]", engine(parse("(f 4)")))
+            self.assertEqual("[5]", engine(parse(
+                "((lambda (g) (g (cons 5 '()))) dumps)")))
+
+    def test_loaded_values(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            pl.loader.load_stream(io.StringIO("(cons 1 (cons 2 '()))"))
+        self.assertEqual("(1 2)\n", output.getvalue())
@@ -0,0 +1,69 @@
+import contextlib
+import io
+import unittest
+from unittest import mock
+import petit_lisp as pl
+
+from bench import runner
+from bench.workloads import WORKLOADS
+
+
+class TestRunner(unittest.TestCase):
+    '''The benchmark runner measures workloads and flags regressions'''
+
+    def tearDown(self):  # noqa
+        pl.use_engine('interpret')
+
+    def test_run(self):
+        results = runner.run(['cond_chain'], 'compile', min_time=0)
+        stats = results['results']['cond_chain']
+        self.assertEqual(5, stats['runs'])
+        self.assertGreater(stats['ops_per_sec'], 0)
+        self.assertLessEqual(stats['p50_ms'], stats['p99_ms'])
+        self.assertGreater(stats['peak_kb'], 0)
+
+    def test_all_workloads(self):
+        for engine in ('interpret', 'compile'):
+            results = runner.run(None, engine, min_time=0, min_runs=1,
+                                 memory=False)['results']
+            self.assertEqual(set(WORKLOADS), set(results))
+            for name, stats in results.items():
+                self.assertNotIn('error', stats, name)
+
+    def test_failed(self):
+        def failing(engine):
+            def operation():
+                raise RecursionError("too deep")
+            return operation
+        with mock.patch.dict(WORKLOADS, failing=failing):
+            results = runner.run(['failing', 'cond_chain'], min_time=0)
+        self.assertEqual({'error': 'RecursionError: too deep'},
+                         results['results']['failing'])
+        self.assertEqual(5, results['results']['cond_chain']['runs'])
+        results['results']['cond_chain']['peak_kb'] = None
+        regressions = runner.compare(results, {'results': {}})
+        self.assertEqual(["failing: failed with RecursionError: too deep"],
+                         regressions)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            runner.report(results, results)
+        self.assertIn("failing            failed with RecursionError",
+                      output.getvalue())
+
+    def test_compare(self):
+        baseline = {'results': {
+            'a': {'ops_per_sec': 100, 'peak_kb': 10},
+            'b': {'ops_per_sec': 100, 'peak_kb': 10}}}
+        results = {'results': {
+            'a': {'ops_per_sec': 95, 'peak_kb': 10.5},
+            'b': {'ops_per_sec': 80, 'peak_kb': 20},
+            'c': {'ops_per_sec': 1, 'peak_kb': 1}}}
+        regressions = runner.compare(results, baseline)
+        self.assertEqual(2, len(regressions))
+        self.assertTrue(all(r.startswith('b:') for r in regressions))
+
+    def test_percentile(self):
+        values = list(range(100))
+        self.assertEqual(50, runner.percentile(values, 0.5))
+        self.assertEqual(99, runner.percentile(values, 0.99))
+        self.assertEqual(99, runner.percentile(values, 1))
@@ -0,0 +1,84 @@
+import os
+import tempfile
+import unittest
+import petit_lisp as pl
+
+from src.budget import Budget, BudgetExceeded
+
+DEFINITIONS = '''
+(define loop (lambda (n) (loop (+ n 1))))
+(define deep (lambda (n) (+ 1 (deep n))))
+(define grow (lambda (acc) (grow (cons acc acc))))
+(define count (lambda (n) (if (= n 0) 'done (count (- n 1)))))
+'''
+
+
+class TestBudget(unittest.TestCase):
+    '''Evaluations stop with BudgetExceeded when they use too much'''
+
+    def setUp(self):  # noqa
+        self.interpreters = [pl.Interpreter(engine)
+                             for engine in ('interpret', 'compile')]
+        for interp in self.interpreters:
+            interp.run(DEFINITIONS)
+
+    def exceeds(self, source, limit, **limits):
+        for interp in self.interpreters:
+            with self.assertRaises(BudgetExceeded) as context:
+                interp.run(source, Budget(**limits))
+            self.assertEqual(limit, context.exception.limit)
+            self.assertIn(limit, str(context.exception))
+        return context.exception.usage
+
+    def test_steps(self):
+        usage = self.exceeds("(loop 0)", 'steps', steps=1000)
+        self.assertEqual(1001, usage['steps'])
+
+    def test_seconds(self):
+        usage = self.exceeds("(loop 0)", 'seconds', seconds=0.05)
+        self.assertGreaterEqual(usage['seconds'], 0.05)
+
+    def test_depth(self):
+        usage = self.exceeds("(deep 0)", 'depth', depth=50)
+        self.assertEqual(51, usage['depth'])
+
+    def test_allocations(self):
+        self.exceeds("(grow '())", 'allocations', allocations=10000)
+
+    def test_lazy_sequences(self):
+        # built-in procedures count the elements they read as steps
+        for source in ("(seq->list (range 3000000))",
+                       "(take 5 (drop 100000000 (range)))",
+                       "(lazy-for-each (lambda (x) x) (range))",
+                       "(lazy-for-each vec? (lazy-map - (range)))"):
+            self.exceeds(source, 'steps', steps=1000)
+        self.exceeds("(seq->list (range))", 'seconds', seconds=0.05)
+
+    def test_within_budget(self):
+        for interp in self.interpreters:
+            budget = Budget(steps=10000, seconds=10, depth=20)
+            self.assertEqual('done', interp.run("(count 100)", budget))
+            usage = budget.usage()
+            self.assertLessEqual(usage['steps'], 10000)
+            self.assertLessEqual(usage['depth'], 20)
+            self.assertGreater(usage['steps'], 100)
+        # the budget no longer applies
+        self.assertEqual('done', interp.run("(count 100)"))
+
+    def test_load(self):
+        handle, filename = tempfile.mkstemp(suffix=".lisp")
+        with os.fdopen(handle, "w") as f:
+            f.write("(define x 1)\n(loop 0)\n")
+        try:
+            interp = self.interpreters[0]
+            self.assertRaises(BudgetExceeded, interp.load, filename,
+                              Budget(steps=100))
+            self.assertEqual(1, interp.run("x"))
+        finally:
+            os.remove(filename)
+
+    def test_pool(self):
+        pool = pl.InterpreterPool(size=1)
+        self.assertRaises(BudgetExceeded, pool.run,
+                          "(define f (lambda () (f))) (f)", Budget(steps=50))
+        self.assertEqual(3, pool.run("(+ 1 2)", Budget(steps=50)))
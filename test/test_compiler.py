@@ -0,0 +1,144 @@
+
+import unittest
+import petit_lisp as pl
+
+from src.compiler import Frame, run
+from src.parser import Parser
+
+parse = Parser().parse
+
+
+def execute(s):
+    return pl.execute(parse(s))
+
+
+class TestCompile(unittest.TestCase):
+    '''Runs programs with the compiled engine, including the prelude'''
+
+    def setUp(self):  # noqa
+        pl.global_env = pl.common_env(pl.Env())
+        self.assertEqual(True, execute("(undefined? x)"))
+        pl.use_engine('compile')
+        execute("(load 'src/default_language.lisp)")
+
+    def tearDown(self):  # noqa
+        pl.use_engine('interpret')
+
+    def test_prelude_is_compiled(self):
+        self.assertIs(run, pl.global_env['append'].evaluate)
+
+    def test_define(self):
+        self.assertEqual(None, execute("(define x 3)"))
+        self.assertEqual(False, execute("(undefined? x)"))
+        self.assertEqual(7, execute("(+ x 4)"))
+
+    def test_built_by_python(self):
+        self.assertEqual(None, pl.execute(['define', 'x', 3]))
+        self.assertEqual(3, pl.execute(['if', True, 'x', 0]))
+        self.assertEqual(['a', 1], pl.execute(['quote', ['a', 1]]))
+        self.assertEqual(9, pl.execute(
+            [['lambda', ['y'], ['*', 'y', 'x']], 3]))
+
+    def test_set(self):
+        execute("(define x 3)")
+        self.assertEqual(None, execute("(set! x 4)"))
+        self.assertEqual(8, execute("(+ x 4)"))
+
+    def test_lambda(self):
+        execute("(define square (lambda (x) (* x x)))")
+        self.assertEqual(9, execute("(square 3)"))
+
+    def test_closure(self):
+        execute("(define adder (lambda (n) (lambda (x) (+ x n))))")
+        execute("(define add2 (adder 2))")
+        self.assertEqual(5, execute("(add2 3)"))
+
+    def test_variadic(self):
+        self.assertEqual([1, 2, 3], execute("(list 1 2 3)"))
+        self.assertEqual(True, execute("(< 1 2 3 4)"))
+        self.assertEqual(False, execute("(< 1 3 2 4)"))
+
+    def test_cond_and_if(self):
+        execute("""(define abs2 (lambda (x)
+                       (cond ((<= x 0) (- x))
+                             (else x))))""")
+        self.assertEqual(3, execute("(abs2 -3)"))
+        self.assertEqual(2, execute("(if (> 2 1) 2 1)"))
+
+    def test_load_python_scope(self):
+        pl.loader.load("test/scope_test.lisp")
+        self.assertEqual(3, execute("pi"))
+        from math import pi
+        self.assertEqual(pi, execute("(mul_pi 1)"))
+
+    def test_tail_call(self):
+        execute("""(define count (lambda (n)
+                       (if (= n 0) 'done (count (- n 1)))))""")
+        self.assertEqual('done', execute("(count 5000)"))
+
+    def test_lambda_with_rest_param_compiled_twice(self):
+        execute("(define make (lambda () (lambda (x . y) y)))")
+        self.assertEqual([2, 3], execute("((make) 1 2 3)"))
+        self.assertEqual([2, 3], execute("((make) 1 2 3)"))
+
+    def test_frames_are_slot_arrays(self):
+        execute("(define f (lambda (x) (lambda (y) x)))")
+        closure = execute("(f 1)")
+        self.assertIsInstance(closure.env, Frame)
+        self.assertEqual([1], closure.env.slots)
+
+    def test_local_define_and_set(self):
+        execute("""(define counter (lambda ()
+                       (begin (define n 0)
+                              (lambda () (begin (set! n (+ n 1)) n)))))""")
+        execute("(define c (counter))")
+        execute("(c)")
+        self.assertEqual(2, execute("(c)"))
+        self.assertEqual(True, execute("(undefined? n)"))
+
+    def test_nested_closures(self):
+        execute("""(define f (lambda (a) (lambda (b) (lambda (c)
+                       (lambda (d) (list a b c d))))))""")
+        self.assertEqual([1, 2, 3, 4], execute("((((f 1) 2) 3) 4)"))
+
+    def test_global_redefined_after_compile(self):
+        execute("(define g (lambda () y))")
+        execute("(define y 1)")
+        self.assertEqual(1, execute("(g)"))
+        execute("(set! y 2)")
+        self.assertEqual(2, execute("(g)"))
+
+    def test_wrong_number_of_arguments(self):
+        execute("(define square (lambda (x) (* x x)))")
+        self.assertRaises(TypeError, execute, "(square 1 2)")
+
+    def test_special_forms(self):
+        self.assertEqual(False, execute("(and #f (car '()))"))
+        self.assertEqual(2, execute("(or #f 2 (car '()))"))
+        self.assertEqual(None, execute("(when #f (car '()))"))
+        self.assertEqual(3, execute("(unless #f 1 3)"))
+        execute("(define x 10)")
+        self.assertEqual(13, execute("(let ((x 1) (y (+ x 2))) (+ x y))"))
+        execute("(define n 0)")
+        self.assertEqual(None, execute("(let ((a (set! n 1))))"))
+        self.assertEqual(1, execute("n"))
+
+    def test_let_in_procedure(self):
+        execute("""(define f (lambda (a)
+                       (let ((b (+ a 1)))
+                           (define c (+ b 1))
+                           (lambda () (list a b c)))))""")
+        self.assertEqual([1, 2, 3], execute("((f 1))"))
+        self.assertEqual(True, execute("(undefined? c)"))
+
+    def test_deep_recursion(self):
+        # non tail calls of compiled procedures use few Python frames
+        execute("(define data (vec->list (vrange 300)))")
+        self.assertEqual(301, len(execute("(append data '(0))")))
+        execute("""(define depth (lambda (n)
+                       (if (= n 0) 0 (+ 1 (depth (- n 1))))))""")
+        self.assertEqual(300, execute("(depth 300)"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import petit_lisp as pl
+
+from src import data
+from src.lazy import LazySeq
+from src.parser import Parser
+from src.symbols import LispString, Symbol
+
+SOURCE = '''; a table
+(row 1 "first row" (x 1.5 y -2) 'a)
+(row 2 "second" (x .5 y 3e2) ())   ; comment
+symbol 42 "text"
+'''
+
+
+class TestReadData(unittest.TestCase):
+    '''read-data reads the expressions of a file, without evaluating them'''
+
+    def setUp(self):  # noqa
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):  # noqa
+        shutil.rmtree(self.directory)
+
+    def write(self, text, name="data.lisp"):
+        path = os.path.join(self.directory, name)
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+    def test_same_as_parser(self):
+        path = self.write(SOURCE)
+        expected = Parser().parse_all(SOURCE)
+        for use_mmap in (False, True):
+            items = list(data.iter_data(path, use_mmap))
+            self.assertEqual(expected, items)
+        self.assertEqual(['quote', 'a'], items[0][4])
+        self.assertIs(Symbol, type(items[0][0]))
+        self.assertIs(LispString, type(items[0][2]))
+        self.assertEqual([int, float, float], [type(items[0][1]),
+                                               type(items[0][3][1]),
+                                               type(items[1][3][3])])
+
+    def test_empty(self):
+        path = self.write("; nothing\n")
+        self.assertEqual([], list(data.iter_data(path, use_mmap=True)))
+        self.assertEqual([], data.read_data(self.write("", "empty.lisp")))
+
+    def test_errors(self):
+        for text, message in (("(a)\n  (b\n", "line 2, column 3"),
+                              ("(a)) ", "line 1, column 4"),
+                              ('(a "b)', "line 1, column 1")):
+            path = self.write(text)
+            with self.assertRaises(SyntaxError) as cm:
+                list(Parser().read_stream(io.StringIO(text)))
+            self.assertIn(message, str(cm.exception))
+            for use_mmap in (False, True):   # as reported by the parser
+                with self.assertRaises(SyntaxError) as error:
+                    list(data.iter_data(path, use_mmap))
+                self.assertEqual(str(cm.exception), str(error.exception))
+
+    def test_decoded_by_chunks(self):
+        text = '(\u00e9t\u00e9 "\u20ac") \u00e0'
+        stream = data.MappedText(io.BytesIO(text.encode()))
+        self.assertEqual(Parser().parse_all(text), [
+            expr for expr, _, _ in Parser().read_stream(stream, 1)])
+        path = os.path.join(self.directory, "utf8.lisp")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        self.assertEqual(Parser().parse_all(text),
+                         list(data.iter_data(path, use_mmap=True)))
+
+    def test_lazy(self):
+        path = self.write("(1 2) (3) ")
+        items = data.iter_data(path, use_mmap=True)
+        self.assertEqual([1, 2], next(items))
+        items.close()   # unmaps the file
+        sequence = data.read_data(path, True)
+        self.assertIs(LazySeq, type(sequence))
+        self.assertEqual([[1, 2], [3]], list(sequence))
+
+    def test_builtin(self):
+        path = self.write(SOURCE)
+        expected = Parser().parse_all(SOURCE)
+        for engine in ('interpret', 'compile'):
+            interp = pl.Interpreter(engine)
+            self.assertEqual(expected, interp.run(
+                "(read-data '{})".format(path)))
+            self.assertEqual("second", interp.run(
+                "(car (cdr (cdr (car (cdr (read-data '{} #t))))))".format(
+                    path)))
+
+
+if __name__ == '__main__':
+    unittest.main()
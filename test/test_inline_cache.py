@@ -0,0 +1,98 @@
+import pickle
+import unittest
+from unittest import mock
+import petit_lisp as pl
+
+from src import native
+from src.symbols import Form
+
+ENGINES = ('interpret', 'compile')
+
+
+class TestInlineCache(unittest.TestCase):
+    '''Calls to global procedures remember the procedure they found until
+       a name is defined or set in the global environment'''
+
+    def test_cached(self):
+        interp = pl.Interpreter()
+        interp.run("(define twice (lambda (x) (* 2 x)))")
+        call = pl.parse("(twice 4)")
+        self.assertEqual(8, interp.evaluate(call))
+        self.assertIsNotNone(call.cache)
+        self.assertEqual(8, interp.evaluate(call))
+
+    def test_redefined(self):
+        for engine in ENGINES:
+            interp = pl.Interpreter(engine)
+            interp.run("(define f (lambda (x) 1))")
+            interp.run("(define g (lambda (x) (f x)))")
+            self.assertEqual(1, interp.run("(g 0)"))
+            interp.run("(define f (lambda (x) 2))")
+            self.assertEqual(2, interp.run("(g 0)"))
+            interp.run("(set! f (lambda (x) 3))")
+            self.assertEqual(3, interp.run("(g 0)"))
+
+    def test_shadowed(self):
+        for engine in ENGINES:
+            interp = pl.Interpreter(engine)
+            interp.run("(define f (lambda (x) 'global))")
+            interp.run("(define h (lambda (f) (f 1)))")
+            self.assertEqual(['global', 2, 'global'],
+                             [interp.run("(f 1)"),
+                              interp.run("(h (lambda (x) (+ x 1)))"),
+                              interp.run("(f 1)")])
+
+    def test_shadowed_by_define(self):
+        # the same call finds a local procedure, then the global one
+        interp = pl.Interpreter()
+        interp.run("(define f (lambda (x) 'global))")
+        interp.run('''(define g (lambda (local)
+                         (begin (if local (define f (lambda (x) 'local)) 0)
+                                (f 1))))''')
+        self.assertEqual(['global', 'local', 'global'],
+                         interp.run("(list (g #f) (g #t) (g #f))"))
+
+    def test_env_aware(self):
+        for engine in ENGINES:
+            interp = pl.Interpreter(engine)
+            interp.run("(define f (lambda ()"
+                       "  (begin (load-py 'math) (sqrt 4))))")
+            self.assertEqual(2, interp.run("(f)"))
+            self.assertEqual(2, interp.run("(f)"))
+
+    def test_optimized(self):
+        interp = pl.Interpreter('interpret-optimized')
+        interp.run("(define g (lambda (x) (list x (not x))))")
+        body = interp.env['g'].body
+        self.assertIs(Form, type(body))
+        self.assertEqual([1, False], interp.run("(g 1)"))
+        self.assertIsNotNone(body.cache)
+        self.assertIsNotNone(body[2].optimized.cache)   # inlined (__not__ x)
+
+    def test_use_native(self):
+        calls = []
+
+        def append(*lists):
+            calls.append(lists)
+            return native.append(*lists)
+        with mock.patch.dict(native.native_procs, append=append):
+            for engine in ENGINES:
+                interp = pl.Interpreter(engine)
+                interp.run("(define f (lambda (a b) (append a b)))")
+                self.assertEqual([1, 2], interp.run("(f '(1) '(2))"))
+                interp.run("(use-native 'append)")
+                self.assertEqual([1, 2], interp.run("(f '(1) '(2))"))
+        self.assertEqual(2, len(calls))
+
+    def test_not_pickled(self):
+        interp = pl.Interpreter()
+        call = pl.parse("(list 1 (list 2))")
+        interp.evaluate(call)
+        copy = pickle.loads(pickle.dumps(call))
+        self.assertEqual(call, copy)
+        self.assertIs(Form, type(copy[2]))
+        self.assertIsNone(copy.cache)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+import petit_lisp as pl
+
+from src.symbols import Symbol
+
+
+def in_threads(target, count=8):
+    '''Runs target(i) for i in range(count) in as many threads; returns
+       the results'''
+    results = [None] * count
+
+    def run(i):
+        results[i] = target(i)
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class TestInterpreter(unittest.TestCase):
+    '''Interpreters are independent of each other and of the module level
+       global environment'''
+
+    def test_independent(self):
+        first, second = pl.Interpreter(), pl.Interpreter('compile')
+        first.run("(define x 1)")
+        second.run("(define x 2)")
+        self.assertEqual(1, first.run("x"))
+        self.assertEqual(2, second.run("x"))
+        self.assertEqual([1, 2], second.run("(list 1 x)"))
+        self.assertNotIn('x', pl.global_env)
+
+    def test_load(self):
+        handle, filename = tempfile.mkstemp(suffix=".lisp")
+        with os.fdopen(handle, "w") as f:
+            f.write("(define loaded 42)\n")
+        try:
+            interp = pl.Interpreter()
+            interp.run("(load '{})".format(filename))
+            self.assertEqual(42, interp.run("loaded"))
+            self.assertNotIn('loaded', pl.global_env)
+        finally:
+            os.remove(filename)
+
+    def test_snapshot_and_fork(self):
+        interp = pl.Interpreter()
+        interp.run("(define square (lambda (x) (* x x)))")
+        copy = pl.Interpreter.from_snapshot(interp.snapshot())
+        child = interp.fork()
+        child.run("(define y 3)")
+        self.assertEqual(9, copy.run("(square 3)"))
+        self.assertEqual(9, child.run("(square y)"))
+        self.assertEqual(True, interp.run("(undefined? y)"))
+
+    def test_shared_between_threads(self):
+        interp = pl.Interpreter()
+        interp.run('''(define count (lambda (n acc)
+                        (if (= n 0) acc (count (- n 1) (+ acc 1)))))''')
+        results = in_threads(lambda i: interp.run("(count {} 0)".format(i)))
+        self.assertEqual(list(range(8)), results)
+
+    def test_reentrant_lambda(self):
+        interp = pl.Interpreter()
+        interp.run("(define make (lambda () (lambda (x . y) y)))")
+        self.assertEqual([2, 3], interp.run("((make) 1 2 3)"))
+        self.assertEqual([2, 3], interp.run("((make) 1 2 3)"))
+
+
+class TestInterpreterPool(unittest.TestCase):
+    '''Threads borrow pre-warmed interpreters from a pool'''
+
+    def test_threads(self):
+        pool = pl.InterpreterPool(size=3, engine='compile')
+
+        def work(i):
+            return pool.run('''(begin
+                (define fact (lambda (n) (if (< n 2) 1 (* n (fact (- n 1))))))
+                (define n {})
+                (fact n))'''.format(i))
+        results = in_threads(work)
+        self.assertEqual([1, 1, 2, 6, 24, 120, 720, 5040], results)
+        pool.wait()
+        self.assertEqual(3, pool.idle.qsize())
+        # each interpreter is replaced when returned
+        self.assertEqual(True, pool.run("(undefined? fact)"))
+
+    def test_reset_after_use(self):
+        pool = pl.InterpreterPool(size=1)
+        new_interpreter = pool.new_interpreter
+
+        def slow_restore():
+            time.sleep(0.3)
+            return new_interpreter()
+        pool.new_interpreter = slow_restore
+        start = time.perf_counter()
+        self.assertEqual(3, pool.run("(+ 1 2)"))
+        self.assertLess(time.perf_counter() - start, 0.2)
+        self.assertEqual(True, pool.run("(undefined? y)"))   # waits
+
+    def test_no_reset(self):
+        pool = pl.InterpreterPool(size=1, reset=False)
+        pool.run("(define x 1)")
+        self.assertEqual(1, pool.run("x"))
+
+
+class TestSymbols(unittest.TestCase):
+    '''Symbols created at the same time by several threads are the same'''
+
+    def test_interned(self):
+        names = ["threaded-symbol-{}".format(i) for i in range(200)]
+        results = in_threads(lambda i: [Symbol(name) for name in names])
+        for symbols in results[1:]:
+            for a, b in zip(results[0], symbols):
+                self.assertIs(a, b)
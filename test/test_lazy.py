@@ -0,0 +1,84 @@
+import gc
+import unittest
+import weakref
+import petit_lisp as pl
+
+from src.lazy import LazySeq
+from src.repl import InteractiveInterpreter
+
+
+class TestLazy(unittest.TestCase):
+    '''delay and lazy-seq postpone evaluation, in both engines'''
+
+    def run_both(self, *sources):
+        results = []
+        for engine in ('interpret', 'compile'):
+            interp = pl.Interpreter(engine)
+            for source in sources:
+                result = interp.run(source)
+            results.append(result)
+        self.assertEqual(results[0], results[1])
+        return results[0]
+
+    def test_delay(self):
+        self.assertEqual([1, 1], self.run_both(
+            "(define count 0)",
+            "(define p (delay (begin (set! count (+ count 1)) count)))",
+            "(list (force p) (force p))"))
+        self.assertEqual(3, self.run_both("(force 3)"))
+
+    def test_lazy_seq(self):
+        self.assertEqual([5, 6, 7], self.run_both(
+            "(define ints (lambda (n) (lazy-seq (cons n (ints (+ n 1))))))",
+            "(take 3 (cdr (cdr (ints 3))))"))
+        self.assertEqual(True, self.run_both("(null? (lazy-seq '()))"))
+
+    def test_not_evaluated(self):
+        self.assertEqual(True, self.run_both(
+            "(lazy-seq? (lazy-seq (undefined-procedure)))"))
+
+    def test_builtins(self):
+        self.assertEqual([0, 4, 16], self.run_both(
+            "(take 3 (lazy-filter (lambda (x) (= x (* 2 (// x 2))))"
+            "                     (lazy-map * (range) (range))))"))
+        self.assertEqual([7, 8, 9], self.run_both(
+            "(seq->list (drop 7 (range 10)))"))
+        self.assertEqual([11, 13], self.run_both(
+            "(take 5 (lazy-map + (seq '(1 2)) (range 10 20)))"))
+
+    def test_python_iterator(self):
+        lines = iter(["a", "b", "c"])
+        interp = pl.Interpreter()
+        interp.env['lines'] = lines
+        interp.run("(define s (seq lines))")
+        self.assertEqual(["a", "b"], interp.run("(take 2 s)"))
+        self.assertEqual(["a", "b", "c"], interp.run("(seq->list s)"))
+        self.assertEqual("b", interp.run("(car (cdr s))"))
+
+    def test_for_each_frees_items(self):
+        items = []
+
+        class Item:
+            pass
+
+        def make(i):
+            item = Item()
+            items.append(weakref.ref(item))
+            return item
+        interp = pl.Interpreter()
+        interp.env['make'] = make
+        interp.env['collect'] = gc.collect
+        interp.run("(lazy-for-each (lambda (x) (collect))"
+                   "               (lazy-map make (range 5)))")
+        self.assertEqual(5, len(items))
+        self.assertTrue(all(item() is None for item in items))
+        interp.run("(define s (range 3))")
+        interp.run("(lazy-for-each (lambda (x) x) s)")
+        self.assertRaises(ValueError, interp.run, "(car s)")
+
+    def test_to_string(self):
+        to_string = InteractiveInterpreter().to_string
+        self.assertEqual("(1 2)", to_string(pl.Interpreter().run(
+            "(seq '(1 2))")))
+        self.assertTrue(to_string(LazySeq(lambda: [1] * 100)).endswith(
+            " 1 ...)"))
@@ -1,7 +1,13 @@
+import io
+import os
+import shutil
+import tempfile
 import unittest
 
 from src.parser import Parser
 from src.file_loader import FileLoader
+from src.parse_cache import ParseCache
+from src.symbols import LispString
 
 loader = FileLoader()
 parse = Parser().parse
@@ -26,3 +32,53 @@ class TestLoadFile(unittest.TestCase):
     def test_load_file(self):
         loader.load("test/define_variable_test.lisp")
         self.assertEqual(3, evaluate(parse("x")))
+
+    def test_load_stream(self):
+        loader.load_stream(io.StringIO("(define y 4)\n(define z\n 5) ; (define"))
+        self.assertEqual(4, evaluate(parse("y")))
+        self.assertEqual(5, evaluate(parse("z")))
+
+
+class TestParseCache(unittest.TestCase):
+    '''Loading a file a second time uses the cached expressions'''
+
+    def setUp(self):  # noqa
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, "cached.lisp")
+        self.write('(define s "text")\n(define n 1)\n')
+        self.forms = []
+        self.loader = FileLoader(self.forms.append,
+                                 read_stream=Parser().read_stream,
+                                 cache=ParseCache())
+
+    def tearDown(self):  # noqa
+        shutil.rmtree(self.dir)
+
+    def write(self, source):
+        with open(self.filename, "w") as f:
+            f.write(source)
+
+    def no_reading(self, stream):
+        raise AssertionError("the reader should not be used")
+
+    def test_cache_hit_skips_reader(self):
+        self.loader.load(self.filename)
+        self.assertTrue(os.path.exists(ParseCache.cache_path(self.filename)))
+        self.loader.read_stream = self.no_reading
+        self.loader.load(self.filename)
+        self.assertEqual(self.forms[1], self.forms[3])
+        self.assertIsInstance(self.forms[2][2], LispString)
+        self.assertIs(self.forms[0][0], self.forms[2][0])
+
+    def test_stale_entry(self):
+        self.loader.load(self.filename)
+        self.write('(define n 2)\n')
+        self.loader.load(self.filename)
+        self.assertEqual(['define', 'n', 2], self.forms[-1])
+
+    def test_corrupt_entry(self):
+        self.loader.load(self.filename)
+        with open(ParseCache.cache_path(self.filename), "wb") as f:
+            f.write(b"not a pickle")
+        self.loader.load(self.filename)
+        self.assertEqual(['define', 'n', 1], self.forms[-1])
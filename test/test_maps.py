@@ -0,0 +1,119 @@
+import random
+import unittest
+import petit_lisp as pl
+
+from src.maps import PersistentMap, PersistentSet
+from src.parser import Parser
+from src.repl import InteractiveInterpreter
+
+parse = Parser().parse
+
+
+def evaluate(s):
+    return pl.evaluate(parse(s))
+
+
+class Colliding:
+    '''Keys whose hashes often collide'''
+
+    def __init__(self, value):
+        self.value = value
+
+    def __hash__(self):
+        return self.value % 7
+
+    def __eq__(self, other):
+        return isinstance(other, Colliding) and other.value == self.value
+
+
+class TestPersistentMap(unittest.TestCase):
+    '''Persistent maps behave like dicts, and older versions are unchanged
+       by later ones'''
+
+    def check(self, make_key):
+        rng = random.Random(1)
+        m, d = PersistentMap(), {}
+        versions = []
+        for step in range(3000):
+            key = make_key(rng.randrange(200))
+            if rng.random() < 0.6:
+                m, d[key] = m.set(key, step), step
+            else:
+                m = m.delete(key)
+                d.pop(key, None)
+            if step % 300 == 0:
+                versions.append((m, dict(d)))
+            self.assertEqual(len(d), len(m))
+        self.assertEqual(d, m)
+        for old_map, old_dict in versions:
+            self.assertEqual(old_dict, old_map)
+        for key in d:
+            m = m.delete(key)
+        self.assertEqual(0, len(m))
+        self.assertEqual((), m.root.entries)
+
+    def test_random_operations(self):
+        self.check(int)
+        self.check(str)
+
+    def test_collisions(self):
+        self.check(Colliding)
+
+    def test_sets(self):
+        s = PersistentSet([1, 2, 3])
+        self.assertEqual({1, 2, 3, 4}, s.add(4))
+        self.assertEqual({2, 3}, s.discard(1))
+        self.assertEqual({1, 2, 3}, s)
+        self.assertEqual(hash(s), hash(PersistentSet([3, 2, 1])))
+
+
+class TestMapBuiltins(unittest.TestCase):
+
+    def setUp(self):  # noqa
+        pl.global_env = pl.common_env(pl.Env())
+        pl.evaluate(parse("(load 'src/default_language.lisp)"))
+
+    def test_persistent_map(self):
+        evaluate("(define m (hash-map 'a 1 'b 2))")
+        evaluate("(define n (put (remove m 'a) 'c 3))")
+        self.assertEqual(1, evaluate("(get m 'a)"))
+        self.assertEqual(False, evaluate("(get n 'a)"))
+        self.assertEqual(0, evaluate("(get n 'a 0)"))
+        self.assertEqual(True, evaluate("(contains? n 'c)"))
+        self.assertEqual(False, evaluate("(contains? m 'c)"))
+        self.assertEqual(2, evaluate("(size n)"))
+        self.assertEqual([['b', 2], ['c', 3]],
+                         sorted(evaluate("(items n)")))
+        self.assertEqual(True, evaluate("(hash-map? m)"))
+
+    def test_mutable_map(self):
+        evaluate("(define m (mutable-hash-map 'a 1))")
+        evaluate("(put! m 'b 2)")
+        evaluate("(define copy (remove m 'a))")
+        self.assertEqual({'a': 1, 'b': 2}, evaluate("m"))
+        self.assertEqual({'b': 2}, evaluate("copy"))
+        evaluate("(remove! m 'b)")
+        self.assertEqual([1], evaluate("(values m)"))
+
+    def test_sets(self):
+        evaluate("(define s (hash-set 1 2))")
+        evaluate("(define t (mutable-hash-set 1 2))")
+        evaluate("(put! t 3)")
+        self.assertEqual(3, evaluate("(size (put s 3))"))
+        self.assertEqual(2, evaluate("(size s)"))
+        self.assertEqual(True, evaluate("(contains? t 3)"))
+        self.assertEqual(2, evaluate("(get s 2)"))
+        self.assertEqual([1, 2], sorted(evaluate("(keys s)")))
+        self.assertEqual(True, evaluate("(hash-set? t)"))
+        self.assertRaises(TypeError, evaluate, "(put! s 3)")
+
+    def test_odd_arguments(self):
+        self.assertRaises(ValueError, evaluate, "(hash-map 'a 1 'b)")
+
+    def test_to_string(self):
+        to_string = InteractiveInterpreter().to_string
+        self.assertEqual('(hash-map a "x")',
+                         to_string(evaluate("(hash-map 'a \"x\")")))
+        self.assertEqual("(mutable-hash-set 1)",
+                         to_string(evaluate("(mutable-hash-set 1)")))
+        self.assertEqual("(hash-set)", to_string(evaluate("(hash-set)")))
@@ -0,0 +1,63 @@
+import unittest
+import petit_lisp as pl
+
+from src.parser import Parser
+
+parse = Parser().parse
+
+FIB = '''(define fib (memoize (lambda (n)
+           (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))))'''
+
+
+def stats(name):
+    return dict(pl.evaluate(parse("(memo-stats {})".format(name))))
+
+
+class TestMemoize(unittest.TestCase):
+    '''Procedures wrapped by memoize remember their values'''
+
+    def setUp(self):  # noqa
+        pl.global_env = pl.common_env(pl.Env())
+        pl.evaluate(parse("(load 'src/default_language.lisp)"))
+
+    def tearDown(self):  # noqa
+        pl.use_engine('interpret')
+
+    def test_recursive_definition(self):
+        for engine in pl.engines.values():
+            engine(parse(FIB))
+            self.assertEqual(354224848179261915075, engine(parse("(fib 100)")))
+            self.assertEqual({'hits': 98, 'misses': 101, 'size': 101,
+                              'maxsize': 1024}, stats('fib'))
+
+    def test_bounded_size(self):
+        pl.evaluate(parse("(define sq (memoize (lambda (x) (* x x)) 2))"))
+        for x in (1, 2, 1, 3, 1, 2):
+            self.assertEqual(x * x, pl.evaluate(parse("(sq {})".format(x))))
+        # 2 was evicted when 3 was added, as 1 had been used more recently
+        self.assertEqual({'hits': 2, 'misses': 4, 'size': 2, 'maxsize': 2},
+                         stats('sq'))
+        self.assertRaises(ValueError, pl.evaluate,
+                          parse("(memoize (lambda (x) x) 0)"))
+
+    def test_list_arguments(self):
+        pl.evaluate(parse("(define size (memoize (lambda (x) (len x))))"))
+        pl.evaluate(parse("(from-py-load-as 'builtins '(len len))"))
+        self.assertEqual(2, pl.evaluate(parse("(size '(1 (2 3)))")))
+        self.assertEqual(2, pl.evaluate(parse("(size (cons 1 '((2 3))))")))
+        self.assertEqual(1, stats('size')['hits'])
+
+    def test_equal_values_of_other_types(self):
+        pl.evaluate(parse("(define same (memoize (lambda (x) x)))"))
+        values = [pl.evaluate(parse("(same {})".format(x)))
+                  for x in ("1", "#t", "1.0", "(list 1)", "(list #t)")]
+        self.assertEqual([int, bool, float], [type(v) for v in values[:3]])
+        self.assertIs(bool, type(values[4][0]))
+        self.assertEqual(0, stats('same')['hits'])
+
+    def test_clear(self):
+        pl.evaluate(parse(FIB))
+        pl.evaluate(parse("(fib 10)"))
+        pl.evaluate(parse("(memo-clear fib)"))
+        self.assertEqual({'hits': 0, 'misses': 0, 'size': 0,
+                          'maxsize': 1024}, stats('fib'))
@@ -0,0 +1,58 @@
+import unittest
+import petit_lisp as pl
+
+from src.native import native_procs
+from src.pairs import is_list
+from src.parser import Parser
+
+parse = Parser().parse
+
+# and/or are special forms: and*/or* are bound to the procedures
+expressions = [
+    "(and* #t #t)", "(and* #t #f #t)", "(and* 1)", "(and* #t '(1 #f))",
+    "(and* #t '())", "(or* #f #f)", "(or* #f 0 2)", "(or* #f '(#f))",
+    "(list 1)", "(list 1 2 3)", "(list 1 '(2 3))", "(list '(1) '(2))",
+    "(append '(1 2) '(3))", "(append '() 4)", "(append '(1) '())",
+    "(= 1 1)", "(= 1 1 1 2)", "(= 1 1.0 '(1))", "(< 1 2 3)", "(< 1 3 2)",
+    "(> 3 2 1)", "(> 3 3)", "(<= 1 1 2)", "(<= 2 1)", "(>= 2 2 1)",
+    "(>= 1 2 '(3))"
+]
+
+
+class TestNative(unittest.TestCase):
+    '''Native procedures must give the same results as the lisp ones'''
+
+    def setUp(self):  # noqa
+        pl.global_env = pl.common_env(pl.Env())
+        pl.evaluate(parse("(load 'src/default_language.lisp)"))
+
+    def test_same_results(self):
+        pl.evaluate(parse("(define and* and)"))
+        pl.evaluate(parse("(define or* or)"))
+        reference = [pl.evaluate(parse(expr)) for expr in expressions]
+        pl.evaluate(parse("(use-native)"))
+        pl.evaluate(parse("(define and* and)"))
+        pl.evaluate(parse("(define or* or)"))
+        for name in native_procs:
+            self.assertIs(native_procs[name], pl.global_env[name])
+        native = [pl.evaluate(parse(expr)) for expr in expressions]
+        for expr, ref, nat in zip(expressions, reference, native):
+            self.assertEqual(ref, nat, msg=expr)
+            self.assertEqual(is_list(ref), is_list(nat), msg=expr)
+            if not is_list(ref):
+                self.assertIs(type(ref), type(nat), msg=expr)
+
+    def test_some_names(self):
+        pl.evaluate(parse("(use-native 'append)"))
+        self.assertIs(native_procs['append'], pl.global_env['append'])
+        self.assertIsInstance(pl.global_env['list'], pl.Procedure)
+
+    def test_cons_error(self):
+        pl.evaluate(parse("(use-native)"))
+        self.assertRaises(ValueError, pl.evaluate, parse("(append '(1) 2)"))
+
+    def test_long_lists(self):
+        pl.evaluate(parse("(use-native)"))
+        pl.global_env['data'] = list(range(100000))
+        self.assertEqual(200000, len(pl.evaluate(parse("(append data data)"))))
+        self.assertEqual(True, pl.evaluate(parse("(< -2 -1 data)")))
@@ -0,0 +1,114 @@
+import unittest
+import petit_lisp as pl
+
+from src.optimizer import Guarded
+
+ENGINES = ('interpret-optimized', 'compile-optimized')
+
+
+def unguarded(x):
+    '''x with the optimized expressions in place of Guarded ones'''
+    if type(x) is Guarded:
+        return unguarded(x.optimized)
+    elif isinstance(x, list):
+        return [unguarded(exp) for exp in x]
+    return x
+
+
+class TestRewrite(unittest.TestCase):
+    '''The optimizer folds constants, prunes branches and inlines calls'''
+
+    def setUp(self):  # noqa
+        self.env = pl.Interpreter().env
+
+    def optimize(self, source):
+        return unguarded(pl.optimizer.optimize(pl.parse(source), self.env))
+
+    def test_fold(self):
+        self.assertEqual(6, self.optimize("(+ 1 2 3)"))
+        self.assertEqual(True, self.optimize("(not (null? '(1)))"))
+        self.assertEqual(['print', 7], self.optimize("(print (* 1 7))"))
+
+    def test_prune(self):
+        self.assertEqual('a', self.optimize("(if #t 'a 'b)")[1])
+        self.assertEqual('x', self.optimize("(cond (else x))"))
+        self.assertEqual(['cond', ['p', 1], [True, 2]],
+                         self.optimize("(cond (p 1) ('() 0) ('a 2) (q 3))"))
+        # after p, tests relying on global names are guarded separately
+        self.assertEqual(['cond', ['p', 1], ['#f', 0], ['else', 2],
+                          ['q', 3]],
+                         self.optimize("(cond (p 1) (#f 0) (else 2) (q 3))"))
+        self.assertEqual(None, self.optimize("(when #f (print 1))"))
+
+    def test_inline(self):
+        self.assertEqual(['lambda', ['x'], ['__not__', 'x']],
+                         self.optimize("(lambda (x) (not x))"))
+        self.assertEqual(['__eq__', 'y', ['quote', []]],
+                         self.optimize("(null? y)"))
+
+    def test_built_by_python(self):
+        self.assertEqual(3, unguarded(pl.optimizer.optimize(
+            ['if', True, 3, 'x'], self.env)))
+        self.assertEqual(False, unguarded(pl.optimizer.optimize(
+            ['null?', ['quote', ['a']]], self.env)))
+
+    def test_not_rewritten(self):
+        # not is local, or defined by the expression itself
+        self.assertEqual(['lambda', ['not'], ['not', 1]],
+                         self.optimize("(lambda (not) (not 1))"))
+        self.assertEqual(['begin', ['define', 'not', 1], ['not', 1]],
+                         self.optimize("(begin (define not 1) (not 1))"))
+        self.assertEqual(['__truediv__', 1, 0], self.optimize("(/ 1 0)"))
+        self.assertEqual(['*', ['quote', 'a'], 10 ** 30],
+                         self.optimize("(* 'a {})".format(10 ** 30)))
+
+
+class TestInvalidation(unittest.TestCase):
+    '''Optimized code behaves like the original when globals change'''
+
+    def test_define_and_set(self):
+        for engine in ENGINES:
+            interp = pl.Interpreter(engine)
+            interp.run("(define flag #t)")
+            interp.run("(define f (lambda (x) (if flag (not x) (+ 1 2))))")
+            self.assertEqual([True, False], interp.run("(list (f #f) (f 1))"))
+            interp.run("(set! flag #f)")
+            self.assertEqual(3, interp.run("(f #f)"))
+            interp.run("(set! flag #t)")
+            interp.run("(define not (lambda (x) 'redefined))")
+            self.assertEqual('redefined', interp.run("(f #f)"))
+
+    def test_changed_by_earlier_test(self):
+        for engine in ENGINES:
+            interp = pl.Interpreter(engine)
+            interp.run("(define counter #f)")
+            interp.run("(define g (lambda () (begin (set! counter #t) #f)))")
+            interp.run("(define f (lambda () counter))")
+            self.assertEqual(2, interp.run("(cond ((g) 1) ((f) 2) (else 3))"))
+
+    def test_redefined_while_running(self):
+        for engine in ENGINES:
+            interp = pl.Interpreter(engine)
+            interp.run("(define change (lambda () (set! + (lambda (x y) 0))))")
+            self.assertEqual(0, interp.run("(begin (change) (+ 1 2))"))
+
+    def test_same_results(self):
+        program = '''
+            (define check (lambda (n acc)
+               (if (= n 0) acc
+                   (check (- n 1)
+                          (cond ((and #f (= n 3)) 0)
+                                ((not (null? '(1))) (+ acc (* 2 3)))
+                                (else acc))))))
+            (check 50 0)'''
+        results = [pl.Interpreter(engine).run(program)
+                   for engine in ('interpret',) + ENGINES]
+        self.assertEqual([300] * 3, results)
+
+    def test_snapshot(self):
+        interp = pl.Interpreter('interpret-optimized')
+        interp.run("(define f (lambda (x) (not x)))")
+        copy = pl.Interpreter.from_snapshot(interp.snapshot())
+        copy.run("(define not (lambda (x) 'redefined))")
+        self.assertEqual('redefined', copy.run("(f 1)"))
+        self.assertEqual(False, interp.run("(f 1)"))
@@ -1,7 +1,10 @@
 
+import io
+import tracemalloc
 import unittest
 
 from src.parser import Parser
+from src.symbols import LispString, Symbol
 
 parse = Parser().parse
 
@@ -19,3 +22,81 @@ class TestParse(unittest.TestCase):
 
     def test_parse_two_levels(self):
         self.assertEqual(['*', ['+', 3, 4], ['-', 2, 1]], parse(" (* ( + 3 4) (- 2 1))"))
+
+    def test_parse_numbers(self):
+        self.assertEqual([-3, 2.5, 1e5, 1+2j, -1j], parse("(-3 2.5 1e5 1+2i -i)"))
+
+    def test_parse_symbols_that_look_like_numbers(self):
+        self.assertEqual(['-', '+', 'i', 'inf', '1-'], parse("(- + i inf 1-)"))
+
+    def test_parse_quote(self):
+        self.assertEqual(['quote', ['a', ['quote', 'b']]], parse("'(a 'b)"))
+
+    def test_parse_string_and_comment(self):
+        expr = parse('(print "a (b) ;c") ; a comment')
+        self.assertEqual('print', expr[0])
+        self.assertIsInstance(expr[0], Symbol)
+        self.assertEqual('a (b) ;c', expr[1])
+        self.assertIsInstance(expr[1], LispString)
+
+    def test_symbols_are_interned(self):
+        first, second = parse("(define define)")
+        self.assertIs(first, second)
+        self.assertIs(Symbol('define'), first)
+        self.assertIs(parse("'x")[0], Symbol('quote'))
+
+    def test_parse_all(self):
+        self.assertEqual([['a'], 'b', ['quote', 3]],
+                         Parser().parse_all("(a) b\n'3"))
+
+    def test_parse_errors(self):
+        self.assertRaises(SyntaxError, parse, "(a (b)")
+        self.assertRaises(SyntaxError, parse, ")")
+        self.assertRaises(SyntaxError, parse, '"unterminated')
+
+    def test_parse_large_input(self):
+        expr = parse("(" + " ".join(str(i) for i in range(100000)) + ")")
+        self.assertEqual(list(range(100000)), expr)
+
+
+class TestReadStream(unittest.TestCase):
+    '''Reads expressions from a text stream, in chunks of various sizes'''
+
+    source = '''; comment with (
+(define s "a ) ; b")
+  'x (f
+ 1 2.5)
+"last"'''
+
+    def read(self, chunk_size):
+        stream = io.StringIO(self.source)
+        return list(Parser().read_stream(stream, chunk_size))
+
+    def test_forms_and_positions(self):
+        expected = self.read(1 << 16)
+        self.assertEqual([(['define', 's', 'a ) ; b'], 2, 1),
+                          (['quote', 'x'], 3, 3),
+                          (['f', 1, 2.5], 3, 6),
+                          ('last', 5, 1)], expected)
+        for chunk_size in (1, 2, 3, 7):
+            self.assertEqual(expected, self.read(chunk_size))
+
+    def test_tokens_not_kept(self):
+        # a large expression is built as its tokens are read, without a
+        # list of them, which would take about 60 more bytes per token
+        count = 50000
+        stream = io.StringIO("(" + " name" * count + ")")
+        tracemalloc.start()
+        try:
+            [(expr, _, _)] = Parser().read_stream(stream)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(count, len(expr))
+        self.assertLess(peak, 50 * count)
+
+    def test_unbalanced(self):
+        stream = io.StringIO("(a)\n(b")
+        reader = Parser().read_stream(stream)
+        self.assertEqual((['a'], 1, 1), next(reader))
+        self.assertRaises(SyntaxError, next, reader)
@@ -39,6 +39,19 @@ class TestEvaluate(unittest.TestCase):
         self.assertEqual(None, evaluate("(define square (lambda (x) (* x x)))"))
         self.assertEqual(9, evaluate("(square 3)"))
 
+    def test_string_literal(self):
+        evaluate("(define hello 1)")
+        self.assertEqual("hello", evaluate('"hello"'))
+        self.assertEqual("hello", evaluate('((lambda () "hello"))'))
+
+    def test_built_by_python(self):
+        # the names of an expression built by Python code are str
+        self.assertEqual(None, pl.evaluate(['define', 'x', 3]))
+        self.assertEqual(3, pl.evaluate(['if', True, 'x', 0]))
+        self.assertEqual(['a', 1], pl.evaluate(['quote', ['a', 1]]))
+        self.assertEqual(9, pl.evaluate(
+            [['lambda', ['y'], ['*', 'y', 'x']], 3]))
+
     def test_load_python(self):
         # verify that Python module can be imported properly
         global env
@@ -100,5 +113,77 @@ class TestLogic(unittest.TestCase):
         self.assertEqual(0, evaluate("(abs2 0)"))
 
 
+class TestTailCalls(unittest.TestCase):
+    '''Tail calls must run in constant stack depth'''
+
+    def setUp(self):  # noqa
+        pl.global_env = pl.common_env(pl.Env())
+        evaluate("(load 'src/default_language.lisp)")
+        evaluate("(from-py-load-as 'operator '(sub __sub__))")
+
+    def test_if_tail_call(self):
+        evaluate("""(define count (lambda (n)
+                        (if (__eq__ n 0) 'done (count (__sub__ n 1)))))""")
+        self.assertEqual('done', evaluate("(count 10000)"))
+
+    def test_cond_tail_call(self):
+        evaluate("""(define count (lambda (n acc)
+                        (cond ((__eq__ n 0) acc)
+                              (else (count (__sub__ n 1) (__add__ acc 2))))))""")
+        self.assertEqual(20000, evaluate("(count 10000 0)"))
+
+    def test_begin_tail_call(self):
+        evaluate("""(define count (lambda (n)
+                        (begin (define m (__sub__ n 1))
+                               (if (__eq__ n 0) 'done (count m)))))""")
+        self.assertEqual('done', evaluate("(count 10000)"))
+
+    def test_variadic_prelude_procedure(self):
+        evaluate("(define a (cons #t '()))")
+        for _ in range(2000):
+            evaluate("(define a (cons #t a))")
+        evaluate("(define all and)")  # the procedure, not the special form
+        self.assertEqual(True, evaluate("(all #t a)"))
+        self.assertEqual(1, evaluate("(last (cons 1 '()))"))
+
+
+class TestSpecialForms(unittest.TestCase):
+
+    def setUp(self):  # noqa
+        pl.global_env = pl.common_env(pl.Env())
+        evaluate("(load 'src/default_language.lisp)")
+
+    def test_and_or_short_circuit(self):
+        self.assertEqual(False, evaluate("(and #f (car '()))"))
+        self.assertEqual(True, evaluate("(or #t (car '()))"))
+        self.assertEqual(3, evaluate("(and 1 2 3)"))
+        self.assertEqual(2, evaluate("(or #f 2 (car '()))"))
+        self.assertEqual(True, evaluate("(and)"))
+        self.assertEqual(False, evaluate("(or)"))
+
+    def test_when_unless(self):
+        self.assertEqual(2, evaluate("(when (> 2 1) 1 2)"))
+        self.assertEqual(None, evaluate("(when (< 2 1) (car '()))"))
+        self.assertEqual(None, evaluate("(unless (> 2 1) (car '()))"))
+        self.assertEqual(3, evaluate("(unless #f 3)"))
+
+    def test_let(self):
+        evaluate("(define x 10)")
+        self.assertEqual(13, evaluate("(let ((x 1) (y (+ x 2))) (+ x y))"))
+        evaluate("(define n 0)")
+        self.assertEqual(None, evaluate("(let ((a (set! n 1))))"))
+        self.assertEqual(1, evaluate("n"))
+        self.assertEqual(10, evaluate("x"))
+        self.assertEqual(4, evaluate("(let ((y 2)) (define z y) (+ y z))"))
+        self.assertEqual(True, evaluate("(undefined? z)"))
+
+    def test_tail_call_in_and(self):
+        evaluate("""(define all-positive (lambda (lst)
+                        (or (null? lst)
+                            (and (> (car lst) 0) (all-positive (cdr lst))))))""")
+        pl.global_env['data'] = [1] * 3000
+        self.assertEqual(True, evaluate("(all-positive data)"))
+
+
 if __name__ == '__main__':
     unittest.main()
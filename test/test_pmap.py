@@ -0,0 +1,66 @@
+import os
+import tempfile
+import threading
+import unittest
+import petit_lisp as pl
+
+from src.parser import Parser
+from src.python_utils import process_map, run_chunk
+
+parse = Parser().parse
+
+
+class TestProcessMap(unittest.TestCase):
+    '''pmap and pfor-each apply procedures in worker processes'''
+
+    def setUp(self):  # noqa
+        pl.global_env = pl.common_env(pl.Env())
+        pl.evaluate(parse("(load 'src/default_language.lisp)"))
+        pl.evaluate(parse("(define square (lambda (x) (* x x)))"))
+        pl.global_env['data'] = list(range(50))
+
+    @classmethod
+    def tearDownClass(cls):  # noqa
+        process_map.shutdown()
+
+    def test_ordered_results(self):
+        for engine in pl.engines.values():
+            self.assertEqual([x * x for x in range(50)],
+                             engine(parse("(pmap square data 7)")))
+            self.assertEqual([], engine(parse("(pmap square '())")))
+
+    def test_closure(self):
+        for engine in pl.engines.values():
+            self.assertEqual([3, 6, 9], engine(parse(
+                "(let ((k 3)) (pmap (lambda (x) (* k x)) '(1 2 3)))")))
+
+    def test_python_function(self):
+        pl.evaluate(parse("(from-py-load 'math 'sqrt)"))
+        self.assertEqual([1.0, 2.0], pl.evaluate(parse("(pmap sqrt '(1 4))")))
+
+    def test_errors(self):
+        self.assertRaises(TypeError, pl.evaluate, parse("(pmap car data)"))
+
+    def test_unrelated_globals(self):
+        # only the names the procedure may look up are sent to the workers
+        pl.global_env['lock'] = threading.Lock()
+        pl.evaluate(parse("(define nums (range 10))"))
+        pl.evaluate(parse("(define k 2)"))
+        pl.evaluate(parse("(define f (lambda (x) (square (* k x))))"))
+        names = pl.global_names(pl.global_env['f'], pl.global_env)
+        self.assertTrue({'square', 'k', '*', '__mul__'} <= names)
+        self.assertFalse({'lock', 'nums', 'data', 'f'} & names)
+        self.assertEqual([4, 16], pl.evaluate(parse("(pmap f '(1 2))")))
+
+    def test_payload_read_once(self):
+        payload = pl.dumps_procedure(pl.global_env['square'])
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(payload)
+        self.assertEqual([4], run_chunk(pl.loads_procedure, 'key', f.name,
+                                        [2]))
+        os.remove(f.name)
+        self.assertEqual([9], run_chunk(pl.loads_procedure, 'key', f.name,
+                                        [3]))
+
+    def test_for_each(self):
+        self.assertIsNone(pl.evaluate(parse("(pfor-each square data)")))
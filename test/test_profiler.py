@@ -0,0 +1,98 @@
+import unittest
+import petit_lisp as pl
+
+from src.parser import Parser
+from src.profiler import Profiler, profiler
+from src.repl import InteractiveInterpreter
+
+parse = Parser().parse
+
+PROGRAM = '''(begin
+  (define square (lambda (x) (* x x)))
+  (define sum-squares (lambda (n acc)
+      (if (= n 0) acc (sum-squares (- n 1) (+ acc (square n))))))
+  (define count (lambda (n) (if (= n 0) 0 (count (- n 1))))))'''
+
+
+class TestProfiler(unittest.TestCase):
+    '''Calls to procedures are recorded under the name they were defined
+       with, while the profiler is active'''
+
+    def setUp(self):  # noqa
+        pl.global_env = pl.common_env(pl.Env())
+        pl.evaluate(parse("(load 'src/default_language.lisp)"))
+        profiler.reset()
+
+    def tearDown(self):  # noqa
+        profiler.stop()
+        profiler.reset()
+        pl.use_engine('interpret')
+
+    def profile(self, engine, expr):
+        engine(parse(PROGRAM))
+        profiler.start()
+        try:
+            return engine(parse(expr))
+        finally:
+            profiler.stop()
+
+    def test_names_and_calls(self):
+        for engine in pl.engines.values():
+            profiler.reset()
+            self.assertEqual(55, self.profile(engine, "(sum-squares 5 0)"))
+            self.assertEqual(6, profiler.stats['sum-squares'][0])
+            self.assertEqual(5, profiler.stats['square'][0])
+            self.assertEqual(5, profiler.edges[('sum-squares', 'square')])
+            calls, total, own = profiler.stats['sum-squares']
+            self.assertLessEqual(own, total)
+
+    def test_collapsed_stacks(self):
+        self.profile(pl.execute, "(sum-squares 3 0)")
+        lines = profiler.collapsed().splitlines()
+        self.assertIn("sum-squares;square", [l.split()[0] for l in lines])
+        for line in lines:
+            path, microseconds = line.split()
+            self.assertGreaterEqual(int(microseconds), 0)
+
+    def test_deep_tail_calls(self):
+        for engine in pl.engines.values():
+            self.assertEqual(0, self.profile(engine, "(count 10000)"))
+            self.assertEqual([], profiler.stack)
+
+    def test_inactive(self):
+        pl.evaluate(parse(PROGRAM))
+        pl.evaluate(parse("(sum-squares 3 0)"))
+        self.assertEqual({}, profiler.stats)
+
+    def test_error_ends_calls(self):
+        pl.evaluate(parse("(define fail (lambda (x) (car x)))"))
+        profiler.start()
+        self.assertRaises(Exception, pl.evaluate, parse("(fail 1)"))
+        self.assertEqual([], profiler.stack)
+
+    def test_repl_flag(self):
+        pl.evaluate(parse(PROGRAM))
+        repl = InteractiveInterpreter(pl.evaluate, parse, pl.global_env)
+        repl.evaluate_profiled(parse("(square 2)"))
+        self.assertEqual({}, profiler.stats)
+        repl.handle_profile(["on"])
+        self.assertEqual(4, repl.evaluate_profiled(parse("(square 2)")))
+        self.assertFalse(profiler.active)
+        self.assertEqual(1, profiler.stats['square'][0])
+
+
+class TestRecursion(unittest.TestCase):
+    '''Time spent in recursive calls is only counted once'''
+
+    def test_total_time(self):
+        times = iter(range(100))
+        p = Profiler(clock=lambda: next(times))
+        p.start()
+        p.enter(object())   # unnamed procedures are shown as <lambda>
+        p.enter(object())
+        p.exit()
+        p.exit()
+        calls, total, own = p.stats['<lambda>']
+        self.assertEqual((2, 3, 3), (calls, total, own))
+        self.assertEqual(2, p.stacks['<lambda>'])
+        self.assertEqual(1, p.stacks['<lambda>;<lambda>'])
@@ -0,0 +1,117 @@
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import unittest
+import petit_lisp as pl
+
+from src.budget import Budget
+from src.repl import InteractiveInterpreter
+from src.server import Server, read_length_prefixed, write_length_prefixed
+
+
+class TestServer(unittest.TestCase):
+    '''Requests are evaluated by a pool of interpreters'''
+
+    @classmethod
+    def setUpClass(cls):  # noqa
+        cls.pool = pl.InterpreterPool(size=2)
+
+    def serve(self, data, framing='lines', budget=None):
+        server = Server(self.pool, InteractiveInterpreter().to_string,
+                        framing, workers=2, budget=budget)
+        out = io.BytesIO()
+        with server.serving():
+            server.serve_stream(io.BytesIO(data), out)
+        out.seek(0)
+        if framing == 'lines':
+            texts = out.read().decode().splitlines()
+        else:
+            texts = list(read_length_prefixed(out))
+        responses = sorted(map(json.loads, texts), key=lambda r: r['id'])
+        self.assertEqual(list(range(len(responses))),
+                         [r['id'] for r in responses])
+        return responses
+
+    def test_lines(self):
+        responses = self.serve(b'(+ 1 2)\n\n(begin (print "hi") (list 1 2))\n'
+                               b'(undefined-name)\n')
+        self.assertEqual(3, len(responses))
+        self.assertEqual("3", responses[0]['result'])
+        self.assertEqual("(1 2)", responses[1]['result'])
+        self.assertEqual("hi\n", responses[1]['output'])
+        self.assertFalse(responses[2]['ok'])
+        self.assertIn("undefined-name", responses[2]['error'])
+        self.assertTrue(all(r['ms'] >= 0 for r in responses))
+
+    def test_length_prefixed(self):
+        out = io.BytesIO()
+        for source in ['(define x 2)\n(list\n x "a")', '(* 6 7)']:
+            write_length_prefixed(out, source)
+        responses = self.serve(out.getvalue(), 'length')
+        self.assertEqual(['(2 "a")', '42'], [r['result'] for r in responses])
+
+    def test_malformed_lines(self):
+        responses = self.serve(b'(+ 1 2)\n"\xff\xfe"\n(* 2 3)\n')
+        self.assertEqual(['3', None, '6'],
+                         [r.get('result') for r in responses])
+        self.assertIn("UnicodeDecodeError", responses[1]['error'])
+
+    def test_malformed_length_prefixed(self):
+        responses = self.serve(b'abc\n3\n\xff\xfe\xfd7\n(+ 1 2)9\n(+ 1',
+                               'length')
+        self.assertEqual([None, None, '3', None],
+                         [r.get('result') for r in responses])
+        self.assertIn("ValueError", responses[0]['error'])
+        self.assertIn("UnicodeDecodeError", responses[1]['error'])
+        self.assertIn("EOFError", responses[3]['error'])
+
+    def test_many_requests(self):
+        data = b"".join(b"(* %d %d)\n" % (i, i) for i in range(50))
+        responses = self.serve(data)
+        self.assertEqual([str(i * i) for i in range(50)],
+                         [r['result'] for r in responses])
+
+    def test_budget_and_quit(self):
+        responses = self.serve(b"(define f (lambda () (f))) (f)\n(quit)\n1\n",
+                               budget=lambda: Budget(steps=100))
+        self.assertEqual(101, responses[0]['usage']['steps'])
+        self.assertIn("SystemExit", responses[1]['error'])
+        self.assertEqual("1", responses[2]['result'])
+
+    def test_socket_in_use(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "server.sock")
+        server = Server(self.pool, InteractiveInterpreter().to_string)
+        try:
+            with socket.socket(socket.AF_UNIX) as running:
+                running.bind(path)
+                self.assertRaises(OSError, server.serve_unix, path)
+                self.assertTrue(os.path.exists(path))
+        finally:
+            server.close()
+            os.remove(path)
+            os.rmdir(directory)
+
+    def test_loaded_file_output(self):
+        # what the program loaded prints goes to stderr, not before the
+        # responses
+        with tempfile.NamedTemporaryFile("w", suffix=".lisp",
+                                         delete=False) as f:
+            f.write("(+ 1 2)\n(car '())\n")
+        try:
+            result = subprocess.run(
+                [sys.executable, "petit_lisp.py", f.name, "--serve",
+                 "--workers", "1"], input=b"(* 6 7)\n", capture_output=True,
+                cwd=os.path.dirname(os.path.dirname(
+                    os.path.abspath(__file__))), timeout=60)
+        finally:
+            os.remove(f.name)
+        lines = result.stdout.decode().splitlines()
+        self.assertEqual(1, len(lines))
+        self.assertEqual("42", json.loads(lines[0])['result'])
+        self.assertIn("3", result.stderr.decode())
+        self.assertIn("error", result.stderr.decode())
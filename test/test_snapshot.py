@@ -0,0 +1,93 @@
+import os
+import tempfile
+import unittest
+import petit_lisp as pl
+
+from src.parser import Parser
+from src.symbols import LispString
+
+parse = Parser().parse
+
+
+def evaluate(s, env):
+    return pl.evaluate(parse(s), env)
+
+
+def prelude(engine='interpret'):
+    pl.global_env = pl.common_env(pl.Env())
+    pl.use_engine(engine)
+    pl.loader.load('src/default_language.lisp')
+    pl.use_engine('interpret')
+    env = pl.global_env
+    evaluate("(from-py-load 'math 'sqrt)", env)
+    evaluate("(define hyp (lambda (a b) (sqrt (+ (* a a) (* b b)))))", env)
+    evaluate('(set-docstring hyp "(hyp a b) ==> length of hypotenuse")', env)
+    return env
+
+
+class TestSnapshot(unittest.TestCase):
+    '''Saves and restores initialized global environments'''
+
+    def check(self, env):
+        self.assertEqual(5.0, evaluate("(hyp 3 4)", env))
+        self.assertEqual([1, 2, 3], evaluate("(list 1 2 3)", env))
+        self.assertEqual("(hyp a b) ==> length of hypotenuse",
+                         env['hyp'].__doc__)
+        self.assertEqual(('math', 'sqrt'), env.imports['sqrt'])
+
+    def test_dumps_loads(self):
+        env = pl.loads_env(pl.dumps_env(prelude()))
+        self.check(env)
+        self.assertIs(env, env['hyp'].env)
+
+    def test_compiled_procedures(self):
+        env = pl.loads_env(pl.dumps_env(prelude('compile')))
+        self.check(env)
+        self.assertEqual(True, evaluate("(< 1 2 3)", env))
+
+    def test_snapshot_file(self):
+        handle, filename = tempfile.mkstemp()
+        os.close(handle)
+        try:
+            pl.snapshot(filename, prelude())
+            self.check(pl.restore(filename))
+        finally:
+            os.remove(filename)
+
+    def test_strings(self):
+        env = prelude()
+        evaluate('(define greet (lambda () "hello"))', env)
+        env = pl.loads_env(pl.dumps_env(env))
+        self.assertEqual('hello', evaluate("(greet)", env))
+        self.assertIsInstance(evaluate("(greet)", env), LispString)
+
+    def test_fork(self):
+        env = prelude()
+        child = pl.fork(env)
+        evaluate("(define x 1)", child)
+        evaluate("(set! hyp 2)", child)
+        self.assertEqual(True, evaluate("(undefined? x)", env))
+        self.assertEqual(5.0, evaluate("(hyp 3 4)", env))
+        self.assertEqual(2, evaluate("hyp", child))
+        self.assertEqual([1, 2], evaluate("(list 1 2)", child))
+
+    def test_fork_changed_later(self):
+        for engine in ('interpret', 'compile', 'interpret-optimized',
+                       'compile-optimized'):
+            parent = pl.Interpreter(engine)
+            parent.run("(define f (lambda (x) (not x)))")
+            parent.run("(define g (memoize (lambda (x) (f x))))")
+            child = parent.fork()
+            parent.run("(define null? (lambda (x) #t))")
+            parent.run("(define not (lambda (x) 'parent))")
+            self.assertEqual([1, 2, 3], child.run("(list 1 2 3)"))
+            self.assertEqual([False, False], child.run("(list (f 1) (g 1))"))
+            self.assertEqual('parent', parent.run("(f 1)"))
+            child.run("(define not (lambda (x) 'child))")
+            self.assertEqual(['child', 'child'],
+                             child.run("(list (f 2) (g 2))"))
+            self.assertEqual('parent', parent.run("(g 2)"))
+
+
+if __name__ == '__main__':
+    unittest.main()
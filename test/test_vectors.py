@@ -0,0 +1,103 @@
+import unittest
+from unittest import mock
+import petit_lisp as pl
+
+from src import vectors
+from src.parser import Parser
+from src.repl import InteractiveInterpreter
+
+parse = Parser().parse
+
+
+def evaluate(s):
+    return pl.evaluate(parse(s))
+
+
+class TestVectors(unittest.TestCase):
+    '''Vector builtins operate on whole vectors at once; these tests use
+       the array.array vectors, which replace NumPy when it is missing'''
+    numpy = None
+
+    def setUp(self):  # noqa
+        patcher = mock.patch.object(vectors, 'numpy', self.numpy)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        pl.global_env = pl.common_env(pl.Env())
+        pl.evaluate(parse("(load 'src/default_language.lisp)"))
+        evaluate("(define v (vec 1 2 3))")
+        evaluate("(define w (vec '(0.5 1.5 2.5)))")
+
+    def as_list(self, s):
+        val = evaluate(s)
+        self.assertTrue(vectors.is_vector(val))
+        return val.tolist()
+
+    def test_construction(self):
+        self.assertEqual([1, 2, 3], self.as_list("v"))
+        self.assertEqual([1, 2, 3], self.as_list("(vec (cons 1 '(2 3)))"))
+        self.assertEqual([0, 1, 2], self.as_list("(vrange 3)"))
+        self.assertEqual([2, 4], self.as_list("(vrange 2 6 2)"))
+        self.assertEqual([1, 2, 3], evaluate("(vec->list v)"))
+        self.assertEqual(True, evaluate("(vec? v)"))
+        self.assertEqual(False, evaluate("(vec? '(1 2))"))
+
+    def test_arithmetic(self):
+        self.assertEqual([1.5, 3.5, 5.5], self.as_list("(vadd v w)"))
+        self.assertEqual([0.5, 0.5, 0.5], self.as_list("(vsub v w)"))
+        self.assertEqual([2, 4, 6], self.as_list("(vmul v 2)"))
+        self.assertEqual([11, 12, 13], self.as_list("(vadd 10 v)"))
+        self.assertEqual([0.5, 1.0, 1.5], self.as_list("(vdiv v 2)"))
+        self.assertEqual(6, evaluate("(vsum v)"))
+        self.assertEqual(4.5, evaluate("(vsum w)"))
+        self.assertEqual(0.5 + 3 + 7.5, evaluate("(vdot v w)"))
+        self.assertRaises(ValueError, evaluate, "(vadd v (vec 1 2))")
+
+    def test_comparisons(self):
+        self.assertEqual([0, 1, 1], self.as_list("(v> v 1)"))
+        self.assertEqual([1, 1, 0], self.as_list("(v<= v 2)"))
+        self.assertEqual([0, 1, 0], self.as_list("(v= v (vec 0 2 0))"))
+        self.assertEqual(3, evaluate("(vsum (v>= v w))"))
+        self.assertEqual(0, evaluate("(vsum (v< v w))"))
+
+    def test_lists_and_numbers(self):
+        self.assertEqual([2, 3], self.as_list("(vadd '(1 2) 1)"))
+        self.assertEqual([1.5, 3.5, 5.5], self.as_list("(vadd '(1 2 3) w)"))
+        self.assertEqual([1, 0], self.as_list("(v= '(1 2) '(1 3))"))
+        self.assertEqual(3, evaluate("(vsum '(1 2))"))
+        self.assertEqual(14, evaluate("(vdot '(1 2 3) v)"))
+        self.assertEqual([1, 2], evaluate("(vec->list '(1 2))"))
+        for expr, value in (("(vadd 1 2)", 3), ("(vdiv 1 2)", 0.5),
+                            ("(v< 1 2)", True), ("(vsum v)", 6),
+                            ("(vsum w)", 4.5), ("(vdot v v)", 14)):
+            result = evaluate(expr)
+            self.assertEqual(value, result)
+            self.assertIs(type(value), type(result))
+        self.assertRaises(TypeError, evaluate, "(vrange 0.5 2)")
+        self.assertRaises(ValueError, evaluate, "(vdot v '(1 2))")
+
+    def test_python_interop(self):
+        evaluate("(from-py-load 'math 'sqrt)")
+        evaluate("(from-py-load 'statistics 'mean)")
+        self.assertEqual([1.0, 2.0, 3.0],
+                         self.as_list("(vmap sqrt (vec 1 4 9))"))
+        self.assertEqual(2, evaluate("(mean v)"))
+
+    def test_large(self):
+        n = 10 ** 6
+        self.assertEqual(sum(i * i for i in range(n)),
+                         evaluate("(vdot (vrange {0}) (vrange {0}))".format(n)))
+
+    def test_to_string(self):
+        self.assertEqual("(vec 1 2 3)",
+                         InteractiveInterpreter().to_string(evaluate("v")))
+
+
+@unittest.skipIf(vectors.numpy is None, "NumPy is not installed")
+class TestNumpyVectors(TestVectors):
+    '''The same tests, with NumPy arrays as vectors'''
+    numpy = vectors.numpy
+
+    def test_ufunc(self):
+        evaluate("(from-py-load 'numpy 'sqrt)")
+        self.assertEqual([1.0, 2.0, 3.0],
+                         self.as_list("(vmap sqrt '(1 4 9))"))